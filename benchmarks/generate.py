@@ -0,0 +1,149 @@
+"""
+Generate synthetic Poetry projects for the benchmarks.
+
+Usage: python benchmarks/generate.py PATH [--files N] [--deps N] [--lock-packages N]
+       [--hashes-per-package N] [--venv-files N] [--venv-depth N]
+"""
+import argparse
+import os
+import random
+from dataclasses import dataclass
+from pathlib import Path
+
+
+@dataclass
+class ProjectSpec:
+    # number of files in the module directory
+    files: int = 100
+    # number of dependencies (spread over every supported kind)
+    deps: int = 20
+    # number of [[package]] tables in poetry.lock, 0 for no lockfile
+    lock_packages: int = 50
+    # number of file hashes for each locked package (scales the lockfile size)
+    hashes_per_package: int = 4
+    # number of files in .venv, and how deep they are nested
+    venv_files: int = 0
+    venv_depth: int = 4
+    file_size: int = 512
+
+
+def dependency_line(i: int, rng: random.Random) -> str:
+    name = f"dep{i}"
+    major = rng.randint(1, 30)
+    kind = i % 5
+    if kind == 0:
+        return f'{name} = "^{major}.{rng.randint(0, 9)}"'
+    if kind == 1:
+        return f'{name} = "{major}.{rng.randint(0, 9)}.{rng.randint(0, 9)}"'
+    if kind == 2:
+        return (
+            f'{name} = [{{version = "^{major}.0", python = "<3.12"}}, '
+            f'{{version = "^{major + 1}.0", python = ">=3.12"}}]'
+        )
+    if kind == 3:
+        return f'{name} = {{git = "https://example.com/{name}.git", tag = "v{major}"}}'
+    return f'{name} = {{version = ">={major}.0", extras = ["extra"]}}'
+
+
+def write_pyproject(path: Path, spec: ProjectSpec, rng: random.Random) -> None:
+    dev_count = spec.deps // 5
+    lines = [
+        "[tool.poetry]",
+        f'name = "{path.name}"',
+        'version = "0.1.0"',
+        'description = "a synthetic project"',
+        'authors = ["Bench Mark <bench@example.com>"]',
+        'readme = "README.md"',
+        "",
+        "[tool.poetry.dependencies]",
+        'python = "^3.11"',
+    ]
+    lines += [dependency_line(i, rng) for i in range(spec.deps - dev_count)]
+    lines += ["", "[tool.poetry.group.dev.dependencies]"]
+    lines += [dependency_line(i, rng) for i in range(spec.deps - dev_count, spec.deps)]
+    lines += [
+        "",
+        "[build-system]",
+        'requires = ["poetry-core"]',
+        'build-backend = "poetry.core.masonry.api"',
+        "",
+    ]
+    (path / "pyproject.toml").write_text("\n".join(lines))
+
+
+def write_lock(path: Path, spec: ProjectSpec, rng: random.Random) -> None:
+    with open(path / "poetry.lock", "w") as f:
+        f.write("# This file is automatically @generated by Poetry.\n\n")
+        for i in range(spec.lock_packages):
+            name = f"dep{i}"
+            version = f"{rng.randint(1, 30)}.{rng.randint(0, 9)}.{rng.randint(0, 9)}"
+            f.write(
+                f'[[package]]\nname = "{name}"\nversion = "{version}"\n'
+                f'description = ""\noptional = false\npython-versions = ">=3.8"\n'
+                "files = [\n"
+            )
+            for j in range(spec.hashes_per_package):
+                f.write(
+                    f'    {{file = "{name}-{version}-{j}.whl", '
+                    f'hash = "sha256:{rng.getrandbits(256):064x}"}},\n'
+                )
+            f.write("]\n\n")
+            if i + 1 < spec.lock_packages:
+                f.write(f'[package.dependencies]\ndep{i + 1} = ">=1.0"\n\n')
+
+        f.write('[metadata]\nlock-version = "2.0"\npython-versions = "^3.11"\n')
+        f.write(f'content-hash = "{rng.getrandbits(256):064x}"\n')
+
+
+def write_files(
+    root: Path, count: int, depth: int, size: int, rng: random.Random
+) -> None:
+    data = rng.randbytes(size)
+    for i in range(count):
+        parts = [f"d{(i >> (3 * level)) % 8}" for level in range(depth)]
+        directory = root.joinpath(*parts)
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / f"f{i}.py").write_bytes(data)
+
+
+def generate_project(path: Path, spec: ProjectSpec, seed: int = 0) -> Path:
+    rng = random.Random(seed)
+    path.mkdir(parents=True)
+    (path / "README.md").write_text(f"# {path.name}\n")
+
+    write_pyproject(path, spec, rng)
+    if spec.lock_packages:
+        write_lock(path, spec, rng)
+
+    module = path / path.name.replace("-", "_")
+    module.mkdir()
+    (module / "__init__.py").write_text("")
+    write_files(module, spec.files, 2, spec.file_size, rng)
+
+    if spec.venv_files:
+        site = path / ".venv" / "lib" / "python3.11" / "site-packages"
+        write_files(site, spec.venv_files, spec.venv_depth, spec.file_size, rng)
+        os.symlink("/usr/bin/python3", path / ".venv" / "python")
+
+    return path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="generate a synthetic Poetry project")
+    parser.add_argument("path", type=Path)
+    defaults = ProjectSpec()
+    for field in ProjectSpec.__dataclass_fields__:
+        parser.add_argument(
+            f"--{field.replace('_', '-')}", type=int, default=getattr(defaults, field)
+        )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    spec = ProjectSpec(
+        **{field: getattr(args, field) for field in ProjectSpec.__dataclass_fields__}
+    )
+    generate_project(args.path, spec, seed=args.seed)
+
+
+if __name__ == "__main__":
+    main()
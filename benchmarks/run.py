@@ -0,0 +1,246 @@
+"""
+Benchmarks for the phases of a migration, on synthetic Poetry projects.
+
+Usage: python benchmarks/run.py [--suite quick|full] [--output FILE]
+       [--baseline FILE] [--save-baseline] [--tolerance RATIO] [--repeat N]
+
+Results are written as JSON ({case: {phase: seconds}}), each phase the best of
+`repeat` runs. If a baseline exists, every phase slower than `tolerance` times
+its baseline (and by more than `min_delta` seconds) is reported and the exit
+status is 1. rye is not needed.
+
+The timings depend on the machine, so the baseline is best recorded on the
+machine it is compared on. A fixed calibration workload is timed along with
+the cases, and the baseline is scaled by how much slower or faster it ran than
+when the baseline was recorded, which keeps a baseline from another machine
+roughly comparable.
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tomllib
+from pathlib import Path
+from typing import Callable
+
+from generate import ProjectSpec
+from generate import generate_project
+
+from poetry2rye import timings
+from poetry2rye.backup import create_backup
+from poetry2rye.constraints import clear_caches
+from poetry2rye.convert import MUTATED_FILES
+from poetry2rye.convert import plan_migration
+from poetry2rye.lock import poetry_lock_to_requirements
+from poetry2rye.main import main as app_main
+from poetry2rye.plan import execute_plan
+from poetry2rye.project import PoetryProject
+
+SUITES = {
+    "quick": {
+        "files-1k": ProjectSpec(files=1000),
+        "deps-500": ProjectSpec(deps=500, lock_packages=500),
+        "lock-1mb": ProjectSpec(lock_packages=2000, hashes_per_package=4),
+        "venv-2k": ProjectSpec(venv_files=2000, venv_depth=6),
+    },
+    "full": {
+        "files-10": ProjectSpec(files=10),
+        "files-10k": ProjectSpec(files=10_000),
+        "files-50k": ProjectSpec(files=50_000),
+        "deps-5": ProjectSpec(deps=5, lock_packages=5),
+        "deps-500": ProjectSpec(deps=500, lock_packages=500),
+        "deps-5000": ProjectSpec(deps=5000, lock_packages=5000),
+        "lock-10kb": ProjectSpec(lock_packages=20, hashes_per_package=4),
+        "lock-1mb": ProjectSpec(lock_packages=2000, hashes_per_package=4),
+        "lock-30mb": ProjectSpec(lock_packages=5000, hashes_per_package=50),
+        "venv-20k": ProjectSpec(venv_files=20_000, venv_depth=8),
+    },
+}
+
+
+def timed(results: dict[str, float], phase: str, func: Callable[[], object]) -> None:
+    start = time.perf_counter()
+    func()
+    results[phase] = time.perf_counter() - start
+
+
+def calibration_workload(work_dir: Path) -> None:
+    # a bit of parsing and of file copying, like the phases
+    document = "\n".join(
+        f'[package-{i}]\nname = "package-{i}"\nversion = "1.{i}.0"\n'
+        for i in range(500)
+    )
+    for _ in range(20):
+        tomllib.loads(document)
+
+    src = work_dir / "src"
+    src.mkdir()
+    for i in range(200):
+        (src / f"file-{i}.txt").write_text(document[: i * 50])
+    shutil.copytree(src, work_dir / "dst")
+
+
+def calibrate(repeat: int) -> float:
+    seconds = []
+    for _ in range(repeat):
+        work_dir = Path(tempfile.mkdtemp(prefix="p2r-bench-"))
+        try:
+            start = time.perf_counter()
+            calibration_workload(work_dir)
+            seconds.append(time.perf_counter() - start)
+        finally:
+            shutil.rmtree(work_dir)
+    return min(seconds)
+
+
+def run_case(spec: ProjectSpec, work_dir: Path) -> dict[str, float]:
+    project_path = generate_project(work_dir / "project", spec)
+    results: dict[str, float] = {}
+
+    clear_caches()
+    project = PoetryProject(project_path)
+    timed(results, "parse", lambda: PoetryProject(project_path))
+    timed(results, "dependencies", lambda: [d.to_str() for d in project.dependencies])
+    if (project_path / "poetry.lock").exists():
+        timed(
+            results,
+            "lock",
+            lambda: poetry_lock_to_requirements(
+                project_path / "poetry.lock",
+                project.dependencies,
+                project.project_name,
+            ),
+        )
+
+    # only the rendering of the plan, not the parsing and conversion before it
+    plan_timings = timings.enable()
+    plan = plan_migration(project_path)
+    timings.disable()
+    results["render"] = plan_timings.phases["render"]
+
+    timed(
+        results,
+        "backup",
+        lambda: create_backup(project_path, mutable=MUTATED_FILES),
+    )
+    # the restore has the migration to undo
+    execute_plan(plan, project_path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        timed(
+            results,
+            "restore",
+            lambda: app_main(["get-backup", str(project_path), "-y"]),
+        )
+
+    return results
+
+
+def compare(
+    results: dict[str, dict[str, float]],
+    baseline: dict[str, dict[str, float]],
+    tolerance: float,
+    min_delta: float = 0.0,
+    scale: float = 1.0,
+) -> list[str]:
+    regressions = []
+    for case, phases in results.items():
+        for phase, seconds in phases.items():
+            base = baseline.get(case, {}).get(phase)
+            if base is not None:
+                base *= scale
+            # (the shortest phases vary by more than tolerance from noise alone)
+            if (
+                base is not None
+                and seconds > base * tolerance
+                and seconds - base > min_delta
+            ):
+                regressions.append(
+                    f"{case}/{phase}: {seconds:.4f}s (baseline {base:.4f}s)"
+                )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--suite", choices=SUITES, default="quick")
+    parser.add_argument("--case", action="append", help="only run the given case")
+    parser.add_argument("--output", type=Path, default=None)
+    parser.add_argument(
+        "--baseline",
+        type=Path,
+        default=Path(__file__).parent / "baseline.json",
+    )
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=1.5)
+    parser.add_argument("--min-delta", type=float, default=0.005)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    calibration = calibrate(args.repeat)
+    print(f"calibration: {calibration:.4f}s", file=sys.stderr)
+
+    results: dict[str, dict[str, float]] = {}
+    for case, spec in SUITES[args.suite].items():
+        if args.case and case not in args.case:
+            continue
+
+        runs = []
+        for _ in range(args.repeat):
+            work_dir = Path(tempfile.mkdtemp(prefix="p2r-bench-"))
+            try:
+                runs.append(run_case(spec, work_dir))
+            finally:
+                shutil.rmtree(work_dir)
+        results[case] = {phase: min(run[phase] for run in runs) for phase in runs[0]}
+
+        phases = ", ".join(f"{k} {v:.4f}s" for k, v in results[case].items())
+        print(f"{case}: {phases}", file=sys.stderr)
+
+    report = {
+        "python": platform.python_version(),
+        "calibration": calibration,
+        "results": results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.save_baseline:
+        baseline = {"calibration": calibration, "results": results}
+        args.baseline.write_text(json.dumps(baseline, indent=2) + "\n")
+        return
+
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text())
+        if "results" in baseline:
+            scale = calibration / baseline["calibration"]
+            baseline = baseline["results"]
+        else:
+            # (recorded without a calibration)
+            scale = 1.0
+        print(
+            f"baseline scaled by {scale:.2f}, tolerance {args.tolerance}x"
+            f" and {args.min_delta}s",
+            file=sys.stderr,
+        )
+        regressions = compare(
+            results,
+            baseline,
+            args.tolerance,
+            args.min_delta,
+            scale,
+        )
+        for regression in regressions:
+            print(f"regression: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
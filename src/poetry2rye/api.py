@@ -0,0 +1,30 @@
+"""
+The in-process API of poetry2rye.
+
+plan_project and plan_migration compute a MigrationPlan without changing
+anything, and execute_plan applies it to a project:
+
+    plan = plan_project(text, name="my-project", lock=lock_text)
+    print(plan.rendered)
+    execute_plan(plan, Path("my-project"))
+"""
+
+from poetry2rye.convert import plan_migration
+from poetry2rye.convert import plan_project
+from poetry2rye.error import ControlledError
+from poetry2rye.plan import DependencyTranslation
+from poetry2rye.plan import FileOperation
+from poetry2rye.plan import MigrationPlan
+from poetry2rye.plan import execute_plan
+from poetry2rye.project import PoetryProject
+
+__all__ = [
+    "ControlledError",
+    "DependencyTranslation",
+    "FileOperation",
+    "MigrationPlan",
+    "PoetryProject",
+    "execute_plan",
+    "plan_migration",
+    "plan_project",
+]
@@ -0,0 +1,145 @@
+import os
+import shutil
+from pathlib import Path
+from typing import TYPE_CHECKING
+from typing import Iterator
+from typing import Optional
+
+from poetry2rye import progress
+from poetry2rye import timings
+from poetry2rye.error import ControlledError
+from poetry2rye.ignore import Excludes
+from poetry2rye.utils import ARCHIVE_CODECS
+
+# (tarfile is imported by the functions using it, as only archive backups need
+# it)
+if TYPE_CHECKING:
+    import tarfile
+
+
+def is_archive(backup_path: Path) -> bool:
+    return backup_path.is_file()
+
+
+def _add_tree(
+    tar: "tarfile.TarFile", src: Path, exclude: Optional[Excludes] = None
+) -> None:
+    stack = [(str(src), "")]
+    while stack:
+        src_dir, rel_dir = stack.pop()
+        timings.count("syscall.scandir")
+        with os.scandir(src_dir) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+
+        for entry in entries:
+            rel = f"{rel_dir}{entry.name}"
+            if exclude is not None and exclude.match(
+                rel, entry.is_dir(follow_symlinks=False)
+            ):
+                continue
+            # gettarinfo uses lstat, so symlinks are kept as symlinks
+            info = tar.gettarinfo(entry.path, arcname=rel)
+
+            if info.isreg():
+                with open(entry.path, "rb") as f:
+                    tar.addfile(info, f)
+                timings.count("files_archived")
+                timings.count("bytes_archived", info.size)
+                progress.advance(info.size)
+            else:
+                tar.addfile(info)
+                if not info.isdir():
+                    progress.advance(0)
+
+            if entry.is_dir(follow_symlinks=False):
+                stack.append((entry.path, f"{rel}/"))
+
+
+def create_archive(
+    src: Path, dst: Path, codec: str = "gz", exclude: Optional[Excludes] = None
+) -> None:
+    """
+    Write the tree at src to the tarball dst, compressed with the given codec.
+
+    The tree is streamed into the archive as it is read, and symlinks and
+    modes are kept.
+    """
+    import tarfile
+
+    if codec not in ARCHIVE_CODECS:
+        raise ControlledError(f"unknown archive codec: {codec}")
+
+    mode = "w|" if codec == "none" else f"w|{codec}"
+    tmp = dst.with_name(f"{dst.name}.tmp")
+    try:
+        with tarfile.open(str(tmp), mode) as tar:
+            _add_tree(tar, src, exclude)
+        os.replace(tmp, dst)
+    except BaseException:
+        if tmp.exists():
+            tmp.unlink()
+        raise
+
+
+def read_archive_file(archive: Path, rel: str) -> Optional[bytes]:
+    import tarfile
+
+    with tarfile.open(str(archive), "r|*") as tar:
+        for member in tar:
+            if member.name == rel and member.isreg():
+                f = tar.extractfile(member)
+                assert f is not None
+                return f.read()
+    return None
+
+
+def _clear_tree(path: Path, rel_dir: str, exclude: Excludes) -> bool:
+    """
+    Remove everything under path but the excluded paths (which are not in
+    the backup), and return whether path is now empty.
+    """
+    empty = True
+    with os.scandir(path) as it:
+        entries = list(it)
+
+    for entry in entries:
+        rel = f"{rel_dir}{entry.name}"
+        is_dir = entry.is_dir(follow_symlinks=False)
+        if exclude.match(rel, is_dir):
+            empty = False
+        elif not is_dir:
+            os.unlink(entry.path)
+        elif _clear_tree(Path(entry.path), f"{rel}/", exclude):
+            os.rmdir(entry.path)
+        else:
+            empty = False
+    return empty
+
+
+def restore_archive(
+    project_path: Path, archive: Path, exclude: Optional[Excludes] = None
+) -> None:
+    import tarfile
+
+    # "r|*" reads the archive as a stream, so it is extracted without seeking
+    # or a temporary copy
+    with tarfile.open(str(archive), "r|*") as tar:
+        if exclude is not None and project_path.exists():
+            _clear_tree(project_path, "", exclude)
+        else:
+            if project_path.exists():
+                shutil.rmtree(project_path)
+            project_path.mkdir()
+
+        def members() -> Iterator["tarfile.TarInfo"]:
+            for member in tar:
+                if not member.isdir():
+                    progress.advance(member.size)
+                yield member
+
+        # the archive is one of our backups, so it is trusted: the other
+        # filters would clear the group and other write and setuid bits
+        if hasattr(tarfile, "fully_trusted_filter"):
+            tar.extractall(project_path, members=members(), filter="fully_trusted")
+        else:
+            tar.extractall(project_path, members=members())
@@ -0,0 +1,204 @@
+import os
+from pathlib import Path
+from typing import Any
+from typing import Optional
+
+from poetry2rye import progress
+from poetry2rye import timings
+from poetry2rye.archive import create_archive
+from poetry2rye.archive import is_archive
+from poetry2rye.archive import read_archive_file
+from poetry2rye.archive import restore_archive
+from poetry2rye.backup_index import allocate_backup_path
+from poetry2rye.backup_index import biggest_backup_number
+from poetry2rye.backup_index import is_incomplete
+from poetry2rye.backup_index import load_index
+from poetry2rye.backup_index import mark_complete
+from poetry2rye.checkpoint import clear_checkpoint
+from poetry2rye.copier import copy_tree
+from poetry2rye.error import ControlledError
+from poetry2rye.ignore import Excludes
+from poetry2rye.journal import PREIMAGE_DIR
+from poetry2rye.journal import Journal
+from poetry2rye.journal import is_journal
+from poetry2rye.locking import project_lock
+from poetry2rye.restore import DirectorySource
+from poetry2rye.restore import ManifestSource
+from poetry2rye.restore import apply_restore
+from poetry2rye.restore import plan_restore
+from poetry2rye.restore import return_excluded
+from poetry2rye.store import create_store_backup
+from poetry2rye.store import is_manifest
+from poetry2rye.utils import archive_backup_path
+from poetry2rye.utils import as_backup_path
+from poetry2rye.utils import backup_path
+from poetry2rye.utils import stored_backup_path
+
+
+def create_backup(
+    project_path: Path,
+    copy_engine: str = "auto",
+    mutable: frozenset[str] = frozenset(),
+    dst: Optional[Path] = None,
+    exclude: Optional[Excludes] = None,
+) -> Path:
+    # with dst (a slot reserved by an interrupted migration), the files
+    # already copied there are kept
+    project_backup = dst or allocate_backup_path(project_path)
+    copy_tree(
+        project_path,
+        project_backup,
+        engine=copy_engine,
+        mutable=mutable,
+        resume=dst is not None,
+        exclude=exclude,
+    )
+    mark_complete(project_backup)
+    return project_backup
+
+
+def create_archive_backup(
+    project_path: Path,
+    codec: str = "gz",
+    dst: Optional[Path] = None,
+    exclude: Optional[Excludes] = None,
+) -> Path:
+    slot = dst or allocate_backup_path(project_path)
+    num = as_backup_path(project_path, slot)
+    assert num is not None
+
+    project_backup = archive_backup_path(project_path, num, codec)
+    if slot.exists():
+        create_archive(project_path, project_backup, codec=codec, exclude=exclude)
+        # the number is held by the archive from now on
+        mark_complete(slot)
+        os.rmdir(slot)
+    return project_backup
+
+
+def create_manifest_backup(
+    project_path: Path,
+    dst: Optional[Path] = None,
+    exclude: Optional[Excludes] = None,
+) -> Path:
+    project_backup = dst or allocate_backup_path(project_path)
+    create_store_backup(project_path, project_backup, exclude=exclude)
+    mark_complete(project_backup)
+    return project_backup
+
+
+def find_backup(project_path: Path, num: Optional[int] = None) -> Path:
+    if num is None:
+        num = biggest_backup_number(project_path)
+        if num is None:
+            raise ControlledError(f"no backup found for {project_path}")
+
+    if num < 0:
+        raise ControlledError("backup number must not be negative")
+
+    path = stored_backup_path(project_path, num)
+    if path is None:
+        raise ControlledError(f"backup not found: {backup_path(project_path, num)}")
+    if is_incomplete(path):
+        raise ControlledError(
+            f"backup {num} of {project_path} is incomplete: "
+            "its migration was interrupted (run mig again to finish it)"
+        )
+
+    return path
+
+
+def _restore_source(project_path: Path, path: Path) -> Any:
+    if is_manifest(path):
+        return ManifestSource(project_path, path)
+    return DirectorySource(path)
+
+
+def preview_restore(project_path: Path, path: Path) -> list[str]:
+    if is_archive(path):
+        raise ControlledError("archive backups cannot be previewed")
+
+    if is_journal(path):
+        return list(Journal.load(project_path, path).describe_replay())
+
+    plan = plan_restore(
+        project_path,
+        _restore_source(project_path, path),
+        exclude=backup_excludes(project_path, path),
+    )
+    return list(plan.describe())
+
+
+def read_backup_file(project_path: Path, path: Path, rel: str) -> Optional[bytes]:
+    """
+    Read the file at rel (relative to the project) as it was in the backup,
+    or return None if it was not there.
+    """
+    if is_archive(path):
+        return read_archive_file(path, rel)
+
+    if is_journal(path):
+        # the first change to the file kept what it was before the migration
+        for entry in Journal.load(project_path, path).entries:
+            if entry.get("path") == rel and entry["op"] in ("write", "remove"):
+                if entry["preimage"] is None:
+                    return None
+                return (path / PREIMAGE_DIR / entry["preimage"]).read_bytes()
+        # not changed by the migration
+        path = project_path
+
+    if is_manifest(path):
+        source = ManifestSource(project_path, path)
+        entry = source.entries.get(rel)
+        if entry is None or entry.type != "file":
+            return None
+        return source.file_path(rel).read_bytes()
+
+    if not (path / rel).is_file():
+        return None
+    return (path / rel).read_bytes()
+
+
+def restore_backup(project_path: Path, path: Path) -> None:
+    with project_lock(project_path), timings.phase("restore"):
+        # (a migration may have removed it before the lock was taken)
+        if not os.path.lexists(path):
+            raise ControlledError(f"backup not found: {path}")
+        _restore_backup(project_path, path)
+        # an interrupted migration is not resumed over the restored project
+        clear_checkpoint(project_path)
+
+
+def backup_excludes(project_path: Path, path: Path) -> Optional[Excludes]:
+    # the paths left out of the backup, which its restore leaves in place
+    num = as_backup_path(project_path, path)
+    for record in load_index(project_path):
+        if record.number == num:
+            return Excludes.from_options(project_path, record.options.get("excludes"))
+    return None
+
+
+def _restore_backup(project_path: Path, path: Path) -> None:
+    exclude = backup_excludes(project_path, path)
+    if exclude is not None:
+        return_excluded(project_path, exclude)
+
+    if is_archive(path):
+        # (the size of the contents is only known once the stream is read)
+        with progress.task("restore", project_path, files=0, size=0):
+            restore_archive(project_path, path, exclude)
+        return
+
+    if is_journal(path):
+        Journal.load(project_path, path).replay()
+        return
+
+    # only the files which differ from the backup are changed
+    source = _restore_source(project_path, path)
+    with timings.phase("restore.plan"):
+        plan = plan_restore(project_path, source, exclude=exclude)
+    size = sum(source.entries[rel].size for rel in plan.copy)
+    with timings.phase("restore.apply"), progress.task(
+        "restore", project_path, files=len(plan.copy), size=size
+    ):
+        apply_restore(project_path, source, plan)
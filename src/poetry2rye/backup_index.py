@@ -0,0 +1,253 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from dataclasses import asdict
+from dataclasses import dataclass
+from dataclasses import field
+from pathlib import Path
+from typing import Any
+from typing import Optional
+
+from poetry2rye.store import ObjectStore
+from poetry2rye.store import is_manifest
+from poetry2rye.store import store_path
+from poetry2rye.utils import ARCHIVE_CODECS
+from poetry2rye.utils import archive_backup_path
+from poetry2rye.utils import as_backup_path
+from poetry2rye.utils import backup_path
+from poetry2rye.utils import stored_backup_path
+
+# the files a migration is computed from
+SOURCE_FILES = ["pyproject.toml", "poetry.lock"]
+# in a backup directory until the backup is complete
+INCOMPLETE_FILE = ".__p2r_incomplete"
+
+
+@dataclass
+class RetentionPolicy:
+    keep_last: Optional[int] = None
+    # in seconds
+    max_age: Optional[float] = None
+    max_bytes: Optional[int] = None
+
+
+@dataclass
+class BackupRecord:
+    number: int
+    created: float
+    size: int
+    mode: str
+    source_hash: Optional[str] = None
+    options: dict[str, Any] = field(default_factory=dict)
+
+
+def index_path(project_path: Path) -> Path:
+    return project_path.parent / f".__p2r_backups_{project_path.name}.json"
+
+
+def tree_size(path: Path) -> int:
+    if not path.is_dir():
+        return path.lstat().st_size
+
+    size = 0
+    stack = [str(path)]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                else:
+                    size += entry.stat(follow_symlinks=False).st_size
+    return size
+
+
+def source_hash(project_path: Path) -> str:
+    h = hashlib.sha256()
+    for name in SOURCE_FILES:
+        h.update(f"{name}\0".encode())
+        if (project_path / name).exists():
+            h.update((project_path / name).read_bytes())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _scanned_mode(path: Path) -> str:
+    # (imported here, as the journal module uses this one)
+    from poetry2rye.journal import is_journal
+
+    if not path.is_dir():
+        return "archive"
+    if is_manifest(path):
+        return "store"
+    return "journal" if is_journal(path) else "full"
+
+
+def _scan_backups(project_path: Path) -> list[BackupRecord]:
+    # finds the backups made before the index existed
+    records = []
+    for bro in project_path.parent.iterdir():
+        num = as_backup_path(project_path, bro)
+        if num is None or is_incomplete(bro):
+            continue
+        records.append(
+            BackupRecord(
+                number=num,
+                created=bro.lstat().st_mtime,
+                size=tree_size(bro),
+                mode=_scanned_mode(bro),
+            )
+        )
+    return sorted(records, key=lambda r: r.number)
+
+
+def load_index(project_path: Path) -> list[BackupRecord]:
+    path = index_path(project_path)
+    if not path.exists():
+        if not project_path.parent.exists():
+            return []
+        records = _scan_backups(project_path)
+        if records:
+            save_index(project_path, records)
+        return records
+
+    with open(path) as f:
+        return [BackupRecord(**record) for record in json.load(f)["backups"]]
+
+
+def save_index(project_path: Path, records: list[BackupRecord]) -> None:
+    path = index_path(project_path)
+    # (a unique name, as processes scanning for old backups save it at once)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f"{path.name}.", suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(
+            {"version": 1, "backups": [asdict(record) for record in records]},
+            f,
+            indent=2,
+        )
+    os.replace(tmp, path)
+
+
+def biggest_backup_number(project_path: Path) -> Optional[int]:
+    for record in sorted(load_index(project_path), key=lambda r: -r.number):
+        if stored_backup_path(project_path, record.number) is not None:
+            return record.number
+    return None
+
+
+def next_backup_path(project_path: Path) -> Path:
+    # numbers of deleted backups are not reused
+    numbers = [record.number for record in load_index(project_path)]
+    return backup_path(project_path, max(numbers) + 1 if numbers else 0)
+
+
+def allocate_backup_path(project_path: Path) -> Path:
+    """
+    Reserve the next backup number by creating the backup directory, marked
+    as incomplete until mark_complete is called.
+
+    The directory is created exclusively, so processes backing up at the same
+    time get different numbers. An archive backup removes it when written.
+    """
+    num = as_backup_path(project_path, next_backup_path(project_path))
+    assert num is not None
+
+    while True:
+        path = backup_path(project_path, num)
+        try:
+            os.mkdir(path)
+        except FileExistsError:
+            num += 1
+            continue
+
+        if any(
+            os.path.lexists(archive_backup_path(project_path, num, codec))
+            for codec in ARCHIVE_CODECS
+        ):
+            os.rmdir(path)
+            num += 1
+            continue
+
+        (path / INCOMPLETE_FILE).touch()
+        return path
+
+
+def is_incomplete(path: Path) -> bool:
+    return (path / INCOMPLETE_FILE).exists()
+
+
+def mark_complete(path: Path) -> None:
+    (path / INCOMPLETE_FILE).unlink(missing_ok=True)
+
+
+def record_backup(
+    project_path: Path,
+    path: Path,
+    mode: str,
+    source: Optional[str],
+    options: dict[str, Any],
+) -> BackupRecord:
+    num = as_backup_path(project_path, path)
+    assert num is not None
+
+    record = BackupRecord(
+        number=num,
+        created=time.time(),
+        size=tree_size(path),
+        mode=mode,
+        source_hash=source,
+        options=options,
+    )
+    records = [r for r in load_index(project_path) if r.number != num]
+    save_index(project_path, records + [record])
+    return record
+
+
+def remove_backup(project_path: Path, record: BackupRecord) -> None:
+    path = stored_backup_path(project_path, record.number)
+    if path is None:
+        return
+    if path.is_dir() and not path.is_symlink():
+        shutil.rmtree(path)
+    else:
+        path.unlink()
+
+
+def apply_retention(project_path: Path, policy: RetentionPolicy) -> list[BackupRecord]:
+    """
+    Remove the backups not allowed by the policy and return them.
+
+    The latest backup is always kept.
+    """
+    records = sorted(load_index(project_path), key=lambda r: -r.number)
+    if not records:
+        return []
+
+    now = time.time()
+    kept = [records[0]]
+    evicted = []
+    for i, record in enumerate(records[1:], start=1):
+        if policy.keep_last is not None and i >= policy.keep_last:
+            evicted.append(record)
+        elif policy.max_age is not None and now - record.created > policy.max_age:
+            evicted.append(record)
+        else:
+            kept.append(record)
+
+    if policy.max_bytes is not None:
+        while len(kept) > 1 and sum(r.size for r in kept) > policy.max_bytes:
+            evicted.append(kept.pop())
+
+    for record in evicted:
+        remove_backup(project_path, record)
+
+    if evicted:
+        save_index(project_path, sorted(kept, key=lambda r: r.number))
+
+    # the objects of removed backups may still be used by other backups
+    if any(record.mode == "store" for record in evicted):
+        ObjectStore(store_path(project_path)).collect_garbage()
+
+    return evicted
@@ -0,0 +1,215 @@
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import as_completed
+from contextlib import redirect_stdout
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import Any
+from typing import Callable
+from typing import Iterator
+from typing import Optional
+from typing import TextIO
+
+from poetry2rye import timings
+from poetry2rye.backup_index import biggest_backup_number
+from poetry2rye.error import ControlledError
+from poetry2rye.utils import is_poetry_project
+from poetry2rye.utils import parse_backup_name
+
+# directories that never contain projects worth migrating
+SKIP_DIRS = {"node_modules", "__pycache__", "venv"}
+
+
+def relative_name(root: Path, path: Path) -> str:
+    return path.relative_to(root).as_posix()
+
+
+def matches_any(name: str, patterns: list[str]) -> bool:
+    return any(fnmatch(name, pattern) for pattern in patterns)
+
+
+def _walk(root: Path) -> Iterator[tuple[Path, list[str], list[str]]]:
+    for dirpath, dirnames, filenames in os.walk(root):
+        yield Path(dirpath), dirnames, filenames
+        dirnames[:] = sorted(
+            d for d in dirnames if not d.startswith(".") and d not in SKIP_DIRS
+        )
+
+
+def find_projects(root: Path, include: list[str], exclude: list[str]) -> Iterator[Path]:
+    for dirpath, _, filenames in _walk(root):
+        if "pyproject.toml" not in filenames:
+            continue
+
+        name = relative_name(root, dirpath)
+        if matches_any(name, include) and not matches_any(name, exclude):
+            yield dirpath
+
+
+def find_backed_up_projects(root: Path) -> Iterator[Path]:
+    if biggest_backup_number(root) is not None:
+        yield root
+
+    for dirpath, dirnames, filenames in _walk(root):
+        found = set()
+        # (archive backups are files)
+        for d in dirnames + filenames:
+            parsed = parse_backup_name(d)
+            if parsed is not None:
+                found.add(parsed[0])
+        for f in filenames:
+            if f.startswith(".__p2r_backups_") and f.endswith(".json"):
+                found.add(f.removeprefix(".__p2r_backups_").removesuffix(".json"))
+
+        for name in sorted(found):
+            if biggest_backup_number(dirpath / name) is not None:
+                yield dirpath / name
+
+
+def _run_job(project_path: str, job: Callable[[Path], Optional[str]]) -> dict[str, Any]:
+    record: dict[str, Any] = {"path": project_path}
+    output = io.StringIO()
+    if timings.destination_from_env() is not None:
+        timings.enable()
+    start = time.perf_counter()
+
+    try:
+        with redirect_stdout(output):
+            skipped = job(Path(project_path))
+    except ControlledError as e:
+        record["status"] = "error"
+        record["message"] = str(e)
+    except Exception as e:
+        record["status"] = "error"
+        record["message"] = f"unexpected error: {type(e).__name__}: {e}"
+    else:
+        if skipped is not None:
+            record["status"] = "skipped"
+            record["message"] = skipped
+        else:
+            record["status"] = "ok"
+
+    record["duration"] = round(time.perf_counter() - start, 6)
+    job_timings = timings.disable()
+    if job_timings is not None:
+        record["timings"] = job_timings.to_dict()
+    if output.getvalue():
+        record["output"] = output.getvalue()
+
+    return record
+
+
+def migrate_one(
+    project_path: str, options: dict[str, Any], check: bool
+) -> dict[str, Any]:
+    changed = False
+    warnings: list[str] = []
+
+    def job(path: Path) -> Optional[str]:
+        nonlocal changed, warnings
+
+        if not is_poetry_project(path):
+            return "not managed by poetry"
+
+        if check:
+            from poetry2rye.convert import plan_migration
+
+            plan = plan_migration(
+                path,
+                ensure_src=options["ensure_src"],
+                virtual_project=options["virtual_project"],
+                translate_lock=options["translate_lock"],
+                use_cache=options["use_cache"],
+                workspace=options.get("workspace"),
+                write_cache=False,
+            )
+            changed = bool(plan.operations or plan.warnings)
+            warnings = plan.warnings
+            return None
+
+        from poetry2rye.convert import convert
+
+        convert(path, **options)
+        return None
+
+    record = _run_job(project_path, job)
+    if check and record["status"] == "ok":
+        record["changed"] = changed
+        record["warnings"] = warnings
+
+    return record
+
+
+def restore_one(project_path: str, num: Optional[int] = None) -> dict[str, Any]:
+    def job(path: Path) -> Optional[str]:
+        from poetry2rye.backup import find_backup
+        from poetry2rye.backup import restore_backup
+
+        backup = find_backup(path, num)
+        restore_backup(path, backup)
+        print(f"restored backup: {backup}")
+        return None
+
+    return _run_job(project_path, job)
+
+
+def run_parallel(
+    jobs: list[tuple[Callable[..., dict[str, Any]], tuple[Any, ...]]],
+    max_workers: Optional[int],
+    out: Optional[TextIO],
+    records: Optional[list[dict[str, Any]]] = None,
+) -> dict[str, int]:
+    # with records, the records of the jobs are also collected there
+    out = out or sys.stdout
+    counts = {"ok": 0, "skipped": 0, "error": 0, "changed": 0}
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(func, *args) for func, args in jobs]
+        for future in as_completed(futures):
+            record = future.result()
+            counts[record["status"]] += 1
+            if record.get("changed"):
+                counts["changed"] += 1
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            if records is not None:
+                records.append(record)
+
+    return counts
+
+
+def migrate_all(
+    root: Path,
+    include: list[str],
+    exclude: list[str],
+    ignore_src: list[str],
+    virtual: list[str],
+    options: dict[str, Any],
+    check: bool = False,
+    max_workers: Optional[int] = None,
+    out: Optional[TextIO] = None,
+) -> dict[str, int]:
+    jobs = []
+    for project_path in find_projects(root, include, exclude):
+        name = relative_name(root, project_path)
+        project_options = {
+            **options,
+            "ensure_src": not matches_any(name, ignore_src),
+            "virtual_project": matches_any(name, virtual),
+        }
+        jobs.append((migrate_one, (str(project_path), project_options, check)))
+
+    return run_parallel(jobs, max_workers, out)
+
+
+def restore_all(
+    projects: list[Path],
+    max_workers: Optional[int] = None,
+    out: Optional[TextIO] = None,
+) -> dict[str, int]:
+    jobs = [(restore_one, (str(project_path),)) for project_path in projects]
+    return run_parallel(jobs, max_workers, out)
@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+from dataclasses import asdict
+from functools import cache
+from pathlib import Path
+from typing import Any
+from typing import Optional
+
+from poetry2rye import timings
+from poetry2rye.plan import MigrationPlan
+from poetry2rye.plan import plan_from_dict
+from poetry2rye.sync import state_path
+from poetry2rye.utils import CACHE_DIR_ENV
+from poetry2rye.utils import parse_size
+
+# the size the plan cache is kept under, e.g. 100M
+CACHE_SIZE_ENV = "P2R_CACHE_SIZE"
+DEFAULT_CACHE_SIZE = 64 << 20
+
+# the size of each plan cache, measured once per process and then kept up to
+# date with the plans the process stores, so that storing a plan does not
+# read the whole cache
+_cache_sizes: dict[Path, int] = {}
+
+
+@cache
+def tool_version() -> str:
+    # (importlib.metadata is slow to import)
+    from importlib.metadata import PackageNotFoundError
+    from importlib.metadata import version
+
+    try:
+        return version("poetry2rye")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def default_cache_dir() -> Path:
+    if os.environ.get(CACHE_DIR_ENV):
+        return Path(os.environ[CACHE_DIR_ENV])
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "poetry2rye"
+
+
+def _listing(path: Path) -> list[str]:
+    try:
+        return sorted(os.listdir(path))
+    except FileNotFoundError:
+        return []
+
+
+def plan_key(project_path: Path, options: dict[str, Any]) -> str:
+    """
+    Hash everything a migration plan depends on: the project files it reads,
+    the layout of the project, the options and the version of poetry2rye.
+    """
+    h = hashlib.sha256()
+    for part in [
+        tool_version(),
+        project_path.name,
+        json.dumps(options, sort_keys=True),
+        json.dumps(_listing(project_path)),
+        json.dumps(_listing(project_path / "src")),
+    ]:
+        h.update(part.encode())
+        h.update(b"\0")
+
+    # (a [project] section written by sync is planned from the synced state)
+    for path in [
+        project_path / "pyproject.toml",
+        project_path / "poetry.lock",
+        state_path(project_path),
+    ]:
+        try:
+            h.update(path.read_bytes())
+        except FileNotFoundError:
+            h.update(b"missing")
+        h.update(b"\0")
+
+    return h.hexdigest()
+
+
+class PlanCache:
+    """
+    Migration plans stored on disk by plan_key, the least recently used of
+    which are removed when the cache grows over max_bytes.
+    """
+
+    def __init__(self, path: Path, max_bytes: int = DEFAULT_CACHE_SIZE) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def default(cls) -> "PlanCache":
+        size = os.environ.get(CACHE_SIZE_ENV)
+        return cls(
+            default_cache_dir(), parse_size(size) if size else DEFAULT_CACHE_SIZE
+        )
+
+    def _entry(self, key: str) -> Path:
+        return self.path / key[:2] / f"{key}.json"
+
+    def get(self, key: str, touch: bool = True) -> Optional[MigrationPlan]:
+        # without touch, the cache is only read
+        entry = self._entry(key)
+        try:
+            with open(entry) as f:
+                plan = plan_from_dict(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError):
+            timings.count("cache.miss")
+            return None
+
+        if touch:
+            try:
+                # the mtime tells when the entry was last used
+                os.utime(entry)
+            except OSError:
+                pass
+        timings.count("cache.hit")
+        return plan
+
+    def put(self, key: str, plan: MigrationPlan) -> None:
+        entry = self._entry(key)
+        try:
+            entry.parent.mkdir(parents=True, exist_ok=True)
+            tmp = entry.with_name(f"{entry.name}.{os.getpid()}.tmp")
+            size = self.size()
+            with open(tmp, "w") as f:
+                json.dump(asdict(plan), f)
+            size += tmp.stat().st_size
+            os.replace(tmp, entry)
+            # (other processes storing plans meanwhile are only seen here)
+            if size > self.max_bytes:
+                size = self.evict()
+            _cache_sizes[self.path] = size
+        except OSError:
+            # the cache is only an optimization
+            pass
+
+    def size(self) -> int:
+        size = _cache_sizes.get(self.path)
+        if size is None:
+            size = sum(entry.stat().st_size for entry in self.path.glob("*/*.json"))
+            _cache_sizes[self.path] = size
+        return size
+
+    def evict(self) -> int:
+        # returns the size left
+        entries = []
+        for entry in self.path.glob("*/*.json"):
+            st = entry.stat()
+            entries.append((st.st_mtime, st.st_size, entry))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            entry.unlink(missing_ok=True)
+            total -= size
+        return total
@@ -0,0 +1,83 @@
+import json
+import os
+from dataclasses import asdict
+from dataclasses import dataclass
+from dataclasses import field
+from pathlib import Path
+from typing import Any
+from typing import Optional
+
+from poetry2rye.plan import MigrationPlan
+from poetry2rye.plan import plan_from_dict
+
+
+def checkpoint_path(project_path: Path) -> Path:
+    return project_path.parent / f".__p2r_checkpoint_{project_path.name}.json"
+
+
+def progress_path(project_path: Path) -> Path:
+    # the changes to the checkpoint since it was saved, as JSON lines
+    return project_path.parent / f".__p2r_checkpoint_{project_path.name}.log"
+
+
+@dataclass
+class Checkpoint:
+    """
+    How far a migration got, saved as it goes so that an interrupted one is
+    resumed by the next mig of the project.
+
+    The checkpoint (with its plan) is saved once; how far it got is then
+    appended to its log by update.
+    """
+
+    plan: MigrationPlan
+    # the backup slot, then the backup once it is complete
+    backup: str
+    backup_mode: str
+    source_hash: str
+    options: dict[str, Any] = field(default_factory=dict)
+    backup_done: bool = False
+    # the number of operations of the plan applied to the project
+    applied: int = 0
+
+    @classmethod
+    def load(cls, project_path: Path) -> Optional["Checkpoint"]:
+        try:
+            with open(checkpoint_path(project_path)) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+
+        del data["version"]
+        data["plan"] = plan_from_dict(data["plan"])
+        try:
+            with open(progress_path(project_path)) as f:
+                for line in f:
+                    try:
+                        data.update(json.loads(line))
+                    except ValueError:
+                        # (the last line, cut by an interruption)
+                        break
+        except FileNotFoundError:
+            pass
+        return cls(**data)
+
+    def save(self, project_path: Path) -> None:
+        path = checkpoint_path(project_path)
+        tmp = path.with_name(f"{path.name}.tmp")
+        with open(tmp, "w") as f:
+            json.dump({"version": 2, **asdict(self)}, f)
+        progress_path(project_path).unlink(missing_ok=True)
+        os.replace(tmp, path)
+
+    def update(self, project_path: Path, **changes: Any) -> None:
+        # (one short line, whatever the size of the plan)
+        for key, value in changes.items():
+            setattr(self, key, value)
+        with open(progress_path(project_path), "a") as f:
+            f.write(json.dumps(changes) + "\n")
+
+
+def clear_checkpoint(project_path: Path) -> None:
+    checkpoint_path(project_path).unlink(missing_ok=True)
+    progress_path(project_path).unlink(missing_ok=True)
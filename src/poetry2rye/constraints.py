@@ -0,0 +1,50 @@
+import re
+from functools import lru_cache
+from typing import Union
+
+from poetry.core.constraints.version import Version
+from poetry.core.constraints.version.parser import parse_constraint
+from poetry.core.constraints.version.version_constraint import VersionConstraint
+from poetry.core.packages.dependency import Dependency
+from poetry.core.version.helpers import format_python_constraint
+
+PYTHON_MARKER = re.compile(r"(\d+(\.\d+)?)")
+
+# the caches are shared by every project converted in the process, so that a
+# batch run parses each distinct constraint only once
+CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_version_constraint(constraint: str) -> VersionConstraint:
+    return parse_constraint(constraint)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def format_constraint(constraint: Union[VersionConstraint, str]) -> str:
+    return format_python_constraint(constraint)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def format_python_marker(python: Union[VersionConstraint, str]) -> str:
+    py_version = PYTHON_MARKER.sub(r"'\1'", format_constraint(python))
+    return f"python_version {py_version}"
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_requirement(requirement: str) -> Dependency:
+    # a PEP 508 requirement
+    return Dependency.create_from_pep_508(requirement)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_version(version: str) -> Version:
+    return Version.parse(version)
+
+
+def clear_caches() -> None:
+    parse_version_constraint.cache_clear()
+    parse_requirement.cache_clear()
+    parse_version.cache_clear()
+    format_constraint.cache_clear()
+    format_python_marker.cache_clear()
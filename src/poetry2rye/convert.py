@@ -1,15 +1,52 @@
 import os
 import shutil
 from copy import deepcopy
+from dataclasses import replace
 from itertools import filterfalse
 from pathlib import Path
-from typing import Any
+from typing import Any, Optional, Sequence, Union
 
 import tomlkit
-from poetry.core.version.helpers import format_python_constraint
 
+from poetry2rye import progress
+from poetry2rye import timings
+from poetry2rye.backup import create_archive_backup
+from poetry2rye.backup import create_backup
+from poetry2rye.backup import create_manifest_backup
+from poetry2rye.backup_index import RetentionPolicy
+from poetry2rye.backup_index import allocate_backup_path
+from poetry2rye.backup_index import apply_retention
+from poetry2rye.backup_index import record_backup
+from poetry2rye.backup_index import source_hash
+from poetry2rye.cache import PlanCache
+from poetry2rye.cache import plan_key
+from poetry2rye.checkpoint import Checkpoint
+from poetry2rye.checkpoint import clear_checkpoint
+from poetry2rye.constraints import format_constraint
+from poetry2rye.copier import resolve_engine
+from poetry2rye.ignore import Excludes
+from poetry2rye.journal import Journal
+from poetry2rye.lock import poetry_lock_to_requirements
+from poetry2rye.locking import project_lock
+from poetry2rye.pathindex import PathIndex
+from poetry2rye.plan import DependencyTranslation
+from poetry2rye.plan import FileOperation
+from poetry2rye.plan import MigrationPlan
+from poetry2rye.plan import execute_plan
+from poetry2rye.plan import find_warnings
+from poetry2rye.preflight import TreeSize
+from poetry2rye.preflight import check_disk_space
+from poetry2rye.preflight import scan_size
 from poetry2rye.project import BasicDependency, PoetryProject
-from poetry2rye.utils import get_next_backup_path
+from poetry2rye.project import Dependency
+from poetry2rye.project import PathDependency
+from poetry2rye.sync import load_synced
+
+
+# files which the migration changes in place (so they must never be hard-linked)
+MUTATED_FILES = frozenset(
+    {"pyproject.toml", "poetry.lock", "requirements.lock", "requirements-dev.lock"}
+)
 
 
 def read_name_email(string: str) -> dict[str, str]:
@@ -17,10 +54,93 @@ def read_name_email(string: str) -> dict[str, str]:
     return {"name": name, "email": email[1:-1]}
 
 
-def convert(
-    project_path: Path, ensure_src: bool = True, virtual_project: bool = False
-) -> None:
-    poetry_project = PoetryProject(project_path, ensure_src=ensure_src)
+def plan_migration(
+    project_path: Path,
+    ensure_src: bool = True,
+    virtual_project: bool = False,
+    translate_lock: bool = True,
+    use_cache: bool = False,
+    workspace: Optional[dict[str, str]] = None,
+    write_cache: bool = True,
+) -> MigrationPlan:
+    # with use_cache, plans are kept in the plan cache, so an unchanged
+    # project is not parsed and rendered again. without write_cache, the
+    # cache is only read (for the commands which write nothing).
+    if use_cache:
+        plan_cache = PlanCache.default()
+        key = plan_key(
+            project_path,
+            {
+                "ensure_src": ensure_src,
+                "virtual_project": virtual_project,
+                "translate_lock": translate_lock,
+                "workspace": workspace,
+            },
+        )
+        cached = plan_cache.get(key, touch=write_cache)
+        if cached is not None:
+            return cached
+
+    lock_path = project_path / "poetry.lock"
+    # (a [project] section written by sync is taken over by the migration)
+    synced = load_synced(project_path)
+    project = PoetryProject(
+        project_path, ensure_src=ensure_src, allow_project=synced is not None
+    )
+    plan = plan_project(
+        project,
+        ensure_src=ensure_src,
+        virtual_project=virtual_project,
+        translate_lock=translate_lock,
+        lock=lock_path if lock_path.exists() else None,
+        workspace=workspace,
+        synced=synced,
+    )
+
+    # (the globs of packages and include are resolved against every path in
+    # the project, which the key does not cover)
+    if use_cache and write_cache and not project.walked:
+        plan_cache.put(key, plan)
+    return plan
+
+
+def plan_project(
+    project: Union[PoetryProject, str],
+    name: Optional[str] = None,
+    ensure_src: bool = True,
+    virtual_project: bool = False,
+    translate_lock: bool = True,
+    lock: Optional[Union[Path, str]] = None,
+    workspace: Optional[dict[str, str]] = None,
+    synced: Optional[dict[str, Any]] = None,
+    src_layout: bool = False,
+) -> MigrationPlan:
+    """
+    Plan the migration of a project, without changing anything.
+
+    project is a PoetryProject, or the contents of pyproject.toml with the
+    name of the project directory in name (then nothing is read from disk, and
+    src_layout tells whether the project has a src directory).
+    lock is the path of the project's poetry.lock, or its contents, if it has one.
+    workspace maps the (resolved) directories of the members of the rye
+    workspace the project is in to their names, which path dependencies on
+    them are required by.
+    synced is the state sync last brought the [project] section of the project
+    to: the section is then kept (with its edits by hand) and brought up to
+    date, instead of made anew.
+    """
+    if isinstance(project, str):
+        if name is None:
+            raise ValueError("name is required to plan from pyproject.toml contents")
+        poetry_project = PoetryProject.from_text(
+            project,
+            name,
+            ensure_src=ensure_src,
+            src_layout=src_layout,
+            allow_project=synced is not None,
+        )
+    else:
+        poetry_project = project
 
     project_sec = {}
     urls_sec = {}
@@ -66,23 +186,25 @@ def convert(
     if poetry_project.poetry.get("classifiers"):
         project_sec["classifiers"] = poetry_project.poetry["classifiers"]
 
-    # packages
-    if poetry_project.poetry.get("packages"):
-        # ToDo
-        pass
-
     # dependencies
     project_sec["dependencies"] = tomlkit.array()
+    translations = []
     for dep in poetry_project.dependencies:
         if dep.is_python_dep():
             assert isinstance(dep, BasicDependency)
-            project_sec["requires-python"] = format_python_constraint(dep.version)
+            project_sec["requires-python"] = format_constraint(dep.version)
         else:
+            requirement = _requirement(poetry_project, dep, workspace)
             if dep.is_dev:
                 tool_rye_sec.setdefault("dev-dependencies", tomlkit.array())
-                tool_rye_sec["dev-dependencies"].add_line(dep.to_str())
+                tool_rye_sec["dev-dependencies"].add_line(requirement)
             else:
-                project_sec["dependencies"].add_line(dep.to_str())
+                project_sec["dependencies"].add_line(requirement)
+            translations.append(
+                DependencyTranslation(
+                    dep.name, "dev" if dep.is_dev else "main", requirement
+                )
+            )
     if "dev-dependencies" in tool_rye_sec:
         tool_rye_sec["dev-dependencies"].add_line(indent="")
     project_sec["dependencies"].add_line(indent="")
@@ -91,15 +213,32 @@ def convert(
     if poetry_project.poetry.get("scripts"):
         project_sec["scripts"] = _convert_scripts(poetry_project.poetry["scripts"])
 
-    with open(project_path / "pyproject.toml") as f:
-        pyproject = tomlkit.load(f)
+    original = poetry_project.text
+    # (the tables taken into the result are changed there, so the document of
+    # the project is left as it is)
+    pyproject = deepcopy(poetry_project.document)
 
     # create result
     result = tomlkit.document()
 
-    result["project"] = project_sec
-    if urls_sec:
-        result["project.urls"] = urls_sec
+    if synced is not None and "project" in pyproject:
+        from poetry2rye.sync import patch_document
+        from poetry2rye.sync import target_state
+
+        patch_document(pyproject, synced, target_state(poetry_project))
+        result["project"] = pyproject["project"]
+    else:
+        result["project"] = project_sec
+        if urls_sec:
+            result["project.urls"] = urls_sec
+
+    # settings of rye already there (like the dev-dependencies kept by sync)
+    for key, value in pyproject.get("tool", {}).get("rye", {}).items():
+        if key in ("managed", "virtual"):
+            continue
+        if key == "dev-dependencies" and synced is None:
+            continue
+        tool_rye_sec[key] = value
 
     # first add rye to tool section
     tool_table = tomlkit.table()
@@ -109,16 +248,15 @@ def convert(
         if name == "project":
             continue
         elif name == "tool":
-            # add items to tool table
+            # add items to tool table, except poetry (and rye, added above)
             for key, value in pyproject["tool"].items():
-                tool_table.add(key, value)
-            # remove poetry
-            tool_table.pop("poetry")
+                if key not in ("poetry", "rye"):
+                    tool_table.add(key, value)
             result["tool"] = tool_table
 
         elif name == "build-system":
             if not virtual_project:
-                result["build-system"] = deepcopy(pyproject["build-system"])
+                result["build-system"] = pyproject["build-system"]
                 result["build-system"]["requires"] = list(
                     filterfalse(
                         lambda x: "poetry-core" in x, result["build-system"]["requires"]
@@ -127,47 +265,369 @@ def convert(
                 result["build-system"]["requires"].append("hatchling")
                 result["build-system"]["build-backend"] = "hatchling.build"
         else:
-            result[name] = deepcopy(pyproject[name])
+            result[name] = pyproject[name]
 
+    warnings: list[str] = []
     # handle build config if project is not virtual (virtual : only dependency manager)
     if not virtual_project:
-        if ensure_src:
-            packages = [f"src/{poetry_project.module_name}"]
-        else:
-            packages = [
-                item["include"]
-                for item in poetry_project.poetry.get("packages", [])
-                if "include" in item
-            ]
-
         result["tool"]["hatch"] = {"metadata": {"allow-direct-references": True}}
-        result["tool"]["hatch"]["build"] = {
-            "targets": {"wheel": {"packages": packages}}
-        }
-
-    project_backup = get_next_backup_path(project_path)
-    shutil.copytree(project_path, project_backup, dirs_exist_ok=True, symlinks=True)
-    print(f"created backup: {project_backup}")
+        # (with ensure_src, the project is only walked for include)
+        walk = not ensure_src or bool(poetry_project.poetry.get("include"))
+        result["tool"]["hatch"]["build"] = _convert_packages(
+            poetry_project.poetry,
+            poetry_project.index if walk else None,
+            [f"src/{poetry_project.module_name}"] if ensure_src else None,
+            warnings,
+        )
+
+    lock_files: dict[str, str] = {}
+    if translate_lock and lock is not None:
+        with timings.phase("lock.translate"):
+            (
+                lock_files["requirements.lock"],
+                lock_files["requirements-dev.lock"],
+            ) = poetry_lock_to_requirements(
+                lock, poetry_project.dependencies, poetry_project.project_name
+            )
 
-    with open(project_path / "pyproject.toml", "w") as f:
-        f.write(tomlkit.dumps(result))
+    with timings.phase("render"):
+        rendered = tomlkit.dumps(result)
+
+    operations = [FileOperation("write", "pyproject.toml", content=rendered)]
+    for file_name, content in lock_files.items():
+        operations.append(FileOperation("write", file_name, content=content))
+    if lock is not None:
+        operations.append(FileOperation("remove", "poetry.lock"))
+
+    if ensure_src and not poetry_project.src_layout:
+        operations.append(FileOperation("mkdir", "src"))
+        operations.append(
+            FileOperation(
+                "move",
+                poetry_project.module_path.relative_to(poetry_project.path).as_posix(),
+                dst=f"src/{poetry_project.module_name}",
+            )
+        )
+
+    return MigrationPlan(
+        original=original,
+        rendered=rendered,
+        warnings=tuple(warnings + find_warnings(rendered)),
+        operations=tuple(operations),
+        dependencies=tuple(translations),
+        requires_python=project_sec.get("requires-python"),
+    )
 
-    # find "poetry" in pyproject.toml and print it
-    with open(project_path / "pyproject.toml") as f:
-        for num, content in enumerate(f.readlines(), start=1):
-            if "poetry" in content:
-                print(f"Warning: found 'poetry' in line {num}: {content.strip()}")
 
-    if (project_path / "poetry.lock").exists():
-        os.remove(project_path / "poetry.lock")
+def convert(
+    project_path: Path,
+    ensure_src: bool = True,
+    virtual_project: bool = False,
+    copy_engine: str = "auto",
+    backup_mode: str = "full",
+    archive_codec: str = "gz",
+    translate_lock: bool = True,
+    retention: Optional[RetentionPolicy] = None,
+    use_cache: bool = False,
+    backup_exclude: Sequence[str] = (),
+    backup_gitignore: bool = False,
+    workspace: Optional[dict[str, str]] = None,
+) -> None:
+    with project_lock(project_path):
+        _convert(
+            project_path,
+            ensure_src=ensure_src,
+            virtual_project=virtual_project,
+            copy_engine=copy_engine,
+            backup_mode=backup_mode,
+            archive_codec=archive_codec,
+            translate_lock=translate_lock,
+            retention=retention,
+            use_cache=use_cache,
+            backup_exclude=backup_exclude,
+            backup_gitignore=backup_gitignore,
+            workspace=workspace,
+        )
+
+
+def _convert(
+    project_path: Path,
+    ensure_src: bool,
+    virtual_project: bool,
+    copy_engine: str,
+    backup_mode: str,
+    archive_codec: str,
+    translate_lock: bool,
+    retention: Optional[RetentionPolicy],
+    use_cache: bool,
+    backup_exclude: Sequence[str],
+    backup_gitignore: bool,
+    workspace: Optional[dict[str, str]],
+) -> None:
+    options: dict[str, Any] = {
+        "ensure_src": ensure_src,
+        "virtual_project": virtual_project,
+        "copy_engine": copy_engine,
+        "archive_codec": archive_codec,
+        "translate_lock": translate_lock,
+        "excludes": None,
+    }
+    checkpoint = Checkpoint.load(project_path)
+    changed = []
+    if checkpoint is not None:
+        changed = [
+            key
+            for key, value in options.items()
+            if key != "excludes" and checkpoint.options.get(key) != value
+        ]
+        if checkpoint.backup_mode != backup_mode:
+            changed.append("backup_mode")
+    if (
+        checkpoint is not None
+        and checkpoint.applied == 0
+        and (changed or checkpoint.source_hash != source_hash(project_path))
+    ):
+        # the project or the options changed since, and nothing of the
+        # migration is left to finish
+        if checkpoint.backup and not checkpoint.backup_done:
+            shutil.rmtree(checkpoint.backup, ignore_errors=True)
+        checkpoint = None
+
+    if checkpoint is None:
+        with timings.phase("plan"):
+            plan = plan_migration(
+                project_path,
+                ensure_src=ensure_src,
+                virtual_project=virtual_project,
+                translate_lock=translate_lock,
+                use_cache=use_cache,
+                workspace=workspace,
+            )
+        checkpoint = Checkpoint(
+            plan=plan,
+            backup="",
+            backup_mode=backup_mode,
+            source_hash=source_hash(project_path),
+            options=options,
+        )
+        if backup_exclude or backup_gitignore:
+            # what the migration changes is always backed up
+            keep = set(MUTATED_FILES)
+            moves = {}
+            for op in plan.operations:
+                keep.add(op.path)
+                if op.dst is not None:
+                    keep.add(op.dst)
+                    moves[op.dst] = op.path
+            checkpoint.options["excludes"] = Excludes(
+                project_path, backup_exclude, backup_gitignore, keep, moves
+            ).to_options()
+    else:
+        # the project is partly migrated, so it is finished as it was started
+        print(f"resuming the interrupted migration of {project_path}")
+        if changed:
+            print(
+                "Warning: the interrupted migration is finished with the options"
+                f" it was started with, not the given {', '.join(changed)}"
+                " (restore it with get-backup and rerun mig to use them)"
+            )
+        plan = checkpoint.plan
+        backup_mode = checkpoint.backup_mode
+
+    exclude = Excludes.from_options(project_path, checkpoint.options.get("excludes"))
+    tree_size = None
+    if not checkpoint.backup_done and backup_mode != "journal":
+        with timings.phase("preflight"):
+            tree_size = _preflight(project_path, checkpoint, exclude)
+
+    if not checkpoint.backup:
+        checkpoint.backup = str(allocate_backup_path(project_path))
+        checkpoint.save(project_path)
+
+    project_backup = Path(checkpoint.backup)
+    journal: Optional[Journal] = None
+    with timings.phase("backup"), progress.task(
+        "backup",
+        project_path,
+        files=tree_size.files if tree_size else 0,
+        size=tree_size.bytes if tree_size else 0,
+    ):
+        if backup_mode == "journal":
+            if checkpoint.backup_done:
+                journal = Journal.load(project_path, project_backup)
+            else:
+                journal = Journal.create(project_path, project_backup)
+        elif checkpoint.backup_done:
+            pass
+        elif backup_mode == "store":
+            create_manifest_backup(project_path, project_backup, exclude=exclude)
+        elif backup_mode == "archive":
+            project_backup = create_archive_backup(
+                project_path,
+                codec=checkpoint.options["archive_codec"],
+                dst=project_backup,
+                exclude=exclude,
+            )
+        else:
+            create_backup(
+                project_path,
+                copy_engine=checkpoint.options["copy_engine"],
+                mutable=MUTATED_FILES,
+                dst=project_backup,
+                exclude=exclude,
+            )
 
-    if ensure_src:
-        if not (project_path / "src").exists():
-            (project_path / "src").mkdir()
-            shutil.move(
-                poetry_project.module_path,
-                project_path / "src" / poetry_project.module_name,
+        if not checkpoint.backup_done:
+            record_backup(
+                project_path,
+                project_backup,
+                mode=backup_mode,
+                source=checkpoint.source_hash,
+                options=checkpoint.options,
+            )
+            checkpoint.update(
+                project_path, backup=str(project_backup), backup_done=True
             )
+    print(f"created backup: {project_backup}")
+
+    # "poetry" left in the result usually means something was not migrated
+    for warning in plan.warnings:
+        print(f"Warning: {warning}")
+
+    def on_applied(applied: int) -> None:
+        checkpoint.update(project_path, applied=applied)
+
+    execute_plan(
+        plan, project_path, journal, start=checkpoint.applied, on_applied=on_applied
+    )
+    clear_checkpoint(project_path)
+
+    if retention is not None:
+        for record in apply_retention(project_path, retention):
+            print(f"removed old backup {record.number} of {project_path}")
+
+
+def _preflight(
+    project_path: Path, checkpoint: Checkpoint, exclude: Optional[Excludes]
+) -> TreeSize:
+    """
+    Measure the project and refuse to back it up if the backup will not fit.
+
+    Only full copies and uncompressed archives are checked: the size of the
+    others can not be known before they are written.
+    """
+    size = scan_size(project_path, exclude=exclude)
+
+    needed = 0
+    if checkpoint.backup_mode == "full":
+        engine = resolve_engine(checkpoint.options["copy_engine"], project_path.parent)
+        # reflinks and hard links share the data of the project
+        if engine == "threaded":
+            needed = size.bytes
+    elif checkpoint.backup_mode == "archive":
+        if checkpoint.options["archive_codec"] == "none":
+            needed = size.bytes
+
+    # what an interrupted backup already wrote is not needed again
+    if needed and checkpoint.backup and os.path.isdir(checkpoint.backup):
+        needed = max(needed - scan_size(Path(checkpoint.backup)).bytes, 0)
+
+    progress.emit(
+        "preflight", project_path, files=size.files, bytes=size.bytes, needed=needed
+    )
+    check_disk_space(project_path, needed)
+    return size
+
+
+def _requirement(
+    project: PoetryProject, dep: Dependency, workspace: Optional[dict[str, str]]
+) -> str:
+    if workspace and isinstance(dep, PathDependency):
+        member = workspace.get(str((project.path / dep.path).resolve()))
+        if member is not None:
+            # rye installs workspace members from the workspace
+            return Dependency.to_str(replace(dep, name=member))
+    return dep.to_str()
+
+
+def _formats(item: dict[str, Any]) -> set[str]:
+    formats = item.get("format")
+    if formats is None:
+        return {"sdist", "wheel"}
+    return {formats} if isinstance(formats, str) else set(formats)
+
+
+def _resolve_glob(
+    index: Optional[PathIndex], pattern: str, warnings: list[str]
+) -> list[str]:
+    # hatch takes no globs, and fails on missing paths
+    if index is not None:
+        paths = index.glob(pattern)
+    elif any(c in pattern for c in "*?["):
+        # (no project files to resolve it against)
+        paths = []
+    else:
+        return [pattern]
+
+    if not paths:
+        warnings.append(f"'{pattern}' matches no path, so it is left out")
+    return paths
+
+
+def _convert_packages(
+    poetry: dict[str, Any],
+    index: Optional[PathIndex],
+    packages: Optional[list[str]],
+    warnings: list[str],
+) -> dict[str, Any]:
+    """
+    Translate packages, include and exclude of tool.poetry to tool.hatch.build.
+
+    packages, if given, are used as the wheel packages instead of those of poetry.
+    The globs which match nothing are left out, with a warning added to warnings.
+    """
+    force_include: dict[str, str] = {}
+    sdist_force_include: dict[str, str] = {}
+
+    if packages is None:
+        packages = []
+        for item in poetry.get("packages", []):
+            if "include" not in item or "wheel" not in _formats(item):
+                continue
+
+            base = item.get("from", "").strip("/")
+            pattern = f"{base}/{item['include']}" if base else item["include"]
+            for path in _resolve_glob(index, pattern, warnings):
+                if "to" in item:
+                    name = path.rpartition("/")[2]
+                    force_include[path] = f"{item['to'].strip('/')}/{name}"
+                elif path not in packages:
+                    packages.append(path)
+
+    # unlike packages, include is only for the sdist by default. it is
+    # force-included there too, as it may hold files ignored by git (which
+    # hatch leaves out of the sdist)
+    for item in poetry.get("include", []):
+        if isinstance(item, str):
+            item = {"path": item}
+        formats = _formats({"format": "sdist", **item})
+        for path in _resolve_glob(index, item["path"], warnings):
+            if "wheel" in formats:
+                force_include[path] = path
+            if "sdist" in formats:
+                sdist_force_include[path] = path
+
+    wheel: dict[str, Any] = {"packages": packages}
+    if force_include:
+        wheel["force-include"] = force_include
+
+    build: dict[str, Any] = {"targets": {"wheel": wheel}}
+    if sdist_force_include:
+        build["targets"]["sdist"] = {"force-include": sdist_force_include}
+    if poetry.get("exclude"):
+        build["exclude"] = list(poetry["exclude"])
+
+    return build
 
 
 def _convert_scripts(poetry_scripts):
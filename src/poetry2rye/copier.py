@@ -0,0 +1,230 @@
+import errno
+import os
+import shutil
+import tempfile
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
+from typing import Optional
+
+from poetry2rye import progress
+from poetry2rye import timings
+from poetry2rye.error import ControlledError
+from poetry2rye.ignore import Excludes
+from poetry2rye.utils import COPY_ENGINES
+
+# from linux/fs.h
+FICLONE = 0x40049409
+
+# errors meaning "this way of copying is not available here", not real failures
+UNSUPPORTED_ERRNOS = {
+    errno.EXDEV,
+    errno.EINVAL,
+    errno.ENOSYS,
+    errno.ENOTTY,
+    errno.EOPNOTSUPP,
+    errno.EBADF,
+    errno.EPERM,
+}
+
+CHUNK_SIZE = 1 << 30
+
+
+def reflink_file(src: str, dst: str) -> None:
+    try:
+        import fcntl
+    except ImportError:
+        # (Windows: copied instead, as on file systems without reflinks)
+        raise OSError(errno.EOPNOTSUPP, "reflinks are not supported here")
+
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        timings.count("syscall.ficlone")
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+
+
+def _copy_fd_range(fsrc: int, fdst: int) -> bool:
+    try:
+        while True:
+            timings.count("syscall.copy_file_range")
+            n = os.copy_file_range(fsrc, fdst, CHUNK_SIZE)
+            if n <= 0:
+                break
+            timings.count("bytes_copied", n)
+    except OSError as e:
+        if e.errno in UNSUPPORTED_ERRNOS and os.lseek(fdst, 0, os.SEEK_CUR) == 0:
+            return False
+        raise
+    return True
+
+
+def _copy_fd_sendfile(fsrc: int, fdst: int) -> bool:
+    try:
+        while True:
+            timings.count("syscall.sendfile")
+            n = os.sendfile(fdst, fsrc, None, CHUNK_SIZE)
+            if n <= 0:
+                break
+            timings.count("bytes_copied", n)
+    except OSError as e:
+        if e.errno in UNSUPPORTED_ERRNOS and os.lseek(fdst, 0, os.SEEK_CUR) == 0:
+            return False
+        raise
+    return True
+
+
+def copy_file_data(src: str, dst: str) -> None:
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        in_fd, out_fd = fsrc.fileno(), fdst.fileno()
+        if hasattr(os, "copy_file_range") and _copy_fd_range(in_fd, out_fd):
+            return
+        if hasattr(os, "sendfile") and _copy_fd_sendfile(in_fd, out_fd):
+            return
+        shutil.copyfileobj(fsrc, fdst)
+        timings.count("bytes_copied", fdst.tell())
+
+
+def copy_file_reflink(src: str, dst: str) -> None:
+    try:
+        reflink_file(src, dst)
+        timings.count("bytes_cloned", os.path.getsize(dst))
+    except OSError as e:
+        if e.errno not in UNSUPPORTED_ERRNOS:
+            raise
+        copy_file_data(src, dst)
+
+
+def supports_reflink(directory: Path) -> bool:
+    try:
+        with tempfile.TemporaryDirectory(dir=directory, prefix=".__p2r_probe_") as d:
+            src = os.path.join(d, "src")
+            with open(src, "wb") as f:
+                f.write(b"p2r")
+            reflink_file(src, os.path.join(d, "dst"))
+    except OSError:
+        return False
+
+    return True
+
+
+def resolve_engine(engine: str, directory: Path) -> str:
+    if engine not in COPY_ENGINES:
+        raise ControlledError(f"unknown copy engine: {engine}")
+
+    if engine == "auto":
+        return "reflink" if supports_reflink(directory) else "threaded"
+
+    return engine
+
+
+def _advance(src_file: str) -> None:
+    # (the size is only looked up for progress reports)
+    if progress.is_active():
+        progress.advance(os.lstat(src_file).st_size)
+
+
+def _is_copied(src_file: str, dst_file: str) -> bool:
+    try:
+        dst_st = os.lstat(dst_file)
+    except FileNotFoundError:
+        return False
+    src_st = os.lstat(src_file)
+    return dst_st.st_size == src_st.st_size and dst_st.st_mtime_ns == src_st.st_mtime_ns
+
+
+def copy_tree(
+    src: Path,
+    dst: Path,
+    engine: str = "auto",
+    mutable: frozenset[str] = frozenset(),
+    max_workers: Optional[int] = None,
+    resume: bool = False,
+    exclude: Optional[Excludes] = None,
+) -> None:
+    """
+    Copy the tree at src to dst keeping symlinks, like shutil.copytree(symlinks=True).
+
+    File contents are copied on a thread pool with the given engine. With the
+    "hardlink" engine, files are linked instead of copied, except for the paths
+    (relative to src, "/"-separated) in `mutable` which will be changed in place.
+
+    With resume, dst may hold a part of the copy: the files there with the size
+    and mtime of their source (which are set once a file is fully copied) are
+    kept.
+
+    The paths matched by exclude are not copied.
+    """
+    engine = resolve_engine(engine, dst.parent)
+
+    copy_data: Callable[[str, str], None]
+    if engine == "reflink":
+        copy_data = copy_file_reflink
+    else:
+        copy_data = copy_file_data
+
+    def copy_file(src_file: str, dst_file: str, rel: str) -> None:
+        if resume:
+            if _is_copied(src_file, dst_file):
+                timings.count("files_resumed")
+                _advance(src_file)
+                return
+            if os.path.lexists(dst_file):
+                os.unlink(dst_file)
+
+        if engine == "hardlink" and rel not in mutable:
+            try:
+                timings.count("syscall.link")
+                os.link(src_file, dst_file)
+                timings.count("files_linked")
+                _advance(src_file)
+                return
+            except OSError as e:
+                if e.errno not in UNSUPPORTED_ERRNOS | {errno.EMLINK}:
+                    raise
+
+        copy_data(src_file, dst_file)
+        shutil.copystat(src_file, dst_file)
+        timings.count("files_copied")
+        _advance(src_file)
+
+    copied_dirs: list[tuple[str, str]] = []
+    futures: list[Future[None]] = []
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        stack = [(str(src), str(dst), "")]
+        while stack:
+            src_dir, dst_dir, rel_dir = stack.pop()
+            os.makedirs(dst_dir, exist_ok=True)
+            timings.count("syscall.mkdir")
+            copied_dirs.append((src_dir, dst_dir))
+
+            timings.count("syscall.scandir")
+            with os.scandir(src_dir) as it:
+                for entry in it:
+                    dst_entry = os.path.join(dst_dir, entry.name)
+                    rel = f"{rel_dir}{entry.name}"
+                    if exclude is not None and exclude.match(
+                        rel, entry.is_dir(follow_symlinks=False)
+                    ):
+                        continue
+
+                    if entry.is_symlink():
+                        if resume and os.path.lexists(dst_entry):
+                            os.unlink(dst_entry)
+                        timings.count("syscall.symlink")
+                        os.symlink(os.readlink(entry.path), dst_entry)
+                        shutil.copystat(entry.path, dst_entry, follow_symlinks=False)
+                        progress.advance(0)
+                    elif entry.is_dir():
+                        stack.append((entry.path, dst_entry, f"{rel}/"))
+                    else:
+                        futures.append(
+                            executor.submit(copy_file, entry.path, dst_entry, rel)
+                        )
+
+        for future in futures:
+            future.result()
+
+    # set directory times last, as copying their contents changes them
+    for src_dir, dst_dir in reversed(copied_dirs):
+        shutil.copystat(src_dir, dst_dir)
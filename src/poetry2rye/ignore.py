@@ -0,0 +1,147 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+from typing import Iterable
+from typing import Optional
+from typing import Pattern
+
+from poetry2rye.pathindex import compile_glob
+
+GITIGNORE_FILE = ".gitignore"
+
+
+@dataclass(frozen=True)
+class Rule:
+    regex: Pattern[str]
+    negate: bool
+    dir_only: bool
+
+
+def parse_rule(line: str) -> Optional[Rule]:
+    """
+    Parse a line of .gitignore syntax: "!" negates, a trailing "/" only
+    matches directories, and a pattern without any other "/" matches at any
+    depth.
+    """
+    line = line.rstrip("\n").rstrip()
+    if not line or line.startswith("#"):
+        return None
+    if line.startswith("\\"):
+        line = line[1:]
+
+    negate = line.startswith("!")
+    if negate:
+        line = line[1:]
+    dir_only = line.endswith("/")
+    line = line.rstrip("/")
+    if not line:
+        return None
+
+    if "/" in line:
+        pattern = line.lstrip("/")
+    else:
+        pattern = f"**/{line}"
+    # (compiled globs are cached, so the same rule in many .gitignore files
+    # is compiled once)
+    return Rule(compile_glob(pattern), negate, dir_only)
+
+
+def _parse_rules(lines: Iterable[str]) -> list[Rule]:
+    return [rule for rule in map(parse_rule, lines) if rule is not None]
+
+
+def _last_match(rules: list[Rule], rel: str, is_dir: bool) -> Optional[bool]:
+    for rule in reversed(rules):
+        if rule.dir_only and not is_dir:
+            continue
+        if rule.regex.fullmatch(rel):
+            return not rule.negate
+    return None
+
+
+class Excludes:
+    """
+    Which paths of a project are left out of its backups: those matching the
+    given patterns, and optionally those ignored by the .gitignore files of
+    the project. Paths are "/"-separated and relative to the project.
+
+    The paths in keep (and their parent directories) are never excluded.
+    moves maps the directories moved by the migration to where they were, so
+    that the excluded paths in them are moved back by a restore.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        patterns: Iterable[str] = (),
+        gitignore: bool = False,
+        keep: Iterable[str] = (),
+        moves: Optional[dict[str, str]] = None,
+    ) -> None:
+        self.root = root
+        self.patterns = list(patterns)
+        self.gitignore = gitignore
+        self.keep = set(keep)
+        self.moves = dict(moves or {})
+        self._kept_dirs = {
+            "/".join(rel.split("/")[:i])
+            for rel in self.keep
+            for i in range(1, rel.count("/") + 1)
+        }
+        self._rules = _parse_rules(self.patterns)
+        # directory -> the rules of its .gitignore, each read once
+        self._gitignores: dict[str, list[Rule]] = {}
+
+    @classmethod
+    def from_options(
+        cls, root: Path, options: Optional[dict[str, Any]]
+    ) -> Optional["Excludes"]:
+        if not options:
+            return None
+        return cls(
+            root,
+            options["patterns"],
+            options["gitignore"],
+            options["keep"],
+            options.get("moves"),
+        )
+
+    def to_options(self) -> dict[str, Any]:
+        return {
+            "patterns": self.patterns,
+            "gitignore": self.gitignore,
+            "keep": sorted(self.keep),
+            "moves": self.moves,
+        }
+
+    def _gitignore_rules(self, directory: str) -> list[Rule]:
+        rules = self._gitignores.get(directory)
+        if rules is None:
+            path = self.root / directory / GITIGNORE_FILE
+            try:
+                with open(path) as f:
+                    rules = _parse_rules(f)
+            except (FileNotFoundError, NotADirectoryError):
+                rules = []
+            self._gitignores[directory] = rules
+        return rules
+
+    def match(self, rel: str, is_dir: bool) -> bool:
+        if rel in self.keep or rel in self._kept_dirs:
+            return False
+        if _last_match(self._rules, rel, is_dir):
+            return True
+        if not self.gitignore:
+            return False
+
+        # the rules of deeper .gitignore files come later, so they win
+        excluded = False
+        parts = rel.split("/")
+        for i in range(len(parts)):
+            directory = "/".join(parts[:i])
+            matched = _last_match(
+                self._gitignore_rules(directory), "/".join(parts[i:]), is_dir
+            )
+            if matched is not None:
+                excluded = matched
+        return excluded
@@ -0,0 +1,118 @@
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any
+from typing import Iterator
+from typing import Optional
+
+from poetry2rye.backup_index import allocate_backup_path
+from poetry2rye.backup_index import mark_complete
+
+JOURNAL_FILE = ".__p2r_journal.json"
+PREIMAGE_DIR = "preimages"
+
+
+def is_journal(backup_path: Path) -> bool:
+    return (backup_path / JOURNAL_FILE).exists()
+
+
+class Journal:
+    """
+    A backup holding only what the migration changes.
+
+    Each change is recorded (with a copy of the file it overwrites or deletes)
+    before it is made, so the journal can always be replayed in reverse.
+    """
+
+    def __init__(self, project_path: Path, path: Path) -> None:
+        self.project_path = project_path
+        self.path = path
+        self.entries: list[dict[str, Any]] = []
+
+    @classmethod
+    def create(cls, project_path: Path, path: Optional[Path] = None) -> "Journal":
+        journal = cls(project_path, path or allocate_backup_path(project_path))
+        (journal.path / PREIMAGE_DIR).mkdir(parents=True, exist_ok=True)
+        journal.save()
+        mark_complete(journal.path)
+        return journal
+
+    @classmethod
+    def load(cls, project_path: Path, path: Path) -> "Journal":
+        journal = cls(project_path, path)
+        with open(path / JOURNAL_FILE) as f:
+            journal.entries = json.load(f)["entries"]
+        return journal
+
+    def save(self) -> None:
+        tmp = self.path / f"{JOURNAL_FILE}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"version": 1, "entries": self.entries}, f, indent=2)
+        os.replace(tmp, self.path / JOURNAL_FILE)
+
+    def _save_preimage(self, rel: str) -> Optional[str]:
+        src = self.project_path / rel
+        if not os.path.lexists(src):
+            return None
+
+        name = str(len(self.entries))
+        shutil.copy2(src, self.path / PREIMAGE_DIR / name, follow_symlinks=False)
+        return name
+
+    def _record(self, entry: dict[str, Any]) -> None:
+        self.entries.append(entry)
+        self.save()
+
+    def record_write(self, rel: str) -> None:
+        self._record({"op": "write", "path": rel, "preimage": self._save_preimage(rel)})
+
+    def record_remove(self, rel: str) -> None:
+        self._record(
+            {"op": "remove", "path": rel, "preimage": self._save_preimage(rel)}
+        )
+
+    def record_mkdir(self, rel: str) -> None:
+        self._record({"op": "mkdir", "path": rel})
+
+    def record_move(self, src_rel: str, dst_rel: str) -> None:
+        self._record({"op": "move", "src": src_rel, "dst": dst_rel})
+
+    def _restore_preimage(self, rel: str, preimage: Optional[str]) -> None:
+        path = self.project_path / rel
+        if os.path.lexists(path):
+            path.unlink()
+
+        if preimage is not None:
+            shutil.copy2(
+                self.path / PREIMAGE_DIR / preimage, path, follow_symlinks=False
+            )
+
+    def describe_replay(self) -> Iterator[str]:
+        for entry in reversed(self.entries):
+            if entry["op"] == "move":
+                yield f"move {entry['dst']} -> {entry['src']}"
+            elif entry["op"] == "mkdir":
+                yield f"rmdir {entry['path']}"
+            elif entry["preimage"] is None:
+                yield f"delete {entry['path']}"
+            else:
+                yield f"restore {entry['path']}"
+
+    def replay(self) -> None:
+        # entries are recorded before the change is made, so the last one may
+        # not have happened: every step has to tolerate that
+        for entry in reversed(self.entries):
+            if entry["op"] in ("write", "remove"):
+                self._restore_preimage(entry["path"], entry["preimage"])
+            elif entry["op"] == "mkdir":
+                try:
+                    (self.project_path / entry["path"]).rmdir()
+                except OSError:
+                    # already gone, or has other contents by now: keep it
+                    pass
+            elif entry["op"] == "move":
+                src = self.project_path / entry["src"]
+                dst = self.project_path / entry["dst"]
+                if os.path.lexists(dst) and not os.path.lexists(src):
+                    shutil.move(dst, src)
@@ -0,0 +1,349 @@
+import io
+import tomllib
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+from typing import Iterable
+from typing import Iterator
+from typing import Optional
+from typing import TextIO
+from typing import Union
+
+from poetry2rye.constraints import format_python_marker
+from poetry2rye.constraints import parse_requirement
+from poetry2rye.project import BasicDependency
+from poetry2rye.project import Dependency
+from poetry2rye.project import poetry_canonicalize_name
+
+LOCK_HEADER = """\
+# generated by rye
+# use `rye lock` or `rye sync` to update this lockfile
+#
+# last locked with the following flags:
+#   pre: false
+#   features: []
+#   all-features: false
+#   with-sources: false
+#   generate-hashes: {generate_hashes}
+#   universal: false
+"""
+
+
+# when a package is required, in disjunctive normal form: it is required when
+# all the markers of any of the terms hold. the empty term always holds.
+Condition = frozenset[frozenset[str]]
+ALWAYS: Condition = frozenset({frozenset()})
+NEVER: Condition = frozenset()
+
+
+@dataclass(slots=True)
+class LockedDependency:
+    name: str
+    extras: list[str]
+    markers: Optional[str]
+    optional: bool
+
+
+@dataclass(slots=True)
+class LockedPackage:
+    name: str
+    version: str
+    markers: Optional[str]
+    source: Optional[dict[str, str]]
+    hashes: list[str]
+    dependencies: list[LockedDependency]
+    extras: dict[str, list[str]]
+
+    def requirement(self) -> str:
+        if self.source is None or self.source.get("type") == "legacy":
+            return f"{self.name}=={self.version}"
+
+        kind = self.source["type"]
+        if kind == "git":
+            ref = self.source.get("resolved_reference") or self.source.get("reference")
+            url = f"git+{self.source['url']}"
+            return f"{self.name} @ {url}@{ref}" if ref else f"{self.name} @ {url}"
+        if kind in ("file", "directory"):
+            return f"{self.name} @ file:{self.source['url']}"
+        return f"{self.name} @ {self.source['url']}"
+
+
+def _iter_chunks(f: TextIO) -> Iterator[str]:
+    # poetry.lock is a flat list of [[package]] tables followed by [metadata].
+    # splitting it at those headers lets us parse one package at a time.
+    chunk: list[str] = []
+    for line in f:
+        if line.startswith("[[package]]") or line.startswith("[metadata]"):
+            if chunk:
+                yield "".join(chunk)
+            chunk = []
+        chunk.append(line)
+
+    if chunk:
+        yield "".join(chunk)
+
+
+def _parse_dependency(name: str, spec: Any) -> Iterator[LockedDependency]:
+    name = poetry_canonicalize_name(name)
+    if isinstance(spec, str):
+        yield LockedDependency(name, [], None, False)
+    elif isinstance(spec, list):
+        for item in spec:
+            yield from _parse_dependency(name, item)
+    else:
+        yield LockedDependency(
+            name,
+            spec.get("extras", []),
+            spec.get("markers"),
+            spec.get("optional", False),
+        )
+
+
+def _parse_extras(name: str, extras: dict[str, list[str]]) -> dict[str, list[str]]:
+    # the entries are PEP 508 requirements, like "cachecontrol[filecache]
+    # (>=0.12.6)". an extra can also pull in other extras of the package
+    # itself ("attrs[tests]"), which are expanded here.
+    names: dict[str, set[str]] = {}
+    includes: dict[str, set[str]] = {}
+    for extra, reqs in extras.items():
+        names[extra] = set()
+        includes[extra] = set()
+        for req in reqs:
+            dep = parse_requirement(req)
+            dep_name = poetry_canonicalize_name(dep.name)
+            if dep_name == name:
+                includes[extra].update(dep.extras)
+            else:
+                names[extra].add(dep_name)
+
+    result = {}
+    for extra in extras:
+        seen = {extra}
+        stack = [extra]
+        while stack:
+            for included in includes.get(stack.pop(), ()):
+                if included not in seen:
+                    seen.add(included)
+                    stack.append(included)
+        result[extra] = sorted(set().union(*(names.get(e, ()) for e in seen)))
+    return result
+
+
+def _parse_package(table: dict[str, Any]) -> LockedPackage:
+    markers = table.get("markers")
+    if isinstance(markers, dict):
+        # lock-version 2.1 keeps markers per group; they cannot be told apart
+        # in a requirements file, so only keep them when they all agree
+        values = set(markers.values())
+        markers = values.pop() if len(values) == 1 else None
+
+    dependencies = []
+    for dep_name, spec in table.get("dependencies", {}).items():
+        dependencies.extend(_parse_dependency(dep_name, spec))
+
+    name = poetry_canonicalize_name(table["name"])
+    extras = _parse_extras(name, table.get("extras", {}))
+
+    return LockedPackage(
+        name=name,
+        version=table["version"],
+        markers=markers,
+        source=table.get("source"),
+        hashes=[file["hash"] for file in table.get("files", [])],
+        dependencies=dependencies,
+        extras=extras,
+    )
+
+
+def read_lock(lock: Union[Path, str]) -> dict[str, LockedPackage]:
+    # lock is the path of poetry.lock, or its contents
+    packages: dict[str, LockedPackage] = {}
+
+    with open(lock) if isinstance(lock, Path) else io.StringIO(lock) as f:
+        for chunk in _iter_chunks(f):
+            doc = tomllib.loads(chunk)
+            for table in doc.get("package", []):
+                package = _parse_package(table)
+                packages[package.name] = package
+
+            # lock-version < 2.0 keeps hashes in [metadata.files]
+            for name, files in doc.get("metadata", {}).get("files", {}).items():
+                package = packages.get(poetry_canonicalize_name(name))
+                if package is not None and not package.hashes:
+                    package.hashes = [file["hash"] for file in files]
+
+    return packages
+
+
+def _restrict(condition: Condition, marker: Optional[str]) -> Condition:
+    if marker is None:
+        return condition
+    return frozenset(term | {marker} for term in condition)
+
+
+def _union(a: Condition, b: Condition) -> Condition:
+    terms = a | b
+    if frozenset() in terms:
+        return ALWAYS
+    # a term implied by a shorter one adds nothing
+    return frozenset(term for term in terms if not any(other < term for other in terms))
+
+
+def _render_term(term: frozenset[str]) -> str:
+    if len(term) == 1:
+        return next(iter(term))
+    return " and ".join(f"({marker})" for marker in sorted(term))
+
+
+def _render_condition(condition: Condition) -> Optional[str]:
+    if frozenset() in condition:
+        return None
+    terms = sorted(map(_render_term, condition))
+    if len(terms) == 1:
+        return terms[0]
+    return " or ".join(f"({term})" for term in terms)
+
+
+def _root_marker(dep: Dependency) -> Optional[str]:
+    if isinstance(dep, BasicDependency) and dep.python:
+        return format_python_marker(dep.python)
+    return None
+
+
+def read_lock_metadata(lock: Union[Path, str]) -> dict[str, Any]:
+    # the [metadata] table of poetry.lock (its path, or its contents)
+    with open(lock) if isinstance(lock, Path) else io.StringIO(lock) as f:
+        for chunk in _iter_chunks(f):
+            if chunk.startswith("[metadata]"):
+                return tomllib.loads(chunk)["metadata"]
+    return {}
+
+
+def resolve(
+    packages: dict[str, LockedPackage],
+    roots: Iterable[Dependency],
+    root_name: str,
+) -> dict[str, dict[str, Optional[str]]]:
+    """
+    Find every locked package needed by the roots.
+
+    Returns, for each package, the packages it is required by and the marker
+    under which it is required through each of them: the markers on the way
+    from the roots (including their python constraints) are carried down.
+    """
+    required_by: dict[str, dict[str, Condition]] = defaultdict(dict)
+    # (package, extra) -> when it was already followed
+    reached: dict[tuple[str, str], Condition] = {}
+    stack: list[tuple[str, str, list[str], Condition]] = []
+
+    for dep in roots:
+        if dep.is_python_dep():
+            continue
+        extras = dep.extras or []
+        condition = _restrict(ALWAYS, _root_marker(dep))
+        stack.append((poetry_canonicalize_name(dep.name), root_name, extras, condition))
+
+    while stack:
+        name, parent, extras, condition = stack.pop()
+        package = packages.get(name)
+        if package is None:
+            continue
+
+        by_parent = required_by[name]
+        by_parent[parent] = _union(by_parent.get(parent, NEVER), condition)
+
+        wanted = set(extras)
+        for extra in extras:
+            wanted.update(package.extras.get(extra, []))
+
+        for extra in [""] + extras:
+            followed = reached.get((name, extra), NEVER)
+            condition_now = _union(followed, condition)
+            # (conditions only grow, so this ends)
+            if condition_now == followed:
+                continue
+            reached[(name, extra)] = condition_now
+
+            for dep in package.dependencies:
+                if dep.optional and (extra == "" or dep.name not in wanted):
+                    continue
+                if not dep.optional and extra != "":
+                    continue
+                stack.append(
+                    (
+                        dep.name,
+                        name,
+                        dep.extras,
+                        _restrict(condition_now, dep.markers),
+                    )
+                )
+
+    return {
+        name: {
+            parent: _render_condition(condition)
+            for parent, condition in by_parent.items()
+        }
+        for name, by_parent in required_by.items()
+    }
+
+
+def _markers(package: LockedPackage, parents: dict[str, Optional[str]]) -> str:
+    if package.markers:
+        return package.markers
+
+    # reached only through conditional requirements: keep those conditions
+    if None in parents.values():
+        return ""
+    conditions = sorted({m for m in parents.values() if m is not None})
+    if len(conditions) == 1:
+        return conditions[0]
+    return " or ".join(f"({m})" for m in conditions)
+
+
+def render_requirements_lock(
+    packages: dict[str, LockedPackage],
+    required_by: dict[str, dict[str, Optional[str]]],
+) -> str:
+    has_hashes = any(packages[name].hashes for name in required_by)
+    lines = [
+        LOCK_HEADER.format(generate_hashes=str(has_hashes).lower()),
+        "\n-e file:.\n",
+    ]
+
+    for name in sorted(required_by):
+        package = packages[name]
+        line = package.requirement()
+
+        markers = _markers(package, required_by[name])
+        if markers:
+            line += f" ; {markers}"
+
+        for file_hash in package.hashes:
+            line += f" \\\n    --hash={file_hash}"
+        lines.append(line + "\n")
+
+        for parent in sorted(required_by[name]):
+            lines.append(f"    # via {parent}\n")
+
+    return "".join(lines)
+
+
+def poetry_lock_to_requirements(
+    lock: Union[Path, str], dependencies: list[Dependency], project_name: str
+) -> tuple[str, str]:
+    """
+    Translate poetry.lock (its path, or its contents) to the contents of
+    requirements.lock and requirements-dev.lock, keeping the locked versions.
+    """
+    packages = read_lock(lock)
+
+    main_deps = [dep for dep in dependencies if not dep.is_dev]
+    lock = render_requirements_lock(
+        packages, resolve(packages, main_deps, project_name)
+    )
+    dev_lock = render_requirements_lock(
+        packages, resolve(packages, dependencies, project_name)
+    )
+
+    return lock, dev_lock
@@ -0,0 +1,105 @@
+import os
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import ContextManager
+from typing import Iterator
+from typing import Optional
+
+
+def lock_path(project_path: Path) -> Path:
+    return project_path.parent / f".__p2r_lock_{project_path.name}"
+
+
+def _lock(fd: int, shared: bool, message: Optional[str]) -> None:
+    if os.name == "nt":
+        import msvcrt
+
+        # (msvcrt has no shared locks)
+        while True:
+            try:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                return
+            except OSError:
+                if message is not None:
+                    print(message, file=sys.stderr)
+                    message = None
+                time.sleep(0.1)
+
+    import fcntl
+
+    operation = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+    try:
+        fcntl.flock(fd, operation | fcntl.LOCK_NB)
+    except BlockingIOError:
+        if message is not None:
+            print(message, file=sys.stderr)
+        fcntl.flock(fd, operation)
+
+
+def _unlock(fd: int) -> None:
+    if os.name == "nt":
+        import msvcrt
+
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    # (flock locks are released by closing the file)
+
+
+def _is_locked_file(fd: int, path: Path) -> bool:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return False
+    return os.path.samestat(os.fstat(fd), st)
+
+
+@contextmanager
+def file_lock(
+    path: Path,
+    shared: bool = False,
+    message: Optional[str] = None,
+    remove: bool = False,
+) -> Iterator[None]:
+    """
+    Hold an advisory lock on the file at path, created if missing, waiting
+    for other processes holding it.
+
+    The lock is per open file, so it must not be taken again by its holder.
+    With remove (only for exclusive locks), the file is removed when the lock
+    is released.
+    """
+    while True:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        _lock(fd, shared, message)
+        # the file may have been removed by the holder we waited for, and
+        # another process may hold the lock of a new one
+        if not remove or _is_locked_file(fd, path):
+            break
+        os.close(fd)
+
+    try:
+        yield
+    finally:
+        # removed while locked, so that a waiter notices it (Windows cannot
+        # remove open files: there a waiter keeps it, or it is removed after)
+        if remove and os.name != "nt":
+            path.unlink(missing_ok=True)
+        try:
+            _unlock(fd)
+        finally:
+            os.close(fd)
+        if remove and os.name == "nt":
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+
+def project_lock(project_path: Path) -> ContextManager[None]:
+    # held while a project or its backups are changed
+    return file_lock(
+        lock_path(project_path),
+        message=f"waiting for another poetry2rye process on {project_path}",
+        remove=True,
+    )
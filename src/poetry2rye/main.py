@@ -1,43 +1,226 @@
 import argparse
-import shutil
+import json
+import os
+import sys
+from dataclasses import asdict
+from datetime import datetime
 from pathlib import Path
 from typing import Any, Optional
 
-from poetry2rye.convert import convert
 from poetry2rye.error import ControlledError
-from poetry2rye.utils import backup_path
-from poetry2rye.utils import get_biggest_backup_num
+from poetry2rye.utils import ARCHIVE_CODECS
+from poetry2rye.utils import BACKUP_MODES
+from poetry2rye.utils import CACHE_DIR_ENV
+from poetry2rye.utils import COPY_ENGINES
+from poetry2rye.utils import PROFILE_ENV
+from poetry2rye.utils import PROGRESS_ENV
+from poetry2rye.utils import TIMINGS_ENV
+from poetry2rye.utils import destination_from_env
+from poetry2rye.utils import format_size
+from poetry2rye.utils import is_poetry_project
+from poetry2rye.utils import parse_size
+from poetry2rye.utils import stored_backup_path
+
+# the modules used by only some subcommands (and their heavy dependencies such
+# as poetry-core, tomlkit, slugify, tarfile and multiprocessing) are imported in
+# the handlers, so that each subcommand only pays for what it uses.
+
+
+def convert_options(args: Any) -> dict[str, Any]:
+    from poetry2rye.backup_index import RetentionPolicy
+
+    options: dict[str, Any] = {
+        "copy_engine": args.copy_engine,
+        "backup_mode": args.backup_mode,
+        "archive_codec": args.archive_codec,
+        "translate_lock": not args.drop_lock,
+        "use_cache": not args.no_cache,
+        "backup_exclude": args.backup_exclude or [],
+        "backup_gitignore": args.backup_gitignore,
+    }
+
+    if (
+        args.keep_last is not None
+        or args.max_age is not None
+        or args.max_bytes is not None
+    ):
+        options["retention"] = RetentionPolicy(
+            keep_last=args.keep_last,
+            max_age=args.max_age * 86400 if args.max_age is not None else None,
+            max_bytes=args.max_bytes,
+        )
+
+    return options
 
 
 def handle_mig(args: Any) -> None:
+    from poetry2rye.convert import convert
+
     path: Path = args.path
     project_path = Path(path).absolute()
     ensure_src: bool = not args.ignore_src
     virtual_project: bool = args.virtual
 
+    if args.check or args.diff:
+        check_migration(args, project_path, ensure_src, virtual_project)
+        return
+
     convert(
         project_path=project_path,
         ensure_src=ensure_src,
         virtual_project=virtual_project,
+        **convert_options(args),
     )
 
     print("done")
 
 
+def check_migration(
+    args: Any, project_path: Path, ensure_src: bool, virtual_project: bool
+) -> None:
+    from poetry2rye.convert import plan_migration
+
+    if not is_poetry_project(project_path):
+        print("nothing to migrate: this project is not managed by poetry")
+        return
+
+    plan = plan_migration(
+        project_path,
+        ensure_src=ensure_src,
+        virtual_project=virtual_project,
+        translate_lock=not args.drop_lock,
+        use_cache=not args.no_cache,
+        write_cache=False,
+    )
+
+    if args.diff:
+        print(plan.diff(), end="")
+        for op in plan.operations:
+            print(op.describe())
+
+    for warning in plan.warnings:
+        print(f"Warning: {warning}")
+
+    if args.check and (plan.operations or plan.warnings):
+        print("this project would be migrated")
+        exit(1)
+
+
+def handle_mig_all(args: Any) -> None:
+    from poetry2rye.batch import migrate_all
+
+    root = Path(args.root).absolute()
+
+    if args.workspace:
+        from poetry2rye.workspace import migrate_workspace
+
+        migrate_all = migrate_workspace
+
+    counts = migrate_all(
+        root,
+        include=args.include or ["*"],
+        exclude=args.exclude or [],
+        ignore_src=["*"] if args.ignore_src else args.ignore_src_for or [],
+        virtual=["*"] if args.virtual else args.virtual_for or [],
+        options=convert_options(args),
+        check=args.check,
+        max_workers=args.jobs,
+    )
+
+    report_counts(counts, check=args.check)
+
+
+def report_counts(counts: dict[str, int], check: bool = False) -> None:
+    summary = (
+        f"done: {counts['ok']} ok, {counts['skipped']} skipped, "
+        f"{counts['error']} failed"
+    )
+    if check:
+        summary += f", {counts['changed']} would be migrated"
+    print(summary, file=sys.stderr)
+
+    if counts["error"] or (check and counts["changed"]):
+        exit(1)
+
+
+def handle_list_backups(args: Any) -> None:
+    from poetry2rye.backup_index import load_index
+
+    project_path = Path(args.path).absolute()
+    records = [
+        (record, path)
+        for record in load_index(project_path)
+        if (path := stored_backup_path(project_path, record.number)) is not None
+    ]
+
+    if args.json:
+        print(
+            json.dumps(
+                [{**asdict(record), "path": str(path)} for record, path in records],
+                indent=2,
+            )
+        )
+        return
+
+    if not records:
+        print("no backups")
+        return
+
+    for record, path in records:
+        created = datetime.fromtimestamp(record.created).strftime("%Y-%m-%d %H:%M:%S")
+        print(
+            f"{record.number:>4}  {created}  {format_size(record.size):>10}  "
+            f"{record.mode:<8}  {path}"
+        )
+
+
+def handle_get_backup_all(args: Any) -> None:
+    from poetry2rye.batch import find_backed_up_projects
+    from poetry2rye.batch import restore_all
+
+    if args.backup_number is not None:
+        raise ControlledError("--backup-number cannot be used with --all")
+    if args.preview:
+        raise ControlledError("--preview cannot be used with --all")
+
+    root = Path(args.path).absolute()
+    projects = list(find_backed_up_projects(root))
+    if not projects:
+        raise ControlledError(f"no backups found under {root}")
+
+    if not args.yes:
+        c = input(f"really restore backups of {len(projects)} projects? [y/N] ")
+
+        if c != "y":
+            print("aborting...")
+            return
+
+    report_counts(restore_all(projects, max_workers=args.jobs))
+
+
 def handle_get_backup(args: Any) -> None:
+    from poetry2rye.backup import find_backup
+    from poetry2rye.backup import preview_restore
+    from poetry2rye.backup import restore_backup
+
+    if args.all:
+        handle_get_backup_all(args)
+        return
+
     path = args.path
     num = args.backup_number
     yes = args.yes
     project_path = Path(path).absolute()
 
-    if num is None:
-        num = get_biggest_backup_num(project_path)
-
-    assert num >= 0
+    path = find_backup(project_path, num)
 
-    path = backup_path(project_path, num)
-
-    assert path.exists()
+    if args.preview:
+        changes = preview_restore(project_path, path)
+        for change in changes:
+            print(change)
+        if not changes:
+            print("the project is the same as the backup")
+            return
 
     if not yes:
         c = input(f"really restore backup from {path}? [y/N] ")
@@ -48,19 +231,176 @@ def handle_get_backup(args: Any) -> None:
 
     print("restoring backup...")
 
-    shutil.rmtree(project_path)
-    shutil.copytree(path, project_path)
+    restore_backup(project_path, path)
 
     print("done")
 
 
+def handle_verify(args: Any) -> None:
+    from poetry2rye.verify import verify_project
+
+    checked = 0
+    failed = 0
+    for path in args.paths:
+        project_path = Path(path).absolute()
+        try:
+            count, problems = verify_project(project_path, use_cache=not args.no_cache)
+        except ControlledError as e:
+            problems = [str(e)]
+            count = 0
+
+        checked += count
+        if problems:
+            failed += 1
+        if args.json:
+            print(
+                json.dumps(
+                    {"path": str(project_path), "checked": count, "problems": problems}
+                )
+            )
+        else:
+            for problem in problems:
+                print(f"{project_path}: {problem}")
+
+    print(
+        f"checked {checked} requirements of {len(args.paths)} projects: "
+        f"{failed} with problems",
+        file=sys.stderr,
+    )
+    if failed:
+        exit(1)
+
+
+def handle_sync(args: Any) -> None:
+    from poetry2rye.sync import sync
+
+    project_path = Path(args.path).absolute()
+    changed = sync(project_path, check=args.check)
+    if args.check:
+        if changed:
+            print(f"{project_path}: [project] is out of date with tool.poetry")
+            exit(1)
+    elif changed:
+        print(f"synced {project_path}")
+
+
+def handle_serve(args: Any) -> None:
+    from poetry2rye.serve import Server
+    from poetry2rye.serve import serve_stdio
+    from poetry2rye.serve import serve_unix
+
+    server = Server(max_workers=args.jobs)
+    try:
+        if args.socket is not None:
+            serve_unix(server, args.socket)
+        else:
+            serve_stdio(server)
+    finally:
+        server.close()
+
+
+def add_common_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--check",
+        help="do not change anything, but exit with 1 if the migration would change the project or give warnings.",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--drop-lock",
+        help="remove poetry.lock without translating it to requirements.lock / requirements-dev.lock.",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--no-cache",
+        help=f"do not use the plan cache, which skips planning the migration of projects unchanged since it was last planned. (the cache is kept in $XDG_CACHE_HOME/poetry2rye, or ${CACHE_DIR_ENV})",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--backup-mode",
+        help="full: copy the whole project. journal: only keep what the migration changes (the files it overwrites or deletes, and the moves it makes). archive: write the whole project to a compressed tarball. (default: full)",
+        choices=BACKUP_MODES,
+        default="full",
+    )
+    parser.add_argument(
+        "--archive-codec",
+        help="the compression of archive backups. (default: gz)",
+        choices=list(ARCHIVE_CODECS),
+        default="gz",
+    )
+    parser.add_argument(
+        "--keep-last",
+        help="after migrating, remove all but the last N backups of the project",
+        type=int,
+        default=None,
+        metavar="N",
+    )
+    parser.add_argument(
+        "--max-age",
+        help="after migrating, remove the backups of the project older than DAYS (the latest backup is always kept)",
+        type=float,
+        default=None,
+        metavar="DAYS",
+    )
+    parser.add_argument(
+        "--max-bytes",
+        help="after migrating, remove the oldest backups of the project until they take at most SIZE in total (e.g. 500M, 2G. the latest backup is always kept)",
+        type=parse_size,
+        default=None,
+        metavar="SIZE",
+    )
+    parser.add_argument(
+        "--backup-exclude",
+        help='leave the paths matching PATTERN (in .gitignore syntax, e.g. ".venv", "__pycache__/", "dist/") out of the backup. get-backup leaves them in place. can be repeated.',
+        action="append",
+        metavar="PATTERN",
+    )
+    parser.add_argument(
+        "--backup-gitignore",
+        help="also leave the paths ignored by the .gitignore files of the project out of the backup",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--copy-engine",
+        help="how the backup is copied. auto uses reflinks (copy-on-write) if the filesystem supports them, and a multi-threaded copy otherwise. hardlink links every file the migration does not change. (default: auto)",
+        choices=COPY_ENGINES,
+        default="auto",
+    )
+
+
 def main(args: Optional[list[str]] = None):
     parser = argparse.ArgumentParser(
         prog="poetry2rye",
         description="A simple tool to migrate your Poetry project to rye",
     )
 
-    subparsers = parser.add_subparsers()
+    parser.add_argument(
+        "--timings",
+        help=f"write the time spent in each phase, and file and syscall counts of the backup, as JSON to FILE (default: stderr). can also be set with the {TIMINGS_ENV} environment variable.",
+        nargs="?",
+        const="-",
+        default=None,
+        metavar="FILE",
+    )
+    parser.add_argument(
+        "--progress",
+        help=f"write the progress of backups and restores (with their throughput and ETA) as JSON lines to FILE (default: stderr). can also be set with the {PROGRESS_ENV} environment variable.",
+        nargs="?",
+        const="-",
+        default=None,
+        metavar="FILE",
+    )
+    parser.add_argument(
+        "--profile",
+        help=f"dump a cProfile profile of the whole run to FILE. can also be set with the {PROFILE_ENV} environment variable.",
+        default=None,
+        metavar="FILE",
+    )
+
+    subparsers = parser.add_subparsers(dest="command")
 
     mig_parser = subparsers.add_parser("mig", help="migrate a Poetry project to rye")
 
@@ -79,6 +419,83 @@ def main(args: Optional[list[str]] = None):
         action="store_true",
         default=False,
     )
+    add_common_arguments(mig_parser)
+    mig_parser.add_argument(
+        "--diff",
+        help="do not change anything, but print the diff of pyproject.toml and the files which would be written, removed or moved.",
+        action="store_true",
+        default=False,
+    )
+
+    mig_all_parser = subparsers.add_parser(
+        "mig-all", help="migrate every Poetry project under a directory to rye"
+    )
+
+    mig_all_parser.add_argument("root")
+    mig_all_parser.set_defaults(func=handle_mig_all)
+
+    mig_all_parser.add_argument(
+        "--workspace",
+        help="make the projects the members of one rye workspace rooted at root: path dependencies between them become workspace members, and the whole workspace is locked once instead of each project",
+        action="store_true",
+        default=False,
+    )
+    mig_all_parser.add_argument(
+        "--include",
+        help="glob (relative to root) of project directories to migrate. can be repeated. (default: all)",
+        action="append",
+        metavar="PATTERN",
+    )
+    mig_all_parser.add_argument(
+        "--exclude",
+        help="glob (relative to root) of project directories to skip. can be repeated.",
+        action="append",
+        metavar="PATTERN",
+    )
+    mig_all_parser.add_argument(
+        "--ignore-src",
+        help='ignore the checking/creating "src/" directory for all projects.',
+        action="store_true",
+        default=False,
+    )
+    mig_all_parser.add_argument(
+        "--ignore-src-for",
+        help='ignore the checking/creating "src/" directory for projects matching the glob. can be repeated.',
+        action="append",
+        metavar="PATTERN",
+    )
+    mig_all_parser.add_argument(
+        "--virtual",
+        help="migrate all projects as virtual packages.",
+        action="store_true",
+        default=False,
+    )
+    mig_all_parser.add_argument(
+        "--virtual-for",
+        help="migrate projects matching the glob as virtual packages. can be repeated.",
+        action="append",
+        metavar="PATTERN",
+    )
+    add_common_arguments(mig_all_parser)
+    mig_all_parser.add_argument(
+        "--jobs",
+        "-j",
+        help="the number of worker processes (default: number of CPUs)",
+        type=int,
+        default=None,
+    )
+
+    list_backups_parser = subparsers.add_parser(
+        "list-backups", help="list the backups of a project"
+    )
+
+    list_backups_parser.add_argument("path")
+    list_backups_parser.add_argument(
+        "--json",
+        help="print the backup index as JSON",
+        action="store_true",
+    )
+    list_backups_parser.set_defaults(func=handle_list_backups)
 
     get_backup_parser = subparsers.add_parser(
         "get-backup", help="get a backup of a Poetry project"
@@ -98,13 +515,103 @@ def main(args: Optional[list[str]] = None):
         help="do not ask for confirmation",
         action="store_true",
     )
+    get_backup_parser.add_argument(
+        "--preview",
+        help="print what restoring the backup would change before asking for confirmation",
+        action="store_true",
+    )
+    get_backup_parser.add_argument(
+        "--all",
+        help="restore the latest backup of every project under the path",
+        action="store_true",
+    )
+    get_backup_parser.add_argument(
+        "--jobs",
+        "-j",
+        help="the number of worker processes used with --all (default: number of CPUs)",
+        type=int,
+        default=None,
+    )
     get_backup_parser.set_defaults(func=handle_get_backup)
 
+    verify_parser = subparsers.add_parser(
+        "verify",
+        help="check offline that the versions locked in poetry.lock satisfy the requirements of the migrated projects",
+    )
+    verify_parser.add_argument("paths", nargs="+", metavar="path")
+    verify_parser.add_argument(
+        "--json",
+        help="print one JSON record per project",
+        action="store_true",
+    )
+    verify_parser.add_argument(
+        "--no-cache",
+        help="do not use the plan cache",
+        action="store_true",
+        default=False,
+    )
+    verify_parser.set_defaults(func=handle_verify)
+
+    sync_parser = subparsers.add_parser(
+        "sync",
+        help="update [project] from tool.poetry, changing only what changed since the last sync",
+    )
+    sync_parser.add_argument("path", nargs="?", default=".")
+    sync_parser.add_argument(
+        "--check",
+        help="only exit with 1 if [project] is out of date",
+        action="store_true",
+    )
+    sync_parser.set_defaults(func=handle_sync)
+
+    serve_parser = subparsers.add_parser(
+        "serve",
+        help="run mig, check and get-backup jobs sent as JSON-RPC requests, in one long-lived process",
+    )
+    serve_parser.add_argument(
+        "--socket",
+        help="listen on the Unix socket at PATH instead of reading requests from stdin",
+        type=Path,
+        default=None,
+        metavar="PATH",
+    )
+    serve_parser.add_argument(
+        "--jobs",
+        "-j",
+        help="the number of worker processes (default: number of CPUs)",
+        type=int,
+        default=None,
+    )
+    serve_parser.set_defaults(func=handle_serve)
+
     args = parser.parse_args(args)
     if not hasattr(args, "func"):
         parser.print_help()
         exit(1)
 
+    timings_destination = args.timings or destination_from_env(TIMINGS_ENV)
+    timings_env = os.environ.get(TIMINGS_ENV)
+    run_timings = None
+    if timings_destination is not None:
+        from poetry2rye import timings
+
+        # also seen by the worker processes of batch commands
+        os.environ[TIMINGS_ENV] = timings_destination
+        run_timings = timings.enable()
+
+    progress_env = os.environ.get(PROGRESS_ENV)
+    if args.progress is not None:
+        # (read by every task, also in the worker processes of batch commands)
+        os.environ[PROGRESS_ENV] = args.progress
+
+    profile_path = args.profile or os.environ.get(PROFILE_ENV)
+    profiler = None
+    if profile_path:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+
     try:
         args.func(args)
     except ControlledError as e:
@@ -113,6 +620,24 @@ def main(args: Optional[list[str]] = None):
     except Exception:
         print("unexpected error occurred!")
         raise
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+
+        if args.progress is not None:
+            if progress_env is None:
+                del os.environ[PROGRESS_ENV]
+            else:
+                os.environ[PROGRESS_ENV] = progress_env
+
+        if run_timings is not None:
+            timings.disable()
+            timings.emit(run_timings, timings_destination, command=args.command)
+            if timings_env is None:
+                del os.environ[TIMINGS_ENV]
+            else:
+                os.environ[TIMINGS_ENV] = timings_env
 
 
 if __name__ == "__main__":
@@ -0,0 +1,109 @@
+import bisect
+import os
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterator
+from typing import Pattern
+
+from poetry2rye import timings
+
+# directories never holding files to package, which are not walked
+SKIP_DIRS = {".git", ".hg", ".venv", "__pycache__", "node_modules"}
+
+
+@lru_cache(maxsize=256)
+def compile_glob(pattern: str) -> Pattern[str]:
+    """
+    Compile a "/"-separated glob, where "**" matches any number of directories,
+    "*" and "?" match within one path component, and [...] a set of characters.
+    """
+    i = 0
+    out = []
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif c == "*":
+            out.append("[^/]*")
+            i += 1
+        elif c == "?":
+            out.append("[^/]")
+            i += 1
+        elif c == "[" and "]" in pattern[i + 1 :]:
+            end = pattern.index("]", i + 1)
+            chars = pattern[i + 1 : end]
+            if chars.startswith("!"):
+                chars = "^" + chars[1:]
+            out.append(f"[{chars}]")
+            i = end + 1
+        else:
+            out.append(re.escape(c))
+            i += 1
+    return re.compile("".join(out))
+
+
+def literal_prefix(pattern: str) -> str:
+    # the leading directories of the pattern without any wildcard
+    parts = []
+    for part in pattern.split("/")[:-1]:
+        if any(c in part for c in "*?["):
+            break
+        parts.append(part + "/")
+    return "".join(parts)
+
+
+class PathIndex:
+    """
+    Every path in a project, found by one walk, to match globs in memory.
+    """
+
+    def __init__(self, paths: list[str], dirs: set[str]) -> None:
+        # sorted, so that the paths under a directory are a contiguous range
+        self.paths = sorted(paths)
+        self.dirs = dirs
+
+    @classmethod
+    def build(cls, root: Path) -> "PathIndex":
+        paths = []
+        dirs = set()
+        stack = [(str(root), "")]
+        while stack:
+            src_dir, rel_dir = stack.pop()
+            timings.count("syscall.scandir")
+            with os.scandir(src_dir) as it:
+                for entry in it:
+                    rel = f"{rel_dir}{entry.name}"
+                    paths.append(rel)
+                    if entry.is_dir(follow_symlinks=False):
+                        dirs.add(rel)
+                        if entry.name not in SKIP_DIRS:
+                            stack.append((entry.path, f"{rel}/"))
+        return cls(paths, dirs)
+
+    def exists(self, rel: str) -> bool:
+        i = bisect.bisect_left(self.paths, rel)
+        return i < len(self.paths) and self.paths[i] == rel
+
+    def is_dir(self, rel: str) -> bool:
+        return rel in self.dirs
+
+    def under(self, prefix: str) -> Iterator[str]:
+        i = bisect.bisect_left(self.paths, prefix)
+        while i < len(self.paths) and self.paths[i].startswith(prefix):
+            yield self.paths[i]
+            i += 1
+
+    def glob(self, pattern: str) -> list[str]:
+        pattern = pattern.strip("/")
+        if not any(c in pattern for c in "*?["):
+            return [pattern] if self.exists(pattern) else []
+
+        regex = compile_glob(pattern)
+        return [
+            rel for rel in self.under(literal_prefix(pattern)) if regex.fullmatch(rel)
+        ]
@@ -0,0 +1,132 @@
+import difflib
+import os
+import shutil
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+from typing import Callable
+from typing import Optional
+
+from poetry2rye import timings
+from poetry2rye.journal import Journal
+from poetry2rye.utils import write_atomic
+
+
+@dataclass(frozen=True)
+class FileOperation:
+    # one of "write", "remove", "mkdir" and "move". paths are relative to the project
+    kind: str
+    path: str
+    content: Optional[str] = None
+    dst: Optional[str] = None
+
+    def describe(self) -> str:
+        if self.kind == "move":
+            return f"move {self.path} -> {self.dst}"
+        return f"{self.kind} {self.path}"
+
+
+@dataclass(frozen=True)
+class DependencyTranslation:
+    name: str
+    # "main" or "dev"
+    group: str
+    # the PEP 508 requirement it becomes
+    requirement: str
+
+
+@dataclass(frozen=True)
+class MigrationPlan:
+    """
+    Everything a migration would do, computed without changing anything.
+
+    Apply it to a project with execute_plan.
+    """
+
+    original: str
+    rendered: str
+    warnings: tuple[str, ...] = ()
+    operations: tuple[FileOperation, ...] = ()
+    dependencies: tuple[DependencyTranslation, ...] = ()
+    requires_python: Optional[str] = None
+
+    def diff(self) -> str:
+        return "".join(
+            difflib.unified_diff(
+                self.original.splitlines(keepends=True),
+                self.rendered.splitlines(keepends=True),
+                fromfile="a/pyproject.toml",
+                tofile="b/pyproject.toml",
+            )
+        )
+
+
+def plan_from_dict(data: dict[str, Any]) -> MigrationPlan:
+    return MigrationPlan(
+        original=data["original"],
+        rendered=data["rendered"],
+        warnings=tuple(data["warnings"]),
+        operations=tuple(FileOperation(**op) for op in data["operations"]),
+        dependencies=tuple(DependencyTranslation(**d) for d in data["dependencies"]),
+        requires_python=data["requires_python"],
+    )
+
+
+def execute_plan(
+    plan: MigrationPlan,
+    project_path: Path,
+    journal: Optional[Journal] = None,
+    start: int = 0,
+    on_applied: Optional[Callable[[int], None]] = None,
+) -> None:
+    """
+    Apply the operations of the plan from the start-th one, calling on_applied
+    with the number of operations done after each one.
+
+    An operation interrupted halfway can be applied again.
+    """
+    for i, op in enumerate(plan.operations[start:], start=start):
+        # a resumed journal already holds the operations it recorded
+        recorded = journal is not None and i < len(journal.entries)
+        with timings.phase(f"apply.{op.kind}"):
+            _apply_operation(project_path, op, None if recorded else journal)
+        if on_applied is not None:
+            on_applied(i + 1)
+
+
+def _apply_operation(
+    project_path: Path, op: FileOperation, journal: Optional[Journal] = None
+) -> None:
+    path = project_path / op.path
+
+    if op.kind == "write":
+        if journal is not None:
+            journal.record_write(op.path)
+        write_atomic(path, op.content or "")
+    elif op.kind == "remove":
+        if journal is not None:
+            journal.record_remove(op.path)
+        if os.path.lexists(path):
+            os.remove(path)
+    elif op.kind == "mkdir":
+        if journal is not None:
+            journal.record_mkdir(op.path)
+        path.mkdir(exist_ok=True)
+    elif op.kind == "move":
+        assert op.dst is not None
+        if journal is not None:
+            journal.record_move(op.path, op.dst)
+        dst = project_path / op.dst
+        # (moved already, by an interrupted run)
+        if os.path.lexists(path) or not os.path.lexists(dst):
+            shutil.move(path, dst)
+    else:
+        raise ValueError(f"unknown file operation: {op.kind}")
+
+
+def find_warnings(rendered: str) -> list[str]:
+    return [
+        f"found 'poetry' in line {num}: {content.strip()}"
+        for num, content in enumerate(rendered.splitlines(), start=1)
+        if "poetry" in content
+    ]
@@ -0,0 +1,73 @@
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from poetry2rye import timings
+from poetry2rye.error import ControlledError
+from poetry2rye.ignore import Excludes
+from poetry2rye.utils import format_size
+
+
+@dataclass
+class TreeSize:
+    files: int = 0
+    bytes: int = 0
+
+
+def _scan_dir(
+    item: tuple[str, str], exclude: Optional[Excludes]
+) -> tuple[int, int, list[tuple[str, str]]]:
+    path, rel_dir = item
+    files = 0
+    size = 0
+    subdirs = []
+    timings.count("syscall.scandir")
+    with os.scandir(path) as it:
+        for entry in it:
+            rel = f"{rel_dir}{entry.name}"
+            is_dir = entry.is_dir(follow_symlinks=False)
+            if exclude is not None and exclude.match(rel, is_dir):
+                continue
+            if is_dir:
+                subdirs.append((entry.path, f"{rel}/"))
+            else:
+                files += 1
+                size += entry.stat(follow_symlinks=False).st_size
+    return files, size, subdirs
+
+
+def scan_size(
+    root: Path,
+    max_workers: Optional[int] = None,
+    exclude: Optional[Excludes] = None,
+) -> TreeSize:
+    """
+    Count the files (and symlinks) under root and their bytes, scanning the
+    directories of each level of the tree in parallel.
+    """
+    total = TreeSize()
+    level = [(str(root), "")]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while level:
+            next_level: list[tuple[str, str]] = []
+            scanned = executor.map(lambda item: _scan_dir(item, exclude), level)
+            for files, size, subdirs in scanned:
+                total.files += files
+                total.bytes += size
+                next_level.extend(subdirs)
+            level = next_level
+    return total
+
+
+def check_disk_space(project_path: Path, needed: int) -> None:
+    # backups are written next to the project
+    free = shutil.disk_usage(project_path.parent).free
+    if needed > free:
+        raise ControlledError(
+            f"not enough disk space to back up {project_path}: "
+            f"the backup needs {format_size(needed)}, "
+            f"but only {format_size(free)} is free"
+        )
@@ -0,0 +1,168 @@
+import json
+import multiprocessing
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any
+from typing import Iterator
+from typing import Optional
+from typing import TextIO
+
+from poetry2rye import utils
+from poetry2rye.utils import PROGRESS_ENV
+from poetry2rye.utils import format_size
+
+# the least time between two progress events of a task, in seconds
+INTERVAL = 0.5
+
+
+def destination_from_env() -> Optional[str]:
+    return utils.destination_from_env(PROGRESS_ENV)
+
+
+def _format_eta(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02}:{seconds:02}"
+
+
+class Progress:
+    """
+    The progress of copying files_total files of bytes_total bytes, reported as
+    JSON lines to a stream and as a status line on an interactive stderr.
+    """
+
+    def __init__(
+        self,
+        task: str,
+        project: str,
+        files_total: int,
+        bytes_total: int,
+        stream: Optional[TextIO] = None,
+        interactive: bool = False,
+    ) -> None:
+        self.task = task
+        self.project = project
+        self.files_total = files_total
+        self.bytes_total = bytes_total
+        self.stream = stream
+        self.interactive = interactive
+        self.files = 0
+        self.bytes = 0
+        self.start = time.perf_counter()
+        self._last = 0.0
+        self._lock = threading.Lock()
+
+    def event(self, event: str, **extra: Any) -> dict[str, Any]:
+        elapsed = time.perf_counter() - self.start
+        rate = self.bytes / elapsed if elapsed > 0 else 0.0
+        eta = (self.bytes_total - self.bytes) / rate if rate > 0 else None
+        return {
+            "event": event,
+            "task": self.task,
+            "project": self.project,
+            "files": self.files,
+            "files_total": self.files_total,
+            "bytes": self.bytes,
+            "bytes_total": self.bytes_total,
+            "elapsed": round(elapsed, 3),
+            "rate": round(rate),
+            "eta": None if eta is None else round(max(eta, 0.0), 1),
+            **extra,
+        }
+
+    def emit(self, event: str, **extra: Any) -> None:
+        data = self.event(event, **extra)
+        if self.stream is not None:
+            # one write per line, so the lines of processes sharing the file
+            # are not mixed
+            self.stream.write(json.dumps(data) + "\n")
+            self.stream.flush()
+        if self.interactive:
+            line = (
+                f"{self.task}: {format_size(self.bytes)}/"
+                f"{format_size(self.bytes_total)} "
+                f"({self.files}/{self.files_total} files) "
+                f"{format_size(data['rate'])}/s"
+            )
+            if data["eta"] is not None and event == "progress":
+                line += f" ETA {_format_eta(data['eta'])}"
+            end = "\n" if event == "end" else ""
+            print(f"\r{line}\033[K", end=end, file=sys.stderr, flush=True)
+
+    def advance(self, size: int, files: int = 1) -> None:
+        with self._lock:
+            self.files += files
+            self.bytes += size
+            now = time.perf_counter()
+            if now - self._last < INTERVAL:
+                return
+            self._last = now
+            self.emit("progress")
+
+
+# the progress of the running task, or None. copier, store and restore call
+# advance from the threads of their pools, where a context variable set by
+# task would not be seen; Progress.advance takes its lock for them.
+_current: Optional[Progress] = None
+
+
+@contextmanager
+def task(name: str, project: Any, files: int, size: int) -> Iterator[None]:
+    """
+    Report the progress of the task while in the block, when a progress
+    stream is set or stderr is a terminal.
+    """
+    global _current
+
+    destination = destination_from_env()
+    # (the workers of batch commands would mix their status lines)
+    interactive = (
+        sys.stderr.isatty()
+        and multiprocessing.parent_process() is None
+        and destination != "-"
+    )
+    if destination is None and not interactive:
+        yield
+        return
+
+    stream: Optional[TextIO] = None
+    if destination == "-":
+        stream = sys.stderr
+    elif destination is not None:
+        stream = open(destination, "a")
+
+    progress = Progress(name, str(project), files, size, stream, interactive)
+    _current = progress
+    try:
+        progress.emit("start")
+        yield
+        progress.emit("end")
+    finally:
+        _current = None
+        if stream is not None and stream is not sys.stderr:
+            stream.close()
+
+
+def is_active() -> bool:
+    return _current is not None
+
+
+def advance(size: int, files: int = 1) -> None:
+    progress = _current
+    if progress is not None:
+        progress.advance(size, files)
+
+
+def emit(event: str, project: Any, **extra: Any) -> None:
+    # a one-off event, written only to the progress stream
+    destination = destination_from_env()
+    if destination is None:
+        return
+    data = json.dumps({"event": event, "project": str(project), **extra})
+    if destination == "-":
+        print(data, file=sys.stderr)
+    else:
+        with open(destination, "a") as f:
+            f.write(data + "\n")
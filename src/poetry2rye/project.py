@@ -1,21 +1,22 @@
 import re
-import tomllib
 from dataclasses import dataclass
-from pathlib import Path
-from typing import Any, Optional
+from functools import cached_property
+from pathlib import Path, PurePosixPath
+from typing import Any, Optional, Union
 
 import slugify
-from poetry.core.constraints.version.parser import parse_constraint
+import tomlkit
 from poetry.core.constraints.version.version_constraint import VersionConstraint
-from poetry.core.version.helpers import format_python_constraint
 
+from poetry2rye import timings
+from poetry2rye.constraints import format_constraint
+from poetry2rye.constraints import format_python_marker
+from poetry2rye.constraints import parse_version_constraint
 from poetry2rye.error import ControlledError
+from poetry2rye.pathindex import PathIndex
 from poetry2rye.utils import find_other_key
 
-PYTHON_MARKER = re.compile(r"(\d+(\.\d+)?)")
 
-
-# unused
 def poetry_canonicalize_name(project_name: str) -> str:
     """
     Convert a project name to a canonical form by Poetry-Style.
@@ -34,7 +35,7 @@ def rye_module_name(project_name: str) -> str:
     return rye_canonicalize_name(project_name).replace("-", "_")
 
 
-@dataclass
+@dataclass(slots=True)
 class Dependency:
     name: str
     extras: Optional[list[str]]
@@ -51,39 +52,38 @@ class Dependency:
         return name
 
 
-@dataclass
+# (slots dataclasses can not use zero-argument super(), so the base class is
+# called explicitly)
+@dataclass(slots=True)
 class BasicDependency(Dependency):
     version: VersionConstraint
-    python: Optional[str]
+    python: Optional[Union[VersionConstraint, str]]
 
     def is_python_dep(self) -> bool:
         return self.name == "python"
 
     def to_str(self) -> str:
-        name = super().to_str()
+        name = Dependency.to_str(self)
 
-        version = format_python_constraint(self.version)
+        version = format_constraint(self.version)
         if version == "*":
             # using "*" is equivalent to not specifying the version
             return f"{name}"
 
-        constraint = f"{name}{format_python_constraint(self.version)}"
+        constraint = f"{name}{version}"
         if self.python:
-            py_version = PYTHON_MARKER.sub(
-                r"'\1'", format_python_constraint(self.python)
-            )
-            constraint += f"; python_version {py_version}"
+            constraint += f"; {format_python_marker(self.python)}"
 
         return constraint
 
 
-@dataclass
+@dataclass(slots=True)
 class GitDependency(Dependency):
     git_link: str
     tag: Optional[str]
 
     def to_str(self) -> str:
-        name = super().to_str()
+        name = Dependency.to_str(self)
 
         link = self.git_link
         if self.tag:
@@ -92,24 +92,59 @@ class GitDependency(Dependency):
         return f"{name} @ git+{link}"
 
 
+@dataclass(slots=True)
+class PathDependency(Dependency):
+    # as written in pyproject.toml: relative to the project, or absolute
+    path: str
+
+    def to_str(self) -> str:
+        name = Dependency.to_str(self)
+
+        path = PurePosixPath(self.path)
+        if path.is_absolute():
+            return f"{name} @ file://{path}"
+        # (rye expands PROJECT_ROOT, so the project can be moved)
+        return f"{name} @ file:///${{PROJECT_ROOT}}/{path}"
+
+
 class PoetryProject:
-    def __init__(self, project_path: Path, ensure_src: bool = True) -> None:
+    def __init__(
+        self,
+        project_path: Path,
+        ensure_src: bool = True,
+        text: Optional[str] = None,
+        src_layout: Optional[bool] = None,
+        allow_project: bool = False,
+    ) -> None:
+        # with text (the contents of pyproject.toml) and src_layout (whether
+        # the project has a src directory) given, nothing is read from disk
+        in_memory = text is not None and src_layout is not None
+        self.in_memory = in_memory
+
         self.path = project_path
         self.project_name = rye_canonicalize_name(self.path.name)
         self.module_name = rye_module_name(self.path.name)
 
-        if not (self.path / "pyproject.toml").exists():
-            raise ControlledError("pyproject.toml not found")
+        if text is None:
+            if not (self.path / "pyproject.toml").exists():
+                raise ControlledError("pyproject.toml not found")
+
+            with open(self.path / "pyproject.toml") as file:
+                text = file.read()
+        self.text = text
 
-        with open(self.path / "pyproject.toml", "rb") as file:
-            self.pyproject = tomllib.load(file)
+        # pyproject.toml is parsed once: the migration renders from this
+        # document, and tool.poetry is read from it as plain values
+        with timings.phase("parse.pyproject"):
+            self.document = tomlkit.parse(text)
 
         try:
-            self.poetry = self.pyproject["tool"]["poetry"]
+            self.poetry = self.document["tool"]["poetry"].unwrap()
         except Exception:
             raise ControlledError("this project is not managed by poetry !")
 
-        if self.pyproject.get("project") is not None:
+        # (sync keeps the project section up to date with tool.poetry)
+        if self.document.get("project") is not None and not allow_project:
             raise ControlledError(
                 "this pyproject.toml has a project section.\n"
                 "for now, poetry2rye only supports pyproject.toml written using "
@@ -119,12 +154,18 @@ class PoetryProject:
         if self.poetry is None:
             raise ControlledError("poetry section not found in pyproject.toml")
 
+        if src_layout is None:
+            src_layout = (self.path / "src").exists()
+        self.src_layout = src_layout
+
         if ensure_src:
             self.src_path: Path
             self.module_path: Path
             # this method is not exact, but tentatively we do this
-            if (self.path / "src").exists():
+            if src_layout:
                 self.src_path = self.path / "src"
+                if in_memory:
+                    return
                 sub_lst = [
                     d for d in self.src_path.iterdir() if not d.name.startswith(".")
                 ]
@@ -138,9 +179,30 @@ class PoetryProject:
                 self.src_path = self.path
                 self.module_path = self.src_path / self.module_name
 
-                if not self.module_path.exists():
+                if not in_memory and not self.module_path.exists():
                     raise ControlledError(f'module "{self.module_name}" not found')
 
+    @classmethod
+    def from_text(
+        cls,
+        text: str,
+        name: str,
+        ensure_src: bool = True,
+        src_layout: bool = False,
+        allow_project: bool = False,
+    ) -> "PoetryProject":
+        """
+        Make a project from the contents of its pyproject.toml, without
+        reading anything from disk. name is the name of the project directory.
+        """
+        return cls(
+            Path(name),
+            ensure_src=ensure_src,
+            text=text,
+            src_layout=src_layout,
+            allow_project=allow_project,
+        )
+
     def process_dependencies_dict(
         self, dct: dict[str, Any], is_dev: bool
     ) -> list[Dependency]:
@@ -153,7 +215,7 @@ class PoetryProject:
                 res.append(
                     BasicDependency(
                         name=name,
-                        version=parse_constraint(parts[0]),
+                        version=parse_version_constraint(parts[0]),
                         python=parts[1].split(" ")[1]
                         if len(parts) > 1 and "python" in parts[1]
                         else None,
@@ -168,8 +230,8 @@ class PoetryProject:
                     res.append(
                         BasicDependency(
                             name=name,
-                            version=parse_constraint(i["version"]),
-                            python=parse_constraint(i["python"])
+                            version=parse_version_constraint(i["version"]),
+                            python=parse_version_constraint(i["python"])
                             if "python" in i
                             else None,
                             extras=i["extras"] if "extras" in i else None,
@@ -197,6 +259,23 @@ class PoetryProject:
                         )
                     )
 
+                elif "path" in item:
+                    if (
+                        k := find_other_key(item, ["path", "develop", "extras"])
+                    ) is not None:
+                        raise ControlledError(
+                            f"key {k} is not supported (in dependency {name})"
+                        )
+
+                    res.append(
+                        PathDependency(
+                            name=name,
+                            path=item["path"],
+                            is_dev=is_dev,
+                            extras=item.get("extras"),
+                        )
+                    )
+
                 elif "version" in item:
                     if (
                         k := find_other_key(item, ["version", "extras", "python"])
@@ -208,8 +287,8 @@ class PoetryProject:
                     res.append(
                         BasicDependency(
                             name=name,
-                            version=parse_constraint(item["version"]),
-                            python=parse_constraint(item["python"])
+                            version=parse_version_constraint(item["version"]),
+                            python=parse_version_constraint(item["python"])
                             if "python" in item
                             else None,
                             extras=item.get("extras"),
@@ -224,8 +303,25 @@ class PoetryProject:
 
         return res
 
+    @cached_property
+    def index(self) -> Optional[PathIndex]:
+        # the paths in the project, to resolve the globs of packages and include
+        if self.in_memory:
+            return None
+        with timings.phase("index"):
+            return PathIndex.build(self.path)
+
     @property
+    def walked(self) -> bool:
+        # whether the paths in the project were read
+        return "index" in self.__dict__
+
+    @cached_property
     def dependencies(self) -> list[Dependency]:
+        with timings.phase("dependencies"):
+            return self._dependencies()
+
+    def _dependencies(self) -> list[Dependency]:
         res = []
 
         dep = self.poetry["dependencies"]
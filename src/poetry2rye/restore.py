@@ -0,0 +1,309 @@
+import os
+import shutil
+import stat
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from dataclasses import field
+from pathlib import Path
+from typing import Any
+from typing import Iterable
+from typing import Iterator
+from typing import Optional
+
+from poetry2rye import progress
+from poetry2rye import timings
+from poetry2rye.copier import copy_file_data
+from poetry2rye.ignore import Excludes
+from poetry2rye.store import Manifest
+from poetry2rye.store import ObjectStore
+from poetry2rye.store import hash_file
+from poetry2rye.store import store_path
+from poetry2rye.utils import walk_tree
+
+
+@dataclass
+class Entry:
+    # one of "file", "dir" and "symlink"
+    type: str
+    mode: int = 0
+    mtime: float = 0
+    size: int = 0
+    target: Optional[str] = None
+    hash: Optional[str] = None
+
+
+def scan_tree(root: Path, exclude: Optional[Excludes] = None) -> dict[str, Entry]:
+    entries: dict[str, Entry] = {}
+    if not root.exists():
+        return entries
+
+    for rel, entry in walk_tree(root, exclude):
+        st = entry.stat(follow_symlinks=False)
+        if entry.is_symlink():
+            entries[rel] = Entry("symlink", target=os.readlink(entry.path))
+        elif entry.is_dir(follow_symlinks=False):
+            entries[rel] = Entry("dir", stat.S_IMODE(st.st_mode), st.st_mtime)
+        else:
+            entries[rel] = Entry(
+                "file", stat.S_IMODE(st.st_mode), st.st_mtime, st.st_size
+            )
+    return entries
+
+
+class DirectorySource:
+    """
+    The contents of a backup which is a plain copy of the project.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.entries = scan_tree(path)
+
+    def hash(self, rel: str) -> str:
+        entry = self.entries[rel]
+        if entry.hash is None:
+            entry.hash = hash_file(str(self.path / rel))
+        return entry.hash
+
+    def file_path(self, rel: str) -> Path:
+        return self.path / rel
+
+
+class ManifestSource:
+    """
+    The contents of a backup kept in the object store.
+    """
+
+    def __init__(self, project_path: Path, path: Path) -> None:
+        self.store = ObjectStore(store_path(project_path))
+        self.entries = {
+            rel: Entry(**entry) for rel, entry in Manifest.load(path).entries.items()
+        }
+
+    def hash(self, rel: str) -> str:
+        digest = self.entries[rel].hash
+        assert digest is not None
+        return digest
+
+    def file_path(self, rel: str) -> Path:
+        return self.store.object_path(self.hash(rel))
+
+
+@dataclass
+class RestorePlan:
+    """
+    What restoring a backup changes in the live project. Paths are relative to it.
+    """
+
+    copy: list[str] = field(default_factory=list)
+    rename: list[tuple[str, str]] = field(default_factory=list)
+    delete: list[str] = field(default_factory=list)
+    mkdir: list[str] = field(default_factory=list)
+    symlink: list[str] = field(default_factory=list)
+    # unchanged files whose mode or mtime differ
+    touch: list[str] = field(default_factory=list)
+
+    def describe(self) -> Iterator[str]:
+        for src, dst in self.rename:
+            yield f"rename {src} -> {dst}"
+        for rel in self.delete:
+            yield f"delete {rel}"
+        for rel in self.mkdir:
+            yield f"mkdir {rel}"
+        for rel in self.copy:
+            yield f"copy {rel}"
+        for rel in self.symlink:
+            yield f"symlink {rel}"
+
+    def is_empty(self) -> bool:
+        return not (self.copy or self.rename or self.delete or self.mkdir)
+
+
+def _hash_all(paths: Iterable[str], max_workers: Optional[int]) -> list[str]:
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(hash_file, paths))
+
+
+def plan_restore(
+    project_path: Path,
+    source: Any,
+    live: Optional[dict[str, Entry]] = None,
+    max_workers: Optional[int] = None,
+    exclude: Optional[Excludes] = None,
+) -> RestorePlan:
+    """
+    Compare the backup with the live project, leaving out the paths excluded
+    from the backup.
+
+    Files with the same size and mtime are taken as unchanged. The others of
+    the same size are hashed, and a file missing from the project is renamed
+    from a deleted file with the same contents instead of copied.
+    """
+    if live is None:
+        live = scan_tree(project_path, exclude)
+    entries: dict[str, Entry] = source.entries
+    plan = RestorePlan()
+
+    # files of the same size whose contents decide whether they changed
+    suspects: list[str] = []
+    for rel, entry in entries.items():
+        current = live.get(rel)
+        if current is None or current.type != entry.type:
+            if entry.type == "dir":
+                plan.mkdir.append(rel)
+            elif entry.type == "symlink":
+                plan.symlink.append(rel)
+            else:
+                plan.copy.append(rel)
+        elif entry.type == "symlink":
+            if current.target != entry.target:
+                plan.symlink.append(rel)
+        elif entry.type == "file":
+            if current.size != entry.size:
+                plan.copy.append(rel)
+            elif current.mtime != entry.mtime:
+                suspects.append(rel)
+            elif current.mode != entry.mode:
+                plan.touch.append(rel)
+
+    for rel, current in live.items():
+        entry = entries.get(rel)
+        if entry is None or entry.type != current.type:
+            plan.delete.append(rel)
+
+    digests = _hash_all([str(project_path / rel) for rel in suspects], max_workers)
+    for rel, digest in zip(suspects, digests):
+        if digest == source.hash(rel):
+            plan.touch.append(rel)
+        else:
+            plan.copy.append(rel)
+
+    # the files to copy which are only somewhere else in the project (as moved
+    # by the migration) are renamed back
+    sizes = {entries[rel].size for rel in plan.copy}
+    movable = [
+        rel
+        for rel in plan.delete
+        if live[rel].type == "file" and live[rel].size in sizes
+    ]
+    by_hash = dict(
+        zip(
+            _hash_all([str(project_path / rel) for rel in movable], max_workers),
+            movable,
+        )
+    )
+    for rel in list(plan.copy):
+        if rel in live:
+            continue
+        src = by_hash.pop(source.hash(rel), None)
+        if src is not None:
+            plan.copy.remove(rel)
+            plan.delete.remove(src)
+            plan.rename.append((src, rel))
+
+    plan.mkdir.sort()
+    # deepest first, so a directory is emptied before it is deleted
+    plan.delete.sort(reverse=True)
+    return plan
+
+
+def _remove(path: Path) -> None:
+    if path.is_dir() and not path.is_symlink():
+        shutil.rmtree(path)
+    elif os.path.lexists(path):
+        path.unlink()
+
+
+def _delete(path: Path) -> None:
+    # the contents of a directory are deleted before it, so what is left in
+    # it is excluded from the backup, and stays
+    if path.is_dir() and not path.is_symlink():
+        with os.scandir(path) as it:
+            if next(it, None) is None:
+                os.rmdir(path)
+    elif os.path.lexists(path):
+        path.unlink()
+
+
+def return_excluded(project_path: Path, exclude: Excludes) -> None:
+    """
+    Move the excluded paths in the directories moved by the migration back to
+    where they were. They are not in the backup, so restoring it would
+    leave them behind.
+    """
+    for dst, src in exclude.moves.items():
+        stack = [dst]
+        while stack:
+            rel_dir = stack.pop()
+            path = project_path / rel_dir
+            if path.is_symlink() or not path.is_dir():
+                continue
+            with os.scandir(path) as it:
+                entries = list(it)
+
+            for entry in entries:
+                rel = f"{rel_dir}/{entry.name}"
+                is_dir = entry.is_dir(follow_symlinks=False)
+                if exclude.match(rel, is_dir):
+                    target = project_path / src / rel[len(dst) + 1 :]
+                    if os.path.lexists(target):
+                        continue
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    os.replace(entry.path, target)
+                elif is_dir:
+                    stack.append(rel)
+
+
+def apply_restore(
+    project_path: Path,
+    source: Any,
+    plan: RestorePlan,
+    max_workers: Optional[int] = None,
+) -> None:
+    entries: dict[str, Entry] = source.entries
+    project_path.mkdir(exist_ok=True)
+
+    for src, dst in plan.rename:
+        dst_path = project_path / dst
+        dst_path.parent.mkdir(parents=True, exist_ok=True)
+        _remove(dst_path)
+        os.replace(project_path / src, dst_path)
+        timings.count("files_renamed")
+
+    for rel in plan.delete:
+        _delete(project_path / rel)
+        timings.count("files_deleted")
+
+    for rel in plan.mkdir:
+        (project_path / rel).mkdir(exist_ok=True)
+
+    for rel in plan.symlink:
+        path = project_path / rel
+        _remove(path)
+        target = entries[rel].target
+        assert target is not None
+        os.symlink(target, path)
+
+    def copy_file(rel: str) -> None:
+        path = project_path / rel
+        tmp = path.with_name(f".{path.name}.p2r-tmp")
+        copy_file_data(str(source.file_path(rel)), str(tmp))
+        os.replace(tmp, path)
+        timings.count("files_copied")
+        progress.advance(entries[rel].size)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(copy_file, plan.copy))
+
+    restored = plan.copy + plan.touch + [dst for _, dst in plan.rename]
+    for rel in restored:
+        entry = entries[rel]
+        os.chmod(project_path / rel, entry.mode)
+        os.utime(project_path / rel, (entry.mtime, entry.mtime))
+
+    # set directory times last, as restoring their contents changes them
+    for rel in sorted(entries, reverse=True):
+        entry = entries[rel]
+        if entry.type == "dir":
+            os.chmod(project_path / rel, entry.mode)
+            os.utime(project_path / rel, (entry.mtime, entry.mtime))
@@ -0,0 +1,231 @@
+import argparse
+import io
+import json
+import os
+import socketserver
+import sys
+import threading
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any
+from typing import Callable
+from typing import Iterable
+from typing import Optional
+from typing import TextIO
+
+from poetry2rye.batch import migrate_one
+from poetry2rye.batch import restore_one
+
+# the options of mig / check jobs, named like the command line options
+MIG_PARAMS: dict[str, Any] = {
+    "ignore_src": False,
+    "virtual": False,
+    "drop_lock": False,
+    "no_cache": False,
+    "backup_mode": "full",
+    "archive_codec": "gz",
+    "copy_engine": "auto",
+    "keep_last": None,
+    "max_age": None,
+    "max_bytes": None,
+    "backup_exclude": None,
+    "backup_gitignore": False,
+}
+
+# JSON-RPC 2.0 error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+SERVER_ERROR = -32000
+
+
+class RequestError(Exception):
+    def __init__(self, code: int, message: str) -> None:
+        super().__init__(message)
+        self.code = code
+
+
+def _warm_up() -> None:
+    # load the heavy modules once per worker, not once per job
+    import poetry2rye.convert  # noqa: F401
+
+
+def _mig_job(params: dict[str, Any], check: bool) -> tuple[Callable, tuple]:
+    from poetry2rye.main import convert_options
+
+    unknown = set(params) - set(MIG_PARAMS) - {"path"}
+    if unknown:
+        raise RequestError(INVALID_PARAMS, f"unknown params: {sorted(unknown)}")
+
+    args = {**MIG_PARAMS, **params}
+    if args["max_bytes"] is not None and isinstance(args["max_bytes"], str):
+        from poetry2rye.utils import parse_size
+
+        args["max_bytes"] = parse_size(args["max_bytes"])
+
+    options = {
+        **convert_options(argparse.Namespace(**args)),
+        "ensure_src": not args["ignore_src"],
+        "virtual_project": args["virtual"],
+    }
+    return migrate_one, (str(Path(params["path"]).absolute()), options, check)
+
+
+def _get_backup_job(params: dict[str, Any]) -> tuple[Callable, tuple]:
+    unknown = set(params) - {"path", "backup_number"}
+    if unknown:
+        raise RequestError(INVALID_PARAMS, f"unknown params: {sorted(unknown)}")
+
+    return restore_one, (
+        str(Path(params["path"]).absolute()),
+        params.get("backup_number"),
+    )
+
+
+class Server:
+    """
+    Runs the jobs of JSON-RPC requests on a pool of worker processes.
+
+    The workers live as long as the server, so their imports and caches are
+    shared by every job they run.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None) -> None:
+        self.executor = ProcessPoolExecutor(
+            max_workers=max_workers, initializer=_warm_up
+        )
+        self.stopped = threading.Event()
+
+    def close(self) -> None:
+        self.executor.shutdown()
+
+    def _job(self, method: str, params: Any) -> tuple[Callable, tuple]:
+        if method not in ("mig", "check", "get-backup"):
+            raise RequestError(METHOD_NOT_FOUND, f"unknown method: {method}")
+        if not isinstance(params, dict) or not isinstance(params.get("path"), str):
+            raise RequestError(INVALID_PARAMS, "params must be an object with a path")
+
+        if method == "mig":
+            return _mig_job(params, check=False)
+        if method == "check":
+            return _mig_job(params, check=True)
+        return _get_backup_job(params)
+
+    def submit(
+        self, line: str, respond: Callable[[dict[str, Any]], None]
+    ) -> threading.Event:
+        """
+        Start the request in the line, and call respond with the response
+        when it is done. The returned event is set after that.
+        """
+        answered = threading.Event()
+        request_id = None
+        try:
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise RequestError(PARSE_ERROR, f"parse error: {e}")
+            if not isinstance(request, dict) or "method" not in request:
+                raise RequestError(INVALID_REQUEST, "invalid request")
+
+            request_id = request.get("id")
+            method = request["method"]
+
+            if method == "ping":
+                response = _result(request_id, "pong")
+            elif method == "shutdown":
+                self.stopped.set()
+                response = _result(request_id, None)
+            else:
+                response = None
+                func, args = self._job(method, request.get("params"))
+        except RequestError as e:
+            response = _error(request_id, e.code, str(e))
+        except Exception as e:
+            response = _error(request_id, INVALID_PARAMS, f"{type(e).__name__}: {e}")
+
+        if response is not None:
+            respond(response)
+            answered.set()
+            return answered
+
+        def done(future: Future) -> None:
+            try:
+                respond(_result(request_id, future.result()))
+            except Exception as e:
+                respond(_error(request_id, SERVER_ERROR, f"{type(e).__name__}: {e}"))
+            answered.set()
+
+        self.executor.submit(func, *args).add_done_callback(done)
+        return answered
+
+
+def _result(request_id: Any, result: Any) -> dict[str, Any]:
+    return {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+
+def _error(request_id: Any, code: int, message: str) -> dict[str, Any]:
+    return {
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "error": {"code": code, "message": message},
+    }
+
+
+def _responder(out: TextIO) -> Callable[[dict[str, Any]], None]:
+    lock = threading.Lock()
+
+    def respond(response: dict[str, Any]) -> None:
+        with lock:
+            out.write(json.dumps(response) + "\n")
+            out.flush()
+
+    return respond
+
+
+def _serve_lines(server: Server, lines: Iterable[str], out: TextIO) -> None:
+    # requests are answered as their jobs finish, not in order
+    respond = _responder(out)
+    pending = []
+    for line in lines:
+        if not line.strip():
+            continue
+        pending.append(server.submit(line, respond))
+        if server.stopped.is_set():
+            break
+
+    for answered in pending:
+        answered.wait()
+
+
+def serve_stdio(
+    server: Server,
+    stdin: Optional[TextIO] = None,
+    stdout: Optional[TextIO] = None,
+) -> None:
+    _serve_lines(server, stdin or sys.stdin, stdout or sys.stdout)
+
+
+def serve_unix(server: Server, socket_path: Path) -> None:
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self) -> None:
+            _serve_lines(
+                server,
+                io.TextIOWrapper(self.rfile, encoding="utf-8"),
+                io.TextIOWrapper(self.wfile, encoding="utf-8", write_through=True),
+            )
+            if server.stopped.is_set():
+                threading.Thread(target=unix_server.shutdown).start()
+
+    if socket_path.exists():
+        socket_path.unlink()
+
+    with socketserver.ThreadingUnixStreamServer(
+        str(socket_path), Handler
+    ) as unix_server:
+        try:
+            unix_server.serve_forever()
+        finally:
+            os.unlink(socket_path)
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import stat
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any
+from typing import ContextManager
+from typing import Iterator
+from typing import Optional
+
+from poetry2rye import progress
+from poetry2rye import timings
+from poetry2rye.copier import copy_file_data
+from poetry2rye.ignore import Excludes
+from poetry2rye.locking import file_lock
+from poetry2rye.utils import walk_tree
+
+MANIFEST_FILE = ".__p2r_manifest.json"
+
+
+def store_path(project_path: Path) -> Path:
+    # one store is shared by every project in the same directory
+    return project_path.parent / ".__p2r_store"
+
+
+def is_manifest(backup_path: Path) -> bool:
+    return (backup_path / MANIFEST_FILE).exists()
+
+
+def hash_file(path: str) -> str:
+    with open(path, "rb") as f:
+        digest = hashlib.file_digest(f, "sha256").hexdigest()
+    timings.count("files_hashed")
+    return digest
+
+
+class ObjectStore:
+    """
+    File contents keyed by their sha256, shared by all the backups in a directory.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+    def object_path(self, digest: str) -> Path:
+        return self.path / "objects" / digest[:2] / digest[2:]
+
+    def add(self, src: str, digest: str) -> None:
+        dst = self.object_path(digest)
+        if dst.exists():
+            timings.count("objects_reused")
+            return
+
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=dst.parent, prefix=".tmp")
+        os.close(fd)
+        try:
+            copy_file_data(src, tmp)
+            os.replace(tmp, dst)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        timings.count("objects_added")
+
+    def lock(self, shared: bool = False) -> ContextManager[None]:
+        # shared while objects are added, exclusive while they are collected
+        self.path.mkdir(parents=True, exist_ok=True)
+        return file_lock(self.path / "lock", shared=shared)
+
+    def objects(self) -> Iterator[Path]:
+        objects = self.path / "objects"
+        if not objects.exists():
+            return
+        for prefix in objects.iterdir():
+            yield from prefix.iterdir()
+
+    def collect_garbage(self) -> int:
+        """
+        Remove the objects no backup in the directory refers to, and return
+        how many were removed.
+        """
+        with self.lock():
+            return self._collect_garbage()
+
+    def _collect_garbage(self) -> int:
+        used: set[str] = set()
+        for bro in self.path.parent.iterdir():
+            if bro.name.startswith(".__p2r_backup_") and is_manifest(bro):
+                manifest = Manifest.load(bro)
+                used.update(e["hash"] for e in manifest.entries.values() if "hash" in e)
+
+        removed = 0
+        for obj in list(self.objects()):
+            if f"{obj.parent.name}{obj.name}" not in used:
+                obj.unlink()
+                removed += 1
+        return removed
+
+
+class Manifest:
+    """
+    A backup stored as path -> object, with the metadata of each path.
+    """
+
+    def __init__(self, entries: Optional[dict[str, dict[str, Any]]] = None) -> None:
+        self.entries = entries or {}
+
+    @classmethod
+    def load(cls, backup_path: Path) -> "Manifest":
+        with open(backup_path / MANIFEST_FILE) as f:
+            return cls(json.load(f)["entries"])
+
+    def save(self, backup_path: Path) -> None:
+        backup_path.mkdir(exist_ok=True)
+        tmp = backup_path / f"{MANIFEST_FILE}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"version": 1, "entries": self.entries}, f)
+        os.replace(tmp, backup_path / MANIFEST_FILE)
+
+
+def create_store_backup(
+    project_path: Path,
+    dst: Path,
+    max_workers: Optional[int] = None,
+    exclude: Optional[Excludes] = None,
+) -> None:
+    store = ObjectStore(store_path(project_path))
+    manifest = Manifest()
+    files: list[tuple[str, str]] = []
+
+    for rel, entry in walk_tree(project_path, exclude):
+        st = entry.stat(follow_symlinks=False)
+        if entry.is_symlink():
+            manifest.entries[rel] = {
+                "type": "symlink",
+                "target": os.readlink(entry.path),
+            }
+        elif entry.is_dir(follow_symlinks=False):
+            manifest.entries[rel] = {
+                "type": "dir",
+                "mode": stat.S_IMODE(st.st_mode),
+                "mtime": st.st_mtime,
+            }
+        else:
+            manifest.entries[rel] = {
+                "type": "file",
+                "mode": stat.S_IMODE(st.st_mode),
+                "mtime": st.st_mtime,
+                "size": st.st_size,
+            }
+            files.append((rel, entry.path))
+
+    def store_file(item: tuple[str, str]) -> None:
+        rel, path = item
+        digest = hash_file(path)
+        store.add(path, digest)
+        manifest.entries[rel]["hash"] = digest
+        progress.advance(manifest.entries[rel]["size"])
+
+    # the objects are only referred to once the manifest is saved
+    with store.lock(shared=True):
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(store_file, files))
+
+        manifest.save(dst)
@@ -0,0 +1,336 @@
+import hashlib
+import json
+import os
+import re
+import tomllib
+from pathlib import Path
+from typing import TYPE_CHECKING
+from typing import Any
+from typing import Optional
+
+from poetry2rye import timings
+from poetry2rye.error import ControlledError
+from poetry2rye.utils import write_atomic
+
+if TYPE_CHECKING:
+    from poetry2rye.project import PoetryProject
+
+# the version of the saved sync state; states of other versions are ignored
+STATE_VERSION = 2
+
+# the keys of the state which are in [project] under the same name
+PROJECT_KEYS = [
+    "name",
+    "version",
+    "description",
+    "authors",
+    "maintainers",
+    "readme",
+    "keywords",
+    "classifiers",
+    "requires-python",
+    "urls",
+    "scripts",
+]
+
+REQUIREMENT_NAME = re.compile(r"^\s*([A-Za-z0-9][A-Za-z0-9._-]*)")
+
+
+def _digest(value: Any) -> str:
+    return hashlib.sha256(
+        json.dumps(value, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def poetry_hash(pyproject: dict[str, Any]) -> str:
+    return _digest(pyproject.get("tool", {}).get("poetry"))
+
+
+def document_hash(pyproject: dict[str, Any]) -> str:
+    # what sync writes: [project] and tool.rye
+    return _digest(
+        {
+            "project": pyproject.get("project"),
+            "rye": pyproject.get("tool", {}).get("rye"),
+        }
+    )
+
+
+def requirement_name(requirement: str) -> Optional[str]:
+    from poetry2rye.project import poetry_canonicalize_name
+
+    m = REQUIREMENT_NAME.match(requirement)
+    return poetry_canonicalize_name(m.group(1)) if m else None
+
+
+def state_path(project_path: Path) -> Path:
+    # what tool.poetry was last synced to, kept next to the project (like its
+    # backups) so that it is not committed with it
+    return project_path.parent / f".__p2r_sync_{project_path.name}.json"
+
+
+def load_state(project_path: Path) -> dict[str, Any]:
+    try:
+        with open(state_path(project_path)) as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return {}
+    return state if state.get("version") == STATE_VERSION else {}
+
+
+def base_state(state: dict[str, Any], pyproject: dict[str, Any]) -> dict[str, Any]:
+    """
+    The state to patch the document of pyproject from: the synced one if the
+    document is still as sync left it.
+
+    Otherwise (edited by hand, checked out, or not the project the state was
+    saved for), every entry is brought up to date, and only which
+    requirements came from tool.poetry is kept, so that the ones removed from
+    it are removed and the ones added by hand are kept.
+    """
+    synced = state.get("synced", {})
+    if state.get("document_hash") == document_hash(pyproject):
+        return synced
+    return {
+        group: {name: [] for name in synced.get(group, {})}
+        for group in ["dependencies", "dev-dependencies"]
+    }
+
+
+def load_synced(project_path: Path) -> Optional[dict[str, Any]]:
+    # the base state of a project brought in sync by sync, or None
+    state = load_state(project_path)
+    if "synced" not in state:
+        return None
+    with open(project_path / "pyproject.toml", "rb") as f:
+        return base_state(state, tomllib.load(f))
+
+
+def save_state(project_path: Path, state: dict[str, Any]) -> None:
+    path = state_path(project_path)
+    tmp = path.with_name(f"{path.name}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+
+def target_state(project: "PoetryProject") -> dict[str, Any]:
+    """
+    What [project] and tool.rye get from the current tool.poetry.
+    """
+    from poetry2rye.constraints import format_constraint
+    from poetry2rye.convert import _convert_scripts
+    from poetry2rye.convert import read_name_email
+    from poetry2rye.project import BasicDependency
+    from poetry2rye.project import poetry_canonicalize_name
+
+    poetry = project.poetry
+
+    state: dict[str, Any] = {
+        "name": project.project_name,
+        "version": poetry["version"],
+        "description": poetry["description"],
+        "authors": [read_name_email(a) for a in poetry["authors"]] or None,
+        "maintainers": [read_name_email(m) for m in poetry.get("maintainers", [])]
+        or None,
+        "readme": poetry.get("readme"),
+        "keywords": poetry.get("keywords"),
+        "classifiers": poetry.get("classifiers"),
+        "scripts": _convert_scripts(poetry["scripts"])
+        if poetry.get("scripts")
+        else None,
+        "requires-python": None,
+        "dependencies": {},
+        "dev-dependencies": {},
+    }
+
+    urls = {
+        label: poetry[key]
+        for label, key in [
+            ("Homepage", "homepage"),
+            ("Repository", "repository"),
+            ("Documentation", "documentation"),
+        ]
+        if poetry.get(key)
+    }
+    state["urls"] = urls or None
+
+    for dep in project.dependencies:
+        if dep.is_python_dep():
+            assert isinstance(dep, BasicDependency)
+            state["requires-python"] = format_constraint(dep.version)
+        else:
+            group = "dev-dependencies" if dep.is_dev else "dependencies"
+            # (a dependency can have several constraints, for different Pythons)
+            state[group].setdefault(poetry_canonicalize_name(dep.name), []).append(
+                dep.to_str()
+            )
+
+    return state
+
+
+def _patch_requirements(
+    array: Any, old: dict[str, list[str]], new: dict[str, list[str]]
+) -> None:
+    # requirements not from tool.poetry (added by hand) are kept, and so are
+    # the ones already as in tool.poetry, with their comments
+    indices: dict[str, list[int]] = {}
+    for i, item in enumerate(array):
+        name = requirement_name(str(item))
+        if name is not None:
+            indices.setdefault(name, []).append(i)
+
+    removed = []
+    added = []
+    for name, positions in indices.items():
+        if name not in new:
+            if name in old:
+                removed.extend(positions)
+            continue
+        requirements = new[name]
+        if requirements == old.get(name) or requirements == [
+            str(array[i]) for i in positions
+        ]:
+            continue
+        # the requirements are replaced where they are, and the ones in
+        # excess removed or added at the end
+        for i, requirement in zip(positions, requirements):
+            array[i] = requirement
+        removed.extend(positions[len(requirements) :])
+        added.extend(requirements[len(positions) :])
+
+    for i in sorted(removed, reverse=True):
+        del array[i]
+    for name, requirements in new.items():
+        if name not in indices:
+            added.extend(requirements)
+    for requirement in added:
+        array.add_line(requirement)
+
+
+def _requirements_array(requirements: dict[str, list[str]]) -> Any:
+    import tomlkit
+
+    array = tomlkit.array()
+    for group in requirements.values():
+        for requirement in group:
+            array.add_line(requirement)
+    array.add_line(indent="")
+    return array
+
+
+def patch_document(doc: Any, old: dict[str, Any], new: dict[str, Any]) -> None:
+    """
+    Change only the entries of the document whose value in tool.poetry changed
+    since the old state.
+    """
+    import tomlkit
+
+    if "project" not in doc:
+        doc["project"] = tomlkit.table()
+    project = doc["project"]
+
+    for key in PROJECT_KEYS:
+        if key in old and old[key] == new[key]:
+            continue
+        # (a value already up to date keeps its formatting)
+        current = project[key].unwrap() if key in project else None
+        if current == new[key]:
+            continue
+        if new[key] is None:
+            project.pop(key, None)
+        elif key in ("authors", "maintainers"):
+            # inline tables, as written by mig
+            project[key] = tomlkit.array()
+            project[key].extend(new[key])
+        else:
+            project[key] = new[key]
+
+    if "dependencies" not in project:
+        project["dependencies"] = _requirements_array(new["dependencies"])
+    elif old.get("dependencies") != new["dependencies"]:
+        _patch_requirements(
+            project["dependencies"], old.get("dependencies", {}), new["dependencies"]
+        )
+
+    if "tool" not in doc:
+        doc["tool"] = tomlkit.table()
+    if "rye" not in doc["tool"]:
+        rye = tomlkit.table()
+        rye["managed"] = True
+        if new["dev-dependencies"]:
+            rye["dev-dependencies"] = _requirements_array(new["dev-dependencies"])
+        rye.add(tomlkit.nl())
+        doc["tool"]["rye"] = rye
+        return
+    rye = doc["tool"]["rye"]
+
+    if not new["dev-dependencies"] and not old.get("dev-dependencies"):
+        return
+    if "dev-dependencies" not in rye:
+        rye["dev-dependencies"] = _requirements_array(new["dev-dependencies"])
+    elif old.get("dev-dependencies") != new["dev-dependencies"]:
+        _patch_requirements(
+            rye["dev-dependencies"],
+            old.get("dev-dependencies", {}),
+            new["dev-dependencies"],
+        )
+
+
+def sync(project_path: Path, check: bool = False) -> bool:
+    """
+    Update [project] from tool.poetry, and return whether anything changed.
+
+    With check, nothing is written.
+    """
+    pyproject_path = project_path / "pyproject.toml"
+    if not pyproject_path.exists():
+        raise ControlledError("pyproject.toml not found")
+
+    with open(pyproject_path) as f:
+        text = f.read()
+    with timings.phase("parse.pyproject"):
+        pyproject = tomllib.loads(text)
+    if "poetry" not in pyproject.get("tool", {}):
+        raise ControlledError("this project is not managed by poetry !")
+
+    # the common case for a pre-commit hook: neither tool.poetry nor what sync
+    # wrote changed
+    state = load_state(project_path)
+    digest = poetry_hash(pyproject)
+    if state.get("poetry_hash") == digest and state.get(
+        "document_hash"
+    ) == document_hash(pyproject):
+        return False
+
+    import tomlkit
+
+    from poetry2rye.project import PoetryProject
+
+    project = PoetryProject(
+        project_path, ensure_src=False, text=text, allow_project=True
+    )
+    new = target_state(project)
+    # (patched in place: the project is not used after this)
+    doc = project.document
+    patch_document(doc, base_state(state, pyproject), new)
+    with timings.phase("render"):
+        rendered = tomlkit.dumps(doc)
+
+    changed = rendered != text
+    if check:
+        return changed
+
+    if changed:
+        write_atomic(pyproject_path, rendered)
+
+    save_state(
+        project_path,
+        {
+            "version": STATE_VERSION,
+            "poetry_hash": digest,
+            "document_hash": document_hash(tomllib.loads(rendered)),
+            "synced": new,
+        },
+    )
+    return changed
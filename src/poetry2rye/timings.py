@@ -0,0 +1,85 @@
+import json
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any
+from typing import Iterator
+from typing import Optional
+
+from poetry2rye import utils
+from poetry2rye.utils import TIMINGS_ENV
+
+
+class Timings:
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.phases: dict[str, float] = defaultdict(float)
+        self.counters: dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add_time(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.phases[name] += seconds
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += n
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "total": round(time.perf_counter() - self.start, 6),
+            "phases": {k: round(v, 6) for k, v in self.phases.items()},
+            "counters": dict(self.counters),
+        }
+
+
+# the timings of the running command, or None when they are not collected.
+# this is a global (and not a context variable) so that the copy threads see it.
+_current: Optional[Timings] = None
+
+
+def enable() -> Timings:
+    global _current
+    _current = Timings()
+    return _current
+
+
+def disable() -> Optional[Timings]:
+    global _current
+    timings, _current = _current, None
+    return timings
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    timings = _current
+    if timings is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add_time(name, time.perf_counter() - start)
+
+
+def count(name: str, n: int = 1) -> None:
+    timings = _current
+    if timings is not None:
+        timings.count(name, n)
+
+
+def emit(timings: Timings, destination: str, **extra: Any) -> None:
+    data = json.dumps({**extra, **timings.to_dict()})
+    if destination == "-":
+        print(data, file=sys.stderr)
+    else:
+        with open(destination, "a") as f:
+            f.write(data + "\n")
+
+
+def destination_from_env() -> Optional[str]:
+    return utils.destination_from_env(TIMINGS_ENV)
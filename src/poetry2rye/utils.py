@@ -1,39 +1,116 @@
+import os
 import re
+import shutil
+import tomllib
 from pathlib import Path
-from typing import Optional, Any
+from typing import TYPE_CHECKING, Iterator, Optional, Any
+
+from poetry2rye.error import ControlledError
+
+if TYPE_CHECKING:
+    from poetry2rye.ignore import Excludes
+
+
+def write_atomic(path: Path, content: str) -> None:
+    """
+    Write content to path through a temporary file renamed over it, so that
+    path is never left partially written.
+    """
+    # (a symlink is written through, like open does)
+    path = Path(os.path.realpath(path))
+    tmp = path.with_name(f"{path.name}.p2r-tmp")
+    with open(tmp, "w") as f:
+        f.write(content)
+    if path.exists():
+        shutil.copymode(path, tmp)
+    os.replace(tmp, path)
 
 
 def backup_path(project_path: Path, num: int) -> Path:
     return project_path.parent / f".__p2r_backup_{project_path.name}_{num}"
 
 
-def as_backup_path(project_path: Path, backup_path: Path) -> Optional[int]:
-    m = re.match(r"\.__p2r_backup_(.+)_(\d+)", backup_path.name)
-    if m and project_path.name == m.group(1):
-        return int(m.group(2))
+BACKUP_MODES = ["full", "journal", "archive", "store"]
+
+COPY_ENGINES = ["auto", "reflink", "hardlink", "threaded"]
+
+# the directory of the plan cache (default: $XDG_CACHE_HOME/poetry2rye)
+CACHE_DIR_ENV = "P2R_CACHE_DIR"
+# set to a file path (or "-" for stderr) to emit timings without --timings
+TIMINGS_ENV = "P2R_TIMINGS"
+# set to a file path to dump a cProfile of the whole run without --profile
+PROFILE_ENV = "P2R_PROFILE"
+# set to a file path (or "-" for stderr) to write progress events as JSON lines
+PROGRESS_ENV = "P2R_PROGRESS"
+
+
+def destination_from_env(name: str) -> Optional[str]:
+    # a file path, "-" (or "1") for stderr, and "0" (or nothing) for none
+    value = os.environ.get(name)
+    if not value or value == "0":
+        return None
+    return "-" if value == "1" else value
+
+
+# codec -> file suffix of archive backups
+ARCHIVE_CODECS = {"gz": ".tar.gz", "xz": ".tar.xz", "bz2": ".tar.bz2", "none": ".tar"}
+
+
+def archive_backup_path(project_path: Path, num: int, codec: str) -> Path:
+    path = backup_path(project_path, num)
+    return path.with_name(path.name + ARCHIVE_CODECS[codec])
+
+
+def stored_backup_path(project_path: Path, num: int) -> Optional[Path]:
+    # a backup is either a directory or an archive
+    candidates = [backup_path(project_path, num)] + [
+        archive_backup_path(project_path, num, codec) for codec in ARCHIVE_CODECS
+    ]
+    for path in candidates:
+        if os.path.lexists(path):
+            return path
     return None
 
 
-def is_not_none(x: object) -> bool:
-    return x is not None
+# a backup directory, or an archive backup with one of the known suffixes
+BACKUP_NAME = re.compile(
+    r"\.__p2r_backup_(.+)_(\d+)(?:"
+    + "|".join(re.escape(suffix) for suffix in ARCHIVE_CODECS.values())
+    + ")?"
+)
 
 
-def get_biggest_backup_num(project_path: Path) -> Optional[int]:
-    return max(
-        filter(
-            is_not_none,
-            (
-                as_backup_path(project_path, bro)
-                for bro in project_path.parent.iterdir()
-            ),
-        ),
-        default=None,
-    )
+def parse_backup_name(name: str) -> Optional[tuple[str, int]]:
+    # the project name and number of the backup with the given file name
+    m = BACKUP_NAME.fullmatch(name)
+    if m is None:
+        return None
+    return m.group(1), int(m.group(2))
 
 
-def get_next_backup_path(project_path: Path) -> Path:
-    biggest = get_biggest_backup_num(project_path)
-    return backup_path(project_path, biggest + 1 if biggest is not None else 0)
+def as_backup_path(project_path: Path, backup_path: Path) -> Optional[int]:
+    parsed = parse_backup_name(backup_path.name)
+    if parsed is not None and project_path.name == parsed[0]:
+        return parsed[1]
+    return None
+
+
+def walk_tree(
+    root: Path, exclude: Optional["Excludes"] = None
+) -> Iterator[tuple[str, os.DirEntry[str]]]:
+    # yields ("/"-separated path relative to root, entry), parents before their contents
+    stack = [(str(root), "")]
+    while stack:
+        src_dir, rel_dir = stack.pop()
+        with os.scandir(src_dir) as it:
+            for entry in it:
+                rel = f"{rel_dir}{entry.name}"
+                is_dir = entry.is_dir(follow_symlinks=False)
+                if exclude is not None and exclude.match(rel, is_dir):
+                    continue
+                yield rel, entry
+                if is_dir:
+                    stack.append((entry.path, f"{rel}/"))
 
 
 def find_other_key(dct: dict[str, Any], keys: list[str]) -> Optional[str]:
@@ -42,3 +119,32 @@ def find_other_key(dct: dict[str, Any], keys: list[str]) -> Optional[str]:
             return k
 
     return None
+
+
+def is_poetry_project(project_path: Path) -> bool:
+    if not (project_path / "pyproject.toml").exists():
+        raise ControlledError("pyproject.toml not found")
+
+    with open(project_path / "pyproject.toml", "rb") as f:
+        pyproject = tomllib.load(f)
+
+    return "poetry" in pyproject.get("tool", {})
+
+
+SIZE_UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+
+
+def parse_size(string: str) -> int:
+    m = re.fullmatch(r"(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?", string.strip(), re.IGNORECASE)
+    if m is None:
+        raise ValueError(f"invalid size: {string}")
+    return int(float(m.group(1)) * SIZE_UNITS[m.group(2).upper()])
+
+
+def format_size(size: int) -> str:
+    value = float(size)
+    for unit in ["B", "KiB", "MiB", "GiB"]:
+        if value < 1024:
+            return f"{value:.0f}{unit}" if unit == "B" else f"{value:.1f}{unit}"
+        value /= 1024
+    return f"{value:.1f}TiB"
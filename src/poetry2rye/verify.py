@@ -0,0 +1,122 @@
+import tomllib
+from pathlib import Path
+from typing import Optional
+from typing import Union
+
+from poetry.core.constraints.version.version_constraint import VersionConstraint
+
+from poetry2rye.backup import find_backup
+from poetry2rye.backup import read_backup_file
+from poetry2rye.constraints import parse_requirement
+from poetry2rye.constraints import parse_version
+from poetry2rye.constraints import parse_version_constraint
+from poetry2rye.error import ControlledError
+from poetry2rye.lock import LockedPackage
+from poetry2rye.lock import read_lock
+from poetry2rye.lock import read_lock_metadata
+from poetry2rye.project import poetry_canonicalize_name
+from poetry2rye.utils import is_poetry_project
+
+
+def project_requirements(project_path: Path, use_cache: bool = False) -> list[str]:
+    """
+    The requirements of the migrated project: those it would get, if it is
+    still managed by poetry.
+    """
+    if is_poetry_project(project_path):
+        from poetry2rye.convert import plan_migration
+
+        # (the layout of the project does not matter here)
+        plan = plan_migration(
+            project_path, ensure_src=False, translate_lock=False, use_cache=use_cache
+        )
+        return [dep.requirement for dep in plan.dependencies]
+
+    with open(project_path / "pyproject.toml", "rb") as f:
+        pyproject = tomllib.load(f)
+    rye = pyproject.get("tool", {}).get("rye", {})
+    return [
+        *pyproject.get("project", {}).get("dependencies", []),
+        *rye.get("dev-dependencies", []),
+    ]
+
+
+def project_lock(project_path: Path) -> Union[Path, str]:
+    # poetry.lock, or the one in the latest backup once it is migrated
+    lock_path = project_path / "poetry.lock"
+    if lock_path.exists():
+        return lock_path
+
+    try:
+        backup = find_backup(project_path)
+    except ControlledError:
+        backup = None
+    lock = read_backup_file(project_path, backup, "poetry.lock") if backup else None
+    if lock is None:
+        raise ControlledError(f"poetry.lock not found in {project_path} or its backup")
+    return lock.decode()
+
+
+def verify_requirement(
+    requirement: str,
+    packages: dict[str, LockedPackage],
+    python: Optional[VersionConstraint] = None,
+) -> Optional[str]:
+    """
+    Return why the locked package does not satisfy the requirement, if it does not.
+
+    python is the range of Python versions the lock is for: requirements
+    whose markers only match other versions are not checked.
+    """
+    try:
+        dep = parse_requirement(requirement)
+    except ValueError as e:
+        return f"invalid requirement {requirement!r}: {e}"
+
+    if dep.marker.is_empty():
+        return f"the markers of {requirement!r} never match"
+
+    if python is not None and not dep.python_constraint.allows_any(python):
+        return None
+
+    package = packages.get(poetry_canonicalize_name(dep.name))
+    if package is None:
+        return f"{dep.name} is not locked"
+
+    missing = set(dep.extras) - set(package.extras)
+    if missing:
+        return f"{package.name} {package.version} has no extras {sorted(missing)}"
+
+    # the version of direct references is whatever they point to
+    if dep.is_vcs() or dep.is_url() or dep.is_file() or dep.is_directory():
+        return None
+
+    if not dep.constraint.allows(parse_version(package.version)):
+        return (
+            f"{package.name} is locked at {package.version}, "
+            f"which {requirement!r} does not allow"
+        )
+
+    return None
+
+
+def verify_project(
+    project_path: Path, use_cache: bool = False
+) -> tuple[int, list[str]]:
+    """
+    Check every requirement of the project against poetry.lock, and return
+    how many were checked and the problems found.
+    """
+    lock = project_lock(project_path)
+    packages = read_lock(lock)
+    python_versions = read_lock_metadata(lock).get("python-versions")
+    python = parse_version_constraint(python_versions) if python_versions else None
+    requirements = project_requirements(project_path, use_cache=use_cache)
+
+    problems = []
+    for requirement in requirements:
+        problem = verify_requirement(requirement, packages, python)
+        if problem is not None:
+            problems.append(problem)
+
+    return len(requirements), problems
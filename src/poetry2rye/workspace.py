@@ -0,0 +1,155 @@
+import json
+import sys
+import tomllib
+from pathlib import Path
+from typing import Any
+from typing import Optional
+from typing import TextIO
+
+import tomlkit
+
+from poetry2rye.backup_index import record_backup
+from poetry2rye.batch import find_projects
+from poetry2rye.batch import matches_any
+from poetry2rye.batch import migrate_one
+from poetry2rye.batch import relative_name
+from poetry2rye.batch import run_parallel
+from poetry2rye.journal import Journal
+from poetry2rye.locking import project_lock
+from poetry2rye.project import rye_canonicalize_name
+from poetry2rye.utils import write_atomic
+
+
+def is_member(project_path: Path) -> bool:
+    # poetry projects, and the projects already migrated
+    with open(project_path / "pyproject.toml", "rb") as f:
+        pyproject = tomllib.load(f)
+    return "poetry" in pyproject.get("tool", {}) or "project" in pyproject
+
+
+def _members_array(members: list[str]) -> Any:
+    array = tomlkit.array()
+    for member in members:
+        array.add_line(member)
+    array.add_line(indent="")
+    return array
+
+
+def render_workspace_root(root: Path, members: list[str]) -> str:
+    """
+    Render the pyproject.toml of the workspace root with the given members
+    (relative to root): the existing one with the members added, or a new
+    virtual project.
+    """
+    pyproject_path = root / "pyproject.toml"
+    if pyproject_path.exists():
+        with open(pyproject_path) as f:
+            doc = tomlkit.parse(f.read())
+    else:
+        doc = tomlkit.document()
+        project = tomlkit.table()
+        project["name"] = rye_canonicalize_name(root.name)
+        project["version"] = "0.1.0"
+        project["dependencies"] = []
+        doc["project"] = project
+        rye = tomlkit.table()
+        rye["managed"] = True
+        # the root is not a package, only the workspace
+        rye["virtual"] = True
+        doc["tool"] = tomlkit.table(is_super_table=True)
+        doc["tool"]["rye"] = rye
+
+    if "tool" not in doc:
+        doc["tool"] = tomlkit.table(is_super_table=True)
+    if "rye" not in doc["tool"]:
+        doc["tool"]["rye"] = {"managed": True}
+    rye = doc["tool"]["rye"]
+    if "workspace" not in rye:
+        rye["workspace"] = tomlkit.table()
+
+    existing = [str(m) for m in rye["workspace"].get("members", [])]
+    rye["workspace"]["members"] = _members_array(
+        existing + [m for m in members if m not in existing]
+    )
+    return tomlkit.dumps(doc)
+
+
+def write_workspace_root(root: Path, members: list[str]) -> Path:
+    """
+    Write the pyproject.toml of the workspace root, and return the backup of
+    root it can be restored from (a journal holding only that file), as the
+    root is not necessarily a project migrated by this run.
+    """
+    with project_lock(root):
+        content = render_workspace_root(root, members)
+        journal = Journal.create(root)
+        journal.record_write("pyproject.toml")
+        record_backup(root, journal.path, mode="journal", source=None, options={})
+        write_atomic(root / "pyproject.toml", content)
+    return journal.path
+
+
+def migrate_workspace(
+    root: Path,
+    include: list[str],
+    exclude: list[str],
+    ignore_src: list[str],
+    virtual: list[str],
+    options: dict[str, Any],
+    check: bool = False,
+    max_workers: Optional[int] = None,
+    out: Optional[TextIO] = None,
+) -> dict[str, int]:
+    """
+    Migrate the projects under root as the members of one rye workspace
+    whose root is root.
+
+    Path dependencies between members are required by name, and the members
+    do not keep their own locks: the workspace is locked once, in root.
+    """
+    projects = list(find_projects(root, include, exclude))
+    candidates = [p for p in projects if p != root and is_member(p)]
+    workspace = {str(p.resolve()): rye_canonicalize_name(p.name) for p in candidates}
+
+    def job(project_path: Path) -> tuple[Any, ...]:
+        name = relative_name(root, project_path)
+        project_options = {
+            **options,
+            "ensure_src": not matches_any(name, ignore_src),
+            "virtual_project": matches_any(name, virtual),
+            "translate_lock": False,
+            "workspace": workspace,
+        }
+        return (migrate_one, (str(project_path), project_options, check))
+
+    records: list[dict[str, Any]] = []
+    counts = run_parallel(
+        [job(p) for p in projects if p != root], max_workers, out, records
+    )
+    # the root is migrated once its members are, as its tree holds them
+    if root in projects:
+        root_counts = run_parallel([job(root)], max_workers, out, records)
+        for key, count in root_counts.items():
+            counts[key] += count
+
+    status = {record["path"]: record["status"] for record in records}
+    # a member which failed is left out, so that the workspace does not hold
+    # a project still managed by poetry
+    members = sorted(
+        relative_name(root, p) for p in candidates if status[str(p)] != "error"
+    )
+    if check or not members or status.get(str(root)) == "error":
+        return counts
+
+    backup = write_workspace_root(root, members)
+    out = out or sys.stdout
+    record = {
+        "path": str(root),
+        "status": "ok",
+        "workspace": members,
+        "backup": str(backup),
+    }
+    out.write(json.dumps(record) + "\n")
+    out.flush()
+
+    return counts
@@ -7,6 +7,13 @@ import pytest
 from typing import Callable
 
 
+@pytest.fixture(autouse=True)
+def plan_cache_dir(tmp_path_factory: pytest.TempPathFactory, monkeypatch) -> Path:
+    path = tmp_path_factory.mktemp("plan-cache")
+    monkeypatch.setenv("P2R_CACHE_DIR", str(path))
+    return path
+
+
 @pytest.fixture
 def dirs() -> Path:
     this_file_path = Path(__file__)
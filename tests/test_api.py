@@ -0,0 +1,69 @@
+import dataclasses
+import shutil
+import tomllib
+from pathlib import Path
+
+import pytest
+
+from poetry2rye.api import execute_plan
+from poetry2rye.api import plan_migration
+from poetry2rye.api import plan_project
+from poetry2rye.project import PoetryProject
+
+
+def test_plan_project_from_text(dirs: Path) -> None:
+    text = (dirs / "p1" / "pyproject.toml").read_text()
+    lock = (dirs / "p1" / "poetry.lock").read_text()
+
+    plan = plan_project(text, name="p1", lock=lock)
+
+    assert plan == plan_migration(dirs / "p1")
+    assert plan.original == text
+    assert {dep.group for dep in plan.dependencies} == {"main", "dev"}
+    assert [op.describe() for op in plan.operations] == [
+        "write pyproject.toml",
+        "write requirements.lock",
+        "write requirements-dev.lock",
+        "remove poetry.lock",
+        "mkdir src",
+        "move p1 -> src/p1",
+    ]
+
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        plan.rendered = ""  # type: ignore[misc]
+
+
+def test_execute_plan(tmp_path: Path, dirs: Path) -> None:
+    tmp_project = tmp_path / "p1"
+    shutil.copytree(dirs / "p1", tmp_project)
+    (tmp_project / "pyproject.toml").chmod(0o640)
+
+    plan = plan_migration(tmp_project, translate_lock=False)
+    execute_plan(plan, tmp_project)
+
+    assert (tmp_project / "pyproject.toml").read_text() == plan.rendered
+    # written through a temporary file renamed over the original
+    assert (tmp_project / "pyproject.toml").stat().st_mode & 0o777 == 0o640
+    assert not list(tmp_project.glob("*.p2r-tmp"))
+    assert not (tmp_project / "poetry.lock").exists()
+    assert (tmp_project / "src" / "p1").is_dir()
+
+
+def test_plan_project_shares_document(dirs: Path) -> None:
+    text = (dirs / "p1" / "pyproject.toml").read_text()
+    project = PoetryProject.from_text(text, "p1")
+
+    plan = plan_project(project)
+
+    # rendered from a copy of the document parsed by the project, which is
+    # left as it is
+    assert plan == plan_project(project)
+    assert project.document.as_string() == text
+
+
+def test_plan_project_src_layout(dirs: Path) -> None:
+    text = (dirs / "p1" / "pyproject.toml").read_text()
+
+    plan = plan_project(text, name="p1", src_layout=True)
+
+    assert [op.describe() for op in plan.operations] == ["write pyproject.toml"]
@@ -1,4 +1,7 @@
+import json
+import stat
 import subprocess
+import sys
 from pathlib import Path
 
 import pytest
@@ -21,3 +24,436 @@ def test_backup(project_name: str, tmp_path: Path, dirs: Path, rye: str) -> None
     app_main(["get-backup", str(tmp_project.absolute()), "-y"])
 
     assert filecmp.dircmp(base_project, tmp_project).diff_files == []
+
+
+@pytest.mark.parametrize("copy_engine", ["reflink", "hardlink", "threaded"])
+def test_backup_copy_engine(copy_engine: str, tmp_path: Path, dirs: Path) -> None:
+    base_project = dirs / "p1"
+    tmp_project = tmp_path / "p1"
+
+    shutil.copytree(base_project, tmp_project)
+    (tmp_project / "link").symlink_to("README.md")
+
+    app_main(["mig", str(tmp_project), "--copy-engine", copy_engine])
+
+    backup = tmp_path / ".__p2r_backup_p1_0"
+    assert (backup / "link").is_symlink()
+    assert filecmp.dircmp(base_project, backup).diff_files == []
+
+    app_main(["get-backup", str(tmp_project), "-y"])
+
+    assert (tmp_project / "link").is_symlink()
+    assert filecmp.dircmp(base_project, tmp_project).diff_files == []
+
+
+@pytest.mark.parametrize("copy_engine", ["auto", "reflink"])
+def test_backup_copy_engine_without_fcntl(
+    copy_engine: str, tmp_path: Path, dirs: Path
+) -> None:
+    # as on Windows, where there is no fcntl
+    script = (
+        "import sys\n"
+        "from pathlib import Path\n"
+        "sys.modules['fcntl'] = None\n"
+        "from poetry2rye.copier import copy_tree\n"
+        "copy_tree(Path(sys.argv[1]), Path(sys.argv[2]), sys.argv[3])\n"
+    )
+    subprocess.run(
+        [sys.executable, "-c", script, dirs / "p1", tmp_path / "p1", copy_engine],
+        check=True,
+    )
+
+    assert filecmp.dircmp(dirs / "p1", tmp_path / "p1").diff_files == []
+
+
+@pytest.mark.parametrize(("project_name",), [("p1",), ("p2",)])
+def test_backup_journal(project_name: str, tmp_path: Path, dirs: Path) -> None:
+    base_project = dirs / project_name
+    tmp_project = tmp_path / project_name
+
+    shutil.copytree(base_project, tmp_project)
+
+    app_main(["mig", str(tmp_project), "--backup-mode", "journal"])
+
+    backup = tmp_path / f".__p2r_backup_{project_name}_0"
+    assert not (backup / "README.md").exists()
+
+    app_main(["get-backup", str(tmp_project), "-y"])
+
+    result = filecmp.dircmp(base_project, tmp_project)
+    assert result.diff_files == []
+    assert result.left_only == result.right_only == []
+
+
+def test_backup_retention(
+    tmp_path: Path, dirs: Path, capsys: pytest.CaptureFixture
+) -> None:
+    tmp_project = tmp_path / "p1"
+
+    shutil.copytree(dirs / "p1", tmp_project)
+
+    for _ in range(3):
+        app_main(["mig", str(tmp_project), "--keep-last", "2"])
+        app_main(["get-backup", str(tmp_project), "-y"])
+
+    assert not (tmp_path / ".__p2r_backup_p1_0").exists()
+    assert (tmp_path / ".__p2r_backup_p1_1").exists()
+    assert (tmp_path / ".__p2r_backup_p1_2").exists()
+
+    capsys.readouterr()
+    app_main(["list-backups", str(tmp_project), "--json"])
+    records = json.loads(capsys.readouterr().out)
+    assert [record["number"] for record in records] == [1, 2]
+    assert records[0]["mode"] == "full"
+    assert records[0]["size"] > 0
+    assert records[0]["source_hash"] == records[1]["source_hash"]
+
+
+@pytest.mark.parametrize("codec", ["gz", "xz"])
+def test_backup_archive(codec: str, tmp_path: Path, dirs: Path) -> None:
+    base_project = dirs / "p1"
+    tmp_project = tmp_path / "p1"
+
+    shutil.copytree(base_project, tmp_project)
+    (tmp_project / "link").symlink_to("README.md")
+    modes = {"README.md": 0o664, "p1/main.py": 0o4755}
+    for rel, mode in modes.items():
+        (tmp_project / rel).chmod(mode)
+
+    app_main(
+        ["mig", str(tmp_project), "--backup-mode", "archive", "--archive-codec", codec]
+    )
+
+    assert (tmp_path / f".__p2r_backup_p1_0.tar.{codec}").is_file()
+    assert not (tmp_path / ".__p2r_backup_p1_0").exists()
+
+    app_main(["get-backup", str(tmp_project), "-y"])
+
+    assert (tmp_project / "link").is_symlink()
+    for rel, mode in modes.items():
+        assert stat.S_IMODE((tmp_project / rel).stat().st_mode) == mode
+    result = filecmp.dircmp(base_project, tmp_project)
+    assert result.diff_files == []
+    assert result.left_only == []
+    assert result.right_only == ["link"]
+
+
+def test_backup_store(tmp_path: Path, dirs: Path) -> None:
+    base_project = dirs / "p1"
+    projects = [tmp_path / "p1", tmp_path / "p1-copy"]
+
+    for tmp_project in projects:
+        shutil.copytree(base_project, tmp_project)
+    (projects[0] / "link").symlink_to("README.md")
+
+    app_main(["mig", str(projects[0]), "--backup-mode", "store"])
+    objects = list((tmp_path / ".__p2r_store" / "objects").glob("*/*"))
+
+    # the same files are stored once across projects
+    app_main(["mig", str(projects[1]), "--backup-mode", "store", "--ignore-src"])
+    assert list((tmp_path / ".__p2r_store" / "objects").glob("*/*")) == objects
+
+    (projects[0] / "new.txt").write_text("new")
+    app_main(["get-backup", str(projects[0]), "-y"])
+
+    assert (projects[0] / "link").is_symlink()
+    result = filecmp.dircmp(base_project, projects[0])
+    assert result.diff_files == []
+    assert result.left_only == []
+    assert result.right_only == ["link"]
+
+
+def test_backup_differential_restore(
+    tmp_path: Path, dirs: Path, capsys: pytest.CaptureFixture
+) -> None:
+    base_project = dirs / "p1"
+    tmp_project = tmp_path / "p1"
+
+    shutil.copytree(base_project, tmp_project)
+    app_main(["mig", str(tmp_project)])
+
+    # unchanged files are left alone
+    readme = (tmp_project / "README.md").stat()
+
+    capsys.readouterr()
+    app_main(["get-backup", str(tmp_project), "-y", "--preview"])
+    preview = capsys.readouterr().out.splitlines()
+    assert "copy pyproject.toml" in preview
+    assert "rename src/p1/main.py -> p1/main.py" in preview
+    assert "delete requirements.lock" in preview
+    assert not any("README.md" in line for line in preview)
+
+    result = filecmp.dircmp(base_project, tmp_project)
+    assert result.diff_files == []
+    assert result.left_only == result.right_only == []
+    assert (tmp_project / "README.md").stat().st_ino == readme.st_ino
+
+
+def test_backup_allocation(tmp_path: Path) -> None:
+    from concurrent.futures import ThreadPoolExecutor
+
+    from poetry2rye.backup_index import allocate_backup_path
+    from poetry2rye.utils import archive_backup_path
+
+    project = tmp_path / "p1"
+    project.mkdir()
+    # a slot held by an archive is skipped
+    archive_backup_path(project, 0, "gz").touch()
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        paths = list(executor.map(lambda _: allocate_backup_path(project), range(8)))
+
+    assert sorted(p.name for p in paths) == [
+        f".__p2r_backup_p1_{num}" for num in range(1, 9)
+    ]
+
+
+def test_backup_concurrent(tmp_path: Path, dirs: Path) -> None:
+    from concurrent.futures import ProcessPoolExecutor
+
+    from poetry2rye.convert import convert
+
+    tmp_project = tmp_path / "p1"
+    shutil.copytree(dirs / "p1", tmp_project)
+
+    # the migrations of one project wait for each other, and only the first
+    # one finds a Poetry project
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        futures = [
+            executor.submit(convert, tmp_project, ensure_src=False) for _ in range(4)
+        ]
+        errors = [f.exception() for f in futures]
+
+    assert sum(e is None for e in errors) == 1
+    app_main(["get-backup", str(tmp_project), "-y"])
+    assert filecmp.dircmp(dirs / "p1", tmp_project).diff_files == []
+    assert not (tmp_path / ".__p2r_lock_p1").exists()
+
+
+def test_project_lock(tmp_path: Path) -> None:
+    from concurrent.futures import ThreadPoolExecutor
+
+    from poetry2rye.locking import project_lock
+
+    project = tmp_path / "p"
+    counter = tmp_path / "counter"
+    counter.write_text("0")
+
+    # the lock file is removed by each holder, and must still exclude others
+    def increment(_: int) -> None:
+        with project_lock(project):
+            count = int(counter.read_text())
+            counter.write_text(str(count + 1))
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(increment, range(200)))
+
+    assert counter.read_text() == "200"
+    assert not (tmp_path / ".__p2r_lock_p").exists()
+
+
+def test_backup_resume(
+    tmp_path: Path, dirs: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    import poetry2rye.backup
+    import poetry2rye.plan
+
+    base_project = dirs / "p1"
+    tmp_project = tmp_path / "p1"
+    shutil.copytree(base_project, tmp_project)
+
+    expected = tmp_path / "expected" / "p1"
+    shutil.copytree(base_project, expected)
+    app_main(["mig", str(expected)])
+
+    def interrupted(*args, **kwargs):
+        raise KeyboardInterrupt
+
+    # interrupted while backing up: the backup is not offered
+    with monkeypatch.context() as m:
+        m.setattr(poetry2rye.backup, "copy_tree", interrupted)
+        with pytest.raises(KeyboardInterrupt):
+            app_main(["mig", str(tmp_project)])
+    assert (tmp_path / ".__p2r_backup_p1_0").is_dir()
+    with pytest.raises(SystemExit):
+        app_main(["get-backup", str(tmp_project), "-y", "-n", "0"])
+
+    # interrupted after the first operation
+    apply_operation = poetry2rye.plan._apply_operation
+    calls = []
+
+    def apply_once(*args, **kwargs):
+        if calls:
+            raise KeyboardInterrupt
+        calls.append(args)
+        apply_operation(*args, **kwargs)
+
+    with monkeypatch.context() as m:
+        m.setattr(poetry2rye.plan, "_apply_operation", apply_once)
+        with pytest.raises(KeyboardInterrupt):
+            app_main(["mig", str(tmp_project)])
+
+    # the plan is saved once, and only the progress is appended after it
+    saved = json.loads((tmp_path / ".__p2r_checkpoint_p1.json").read_text())
+    assert saved["applied"] == 0
+    progress = (tmp_path / ".__p2r_checkpoint_p1.log").read_text().splitlines()
+    assert json.loads(progress[-1]) == {"applied": 1}
+
+    app_main(["mig", str(tmp_project)])
+    assert not (tmp_path / ".__p2r_checkpoint_p1.json").exists()
+    assert not (tmp_path / ".__p2r_checkpoint_p1.log").exists()
+    assert not (tmp_path / ".__p2r_backup_p1_1").exists()
+    result = filecmp.dircmp(expected, tmp_project)
+    assert result.diff_files == []
+    assert result.left_only == result.right_only == []
+
+    app_main(["get-backup", str(tmp_project), "-y"])
+    result = filecmp.dircmp(base_project, tmp_project)
+    assert result.diff_files == []
+    assert result.left_only == result.right_only == []
+
+
+def test_backup_resume_options(
+    tmp_path: Path,
+    dirs: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    import poetry2rye.backup
+    import poetry2rye.plan
+
+    tmp_project = tmp_path / "p1"
+    shutil.copytree(dirs / "p1", tmp_project)
+
+    def interrupted(*args, **kwargs):
+        raise KeyboardInterrupt
+
+    # nothing is migrated yet: the new options are planned again
+    with monkeypatch.context() as m:
+        m.setattr(poetry2rye.backup, "copy_tree", interrupted)
+        with pytest.raises(KeyboardInterrupt):
+            app_main(["mig", str(tmp_project)])
+    app_main(["mig", str(tmp_project), "--backup-mode", "archive"])
+    assert "resuming" not in capsys.readouterr().out
+    assert not (tmp_path / ".__p2r_backup_p1_0").exists()
+    assert (tmp_path / ".__p2r_backup_p1_0.tar.gz").is_file()
+    app_main(["get-backup", str(tmp_project), "-y"])
+
+    # partly migrated: finished as started, with a warning
+    apply_operation = poetry2rye.plan._apply_operation
+    calls = []
+
+    def apply_once(*args, **kwargs):
+        if calls:
+            raise KeyboardInterrupt
+        calls.append(args)
+        apply_operation(*args, **kwargs)
+
+    with monkeypatch.context() as m:
+        m.setattr(poetry2rye.plan, "_apply_operation", apply_once)
+        with pytest.raises(KeyboardInterrupt):
+            app_main(["mig", str(tmp_project)])
+    capsys.readouterr()
+
+    app_main(["mig", str(tmp_project), "--virtual"])
+    out = capsys.readouterr().out
+    assert "resuming" in out
+    assert "Warning:" in out and "virtual_project" in out
+    assert not (tmp_path / ".__p2r_checkpoint_p1.json").exists()
+    assert "virtual = false" in (tmp_project / "pyproject.toml").read_text()
+
+
+def test_backup_progress(tmp_path: Path, dirs: Path) -> None:
+    tmp_project = tmp_path / "p1"
+    shutil.copytree(dirs / "p1", tmp_project)
+    stream = tmp_path / "progress.jsonl"
+
+    app_main(["--progress", str(stream), "mig", str(tmp_project)])
+    app_main(["--progress", str(stream), "get-backup", str(tmp_project), "-y"])
+
+    events = [json.loads(line) for line in stream.read_text().splitlines()]
+    preflight = events[0]
+    assert preflight["event"] == "preflight"
+    assert preflight["files"] > 0
+
+    backup = [e for e in events if e.get("task") == "backup"]
+    assert [backup[0]["event"], backup[-1]["event"]] == ["start", "end"]
+    assert backup[-1]["files"] == backup[-1]["files_total"] == preflight["files"]
+    assert backup[-1]["bytes"] == backup[-1]["bytes_total"] == preflight["bytes"]
+
+    restore = [e for e in events if e.get("task") == "restore"]
+    assert restore[-1]["event"] == "end"
+    assert restore[-1]["bytes"] == restore[-1]["bytes_total"] > 0
+
+
+def test_backup_disk_space(
+    tmp_path: Path,
+    dirs: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture,
+) -> None:
+    import poetry2rye.preflight
+
+    tmp_project = tmp_path / "p1"
+    shutil.copytree(dirs / "p1", tmp_project)
+
+    disk_usage = shutil.disk_usage
+    monkeypatch.setattr(
+        poetry2rye.preflight.shutil,
+        "disk_usage",
+        lambda path: disk_usage(path)._replace(free=10),
+    )
+    with pytest.raises(SystemExit):
+        app_main(["mig", str(tmp_project), "--copy-engine", "threaded"])
+    assert "not enough disk space" in capsys.readouterr().out
+
+    # nothing was started
+    assert not list(tmp_path.glob(".__p2r_backup*"))
+    assert not list(tmp_path.glob(".__p2r_checkpoint*"))
+    assert filecmp.dircmp(dirs / "p1", tmp_project).diff_files == []
+
+
+@pytest.mark.parametrize("backup_mode", ["full", "archive", "store"])
+def test_backup_exclude(backup_mode: str, tmp_path: Path, dirs: Path) -> None:
+    from poetry2rye.backup import find_backup
+    from poetry2rye.backup import read_backup_file
+
+    tmp_project = tmp_path / "p1"
+    shutil.copytree(dirs / "p1", tmp_project)
+    (tmp_project / ".gitignore").write_text("*.log\n!keep.log\ndist/\n")
+    for rel in [".venv/bin/python", "dist/p1.whl", "a.log", "keep.log", "p1/x.log"]:
+        (tmp_project / rel).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_project / rel).write_text(rel)
+
+    app_main(
+        [
+            "mig",
+            str(tmp_project),
+            "--backup-mode",
+            backup_mode,
+            "--backup-exclude",
+            ".venv",
+            "--backup-gitignore",
+        ]
+    )
+
+    backup = find_backup(tmp_project)
+    for rel in [".venv/bin/python", "dist/p1.whl", "a.log", "p1/x.log"]:
+        assert read_backup_file(tmp_project, backup, rel) is None
+    for rel in ["keep.log", ".gitignore", "pyproject.toml", "p1/main.py"]:
+        assert read_backup_file(tmp_project, backup, rel) is not None
+
+    # the excluded files are left as they are
+    (tmp_project / ".venv/bin/pip").write_text("pip")
+    app_main(["get-backup", str(tmp_project), "-y"])
+
+    assert (tmp_project / ".venv/bin/pip").read_text() == "pip"
+    assert (tmp_project / "dist/p1.whl").exists()
+    assert (tmp_project / "a.log").exists()
+    # moved back from src/p1 along with the rest of the module
+    assert (tmp_project / "p1/x.log").read_text() == "p1/x.log"
+    assert not (tmp_project / "src").exists()
+    assert not (tmp_project / "requirements.lock").exists()
+    result = filecmp.dircmp(dirs / "p1", tmp_project)
+    assert result.diff_files == []
+    assert result.left_only == []
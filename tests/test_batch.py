@@ -0,0 +1,165 @@
+import filecmp
+import json
+import shutil
+import tomllib
+from pathlib import Path
+
+import pytest
+
+from poetry2rye.main import main as app_main
+
+
+def test_mig_all(tmp_path: Path, dirs: Path, capsys: pytest.CaptureFixture) -> None:
+    root = tmp_path / "root"
+    for name in ["p0", "p1", "p2"]:
+        shutil.copytree(dirs / name, root / name)
+    shutil.copytree(dirs / "p3", root / "virtual" / "p3")
+    (root / "other").mkdir()
+    (root / "other" / "pyproject.toml").write_text("[tool.black]\n")
+
+    app_main(["mig-all", str(root), "--virtual-for", "virtual/*", "--exclude", "p2"])
+
+    records = {
+        Path(record["path"]).name: record
+        for record in map(json.loads, capsys.readouterr().out.splitlines())
+    }
+    assert records.keys() == {"p0", "p1", "p3", "other"}
+    assert records["other"]["status"] == "skipped"
+    for name in ["p0", "p1", "p3"]:
+        assert records[name]["status"] == "ok"
+
+    for project in [root / "p0", root / "p1", root / "virtual" / "p3"]:
+        expected = dirs / f"mig-{project.name}" / "pyproject.toml"
+        assert filecmp.cmp(expected, project / "pyproject.toml", shallow=False)
+
+    assert (root / "p2" / "p2").exists()
+
+    app_main(["get-backup", str(root), "--all", "-y"])
+
+    for name in ["p0", "p1"]:
+        assert filecmp.dircmp(dirs / name, root / name).diff_files == []
+    assert filecmp.dircmp(dirs / "p3", root / "virtual" / "p3").diff_files == []
+
+
+def test_get_backup_all_names(tmp_path: Path, dirs: Path) -> None:
+    root = tmp_path / "root"
+    # names which hold ".tar", next to archive backups
+    for name, mode in [("foo.tar.utils", "archive"), ("tarball-x", "full")]:
+        shutil.copytree(dirs / "p1", root / name)
+        app_main(["mig", str(root / name), "--ignore-src", "--backup-mode", mode])
+    # the backups are found by their names (as made before the backup index)
+    for index in root.glob(".__p2r_backups_*.json"):
+        index.unlink()
+
+    app_main(["get-backup", str(root), "--all", "-y"])
+
+    for name in ["foo.tar.utils", "tarball-x"]:
+        assert filecmp.dircmp(dirs / "p1", root / name).diff_files == []
+
+
+def _poetry_project(path: Path, name: str, dependencies: str = "") -> None:
+    (path / name).mkdir(parents=True)
+    (path / name / "__init__.py").touch()
+    (path / "pyproject.toml").write_text(
+        f"""[tool.poetry]
+name = "{name}"
+version = "0.1.0"
+description = ""
+authors = []
+
+[tool.poetry.dependencies]
+python = "^3.12"
+{dependencies}
+
+[build-system]
+requires = ["poetry-core"]
+build-backend = "poetry.core.masonry.api"
+"""
+    )
+    (path / "poetry.lock").write_text("# poetry lock\n")
+
+
+def test_mig_all_workspace(tmp_path: Path, capsys: pytest.CaptureFixture) -> None:
+    root = tmp_path / "root"
+    _poetry_project(root / "core", "core")
+    _poetry_project(
+        root / "app", "app", 'core = { path = "../core", develop = true }\n'
+    )
+
+    app_main(["mig-all", str(root), "--workspace"])
+
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert records[-1] == {
+        "path": str(root),
+        "status": "ok",
+        "workspace": ["app", "core"],
+        "backup": str(tmp_path / ".__p2r_backup_root_0"),
+    }
+
+    app_pyproject = (root / "app" / "pyproject.toml").read_text()
+    assert '"core"' in app_pyproject
+    assert "file://" not in app_pyproject
+
+    root_pyproject = tomllib.loads((root / "pyproject.toml").read_text())
+    assert root_pyproject["tool"]["rye"]["virtual"] is True
+    assert root_pyproject["tool"]["rye"]["workspace"]["members"] == ["app", "core"]
+
+    for name in ["app", "core"]:
+        assert not (root / name / "poetry.lock").exists()
+        assert not (root / name / "requirements.lock").exists()
+
+    # the root written for the workspace has a backup, which removes it again
+    app_main(["get-backup", str(root), "-y"])
+    assert not (root / "pyproject.toml").exists()
+    assert (root / "app" / "pyproject.toml").read_text() == app_pyproject
+
+
+def test_mig_all_workspace_existing_root(tmp_path: Path) -> None:
+    root = tmp_path / "root"
+    _poetry_project(root / "core", "core")
+    # not a poetry project, so not migrated (nor backed up) by mig-all
+    original = "[tool.black]\nline-length = 100\n"
+    (root / "pyproject.toml").write_text(original)
+
+    app_main(["mig-all", str(root), "--workspace"])
+
+    pyproject = tomllib.loads((root / "pyproject.toml").read_text())
+    assert pyproject["tool"]["rye"]["workspace"]["members"] == ["core"]
+
+    app_main(["get-backup", str(root), "-y"])
+    assert (root / "pyproject.toml").read_text() == original
+
+
+def test_mig_path_dependency(tmp_path: Path) -> None:
+    _poetry_project(tmp_path / "core", "core")
+    _poetry_project(tmp_path / "app", "app", 'core = { path = "../core" }\n')
+
+    app_main(["mig", str(tmp_path / "app")])
+
+    pyproject = tomllib.loads((tmp_path / "app" / "pyproject.toml").read_text())
+    assert "core @ file:///${PROJECT_ROOT}/../core" in (
+        pyproject["project"]["dependencies"]
+    )
+
+
+def test_mig_all_workspace_root_project(
+    tmp_path: Path, capsys: pytest.CaptureFixture
+) -> None:
+    root = tmp_path / "root"
+    _poetry_project(root / "core", "core")
+    _poetry_project(root / "broken", "broken", 'bad = { url = "https://x" }\n')
+    _poetry_project(root, "root", 'core = { path = "core" }\n')
+
+    with pytest.raises(SystemExit):
+        app_main(["mig-all", str(root), "--workspace"])
+
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    # the root is migrated last, after its members
+    assert [record["status"] for record in records[-2:]] == ["ok", "ok"]
+    assert records[-2]["path"] == str(root)
+    assert {r["path"]: r["status"] for r in records}[str(root / "broken")] == "error"
+
+    pyproject = tomllib.loads((root / "pyproject.toml").read_text())
+    assert "core" in pyproject["project"]["dependencies"]
+    # the member which failed to migrate is left out
+    assert pyproject["tool"]["rye"]["workspace"]["members"] == ["core"]
@@ -0,0 +1,128 @@
+import dataclasses
+import filecmp
+import json
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+
+from poetry2rye.api import plan_migration
+from poetry2rye.main import main as app_main
+
+
+@pytest.mark.parametrize("option", ["--check", "--diff"])
+def test_check_does_not_write(
+    option: str,
+    tmp_path: Path,
+    dirs: Path,
+    plan_cache_dir: Path,
+    capsys: pytest.CaptureFixture,
+) -> None:
+    tmp_project = tmp_path / "p1"
+
+    shutil.copytree(dirs / "p1", tmp_project)
+
+    if option == "--check":
+        with pytest.raises(SystemExit) as e:
+            app_main(["mig", str(tmp_project), option])
+        assert e.value.code == 1
+    else:
+        app_main(["mig", str(tmp_project), option])
+
+    result = filecmp.dircmp(dirs / "p1", tmp_project)
+    assert result.diff_files == result.left_only == result.right_only == []
+    assert [p.name for p in tmp_path.iterdir()] == ["p1"]
+    assert not list(plan_cache_dir.iterdir())
+
+    out = capsys.readouterr().out
+    if option == "--diff":
+        assert "+[project]\n" in out
+        assert "write requirements.lock\n" in out
+        assert "remove poetry.lock\n" in out
+        assert "move p1 -> src/p1\n" in out
+
+
+def test_check_migrated(tmp_path: Path, dirs: Path) -> None:
+    tmp_project = tmp_path / "p1"
+
+    shutil.copytree(dirs / "p1", tmp_project)
+    app_main(["mig", str(tmp_project)])
+
+    app_main(["mig", str(tmp_project), "--check"])
+
+
+def test_mig_all_check(tmp_path: Path, dirs: Path) -> None:
+    root = tmp_path / "root"
+    shutil.copytree(dirs / "p0", root / "p0")
+    shutil.copytree(dirs / "mig-p1", root / "p1")
+
+    with pytest.raises(SystemExit) as e:
+        app_main(["mig-all", str(root), "--check"])
+    assert e.value.code == 1
+
+    assert filecmp.cmp(dirs / "p0" / "pyproject.toml", root / "p0" / "pyproject.toml")
+
+    app_main(["mig-all", str(root), "--check", "--exclude", "p0"])
+
+
+def test_check_plan_cache(
+    tmp_path: Path, dirs: Path, plan_cache_dir: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    tmp_project = tmp_path / "p1"
+
+    shutil.copytree(dirs / "p1", tmp_project)
+
+    # checks write nothing, not even to the cache
+    with pytest.raises(SystemExit):
+        app_main(["mig", str(tmp_project), "--check"])
+    assert not list(plan_cache_dir.glob("*/*.json"))
+
+    plan_migration(tmp_project, use_cache=True)
+    (entry,) = plan_cache_dir.glob("*/*.json")
+    os.utime(entry, (0, 0))
+
+    def fail(*args, **kwargs):
+        raise AssertionError("the project was parsed")
+
+    monkeypatch.setattr("poetry2rye.convert.PoetryProject", fail)
+
+    # an unchanged project is not planned again, nor its entry touched
+    with pytest.raises(SystemExit):
+        app_main(["mig", str(tmp_project), "--check"])
+    assert entry.stat().st_mtime == 0
+
+    # an entry which cannot be touched is still used
+    def deny(*args, **kwargs):
+        raise PermissionError("read-only")
+
+    monkeypatch.setattr(os, "utime", deny)
+    assert plan_migration(tmp_project, use_cache=True) is not None
+
+    with pytest.raises(AssertionError):
+        app_main(["mig", str(tmp_project), "--check", "--no-cache"])
+
+
+def test_plan_cache_eviction(
+    tmp_path: Path, dirs: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    from poetry2rye.cache import PlanCache
+
+    plan = plan_migration(dirs / "p1")
+    evictions = []
+    evict = PlanCache.evict
+    monkeypatch.setattr(
+        PlanCache, "evict", lambda self: evictions.append(1) or evict(self)
+    )
+
+    # the cache is only read through when it grows over its size
+    size = len(json.dumps(dataclasses.asdict(plan)))
+    cache = PlanCache(tmp_path / "cache", max_bytes=4 * size)
+    for key in ["a0", "b0", "c0"]:
+        cache.put(key, plan)
+    assert not evictions
+
+    small = PlanCache(tmp_path / "small", max_bytes=1)
+    small.put("a0", plan)
+    assert evictions
+    assert not list((tmp_path / "small").glob("*/*.json"))
@@ -0,0 +1,32 @@
+import shutil
+from pathlib import Path
+
+from poetry2rye.constraints import clear_caches
+from poetry2rye.constraints import parse_version_constraint
+from poetry2rye.project import PoetryProject
+
+
+def test_dependencies_cached(tmp_path: Path, dirs: Path) -> None:
+    project = PoetryProject(dirs / "p1")
+
+    assert project.dependencies is project.dependencies
+    assert [dep.to_str() for dep in project.dependencies] == [
+        "python>=3.12,<4.0",
+        "numpy>=2.0.0,<3.0.0",
+        "sortedcontainers==2.4.0",
+        "pyproject-parser @ git+https://github.com/repo-helper/pyproject-parser",
+        "typing-extensions>=4.12.2,<5.0.0",
+    ]
+
+
+def test_constraint_cache_shared(tmp_path: Path, dirs: Path) -> None:
+    clear_caches()
+
+    for name in ["a", "b"]:
+        shutil.copytree(dirs / "p1", tmp_path / name)
+        shutil.move(tmp_path / name / "p1", tmp_path / name / name)
+        assert PoetryProject(tmp_path / name).dependencies
+
+    info = parse_version_constraint.cache_info()
+    assert info.misses == 4
+    assert info.hits == 4
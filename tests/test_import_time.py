@@ -0,0 +1,135 @@
+import json
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+# the dependencies only needed to read and write pyproject.toml and poetry.lock
+HEAVY_MODULES = {"tomlkit", "poetry.core", "slugify", "text_unidecode"}
+# only needed to make, restore or look up backups
+BACKUP_MODULES = {
+    "poetry2rye.backup",
+    "poetry2rye.copier",
+    "poetry2rye.progress",
+    "poetry2rye.timings",
+    "tarfile",
+    "concurrent.futures",
+    "multiprocessing",
+}
+
+# only needed by the subcommands other than mig, or by archive backups
+MIG_LAZY_MODULES = {
+    "poetry2rye.batch",
+    "poetry2rye.workspace",
+    "poetry2rye.serve",
+    "poetry2rye.verify",
+    "tarfile",
+}
+
+# (subcommand, budget for the total import time in milliseconds)
+IMPORT_BUDGETS = [
+    (["get-backup"], 250),
+    (["mig-all"], 400),
+    (["mig"], 600),
+]
+# the budgets are exceeded only by this factor, as import times depend on the
+# machine and its load
+BUDGET_MARGIN = 2.0
+
+# (subcommand, the modules it must not import)
+IMPORTS = [
+    (["get-backup"], HEAVY_MODULES),
+    (["list-backups"], HEAVY_MODULES),
+    (["mig-all"], HEAVY_MODULES),
+]
+
+
+def imported_modules(args: list[str]) -> set[str]:
+    script = (
+        "import atexit, json, sys\n"
+        "atexit.register(lambda: print(json.dumps(sorted(sys.modules))))\n"
+        "from poetry2rye.main import main\n"
+        "main(sys.argv[1:])\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script, *args],
+        capture_output=True,
+        text=True,
+    )
+    return set(json.loads(result.stdout.splitlines()[-1]))
+
+
+def import_time_ms(args: list[str]) -> float:
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            "import sys; from poetry2rye.main import main; main(sys.argv[1:])",
+            *args,
+        ],
+        capture_output=True,
+        text=True,
+    )
+
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, _, _ = line.removeprefix("import time:").split("|")
+        total_us += int(self_us)
+
+    return total_us / 1000
+
+
+def matching(modules: set[str], names: set[str]) -> set[str]:
+    return {
+        module
+        for module in modules
+        if any(module == name or module.startswith(f"{name}.") for name in names)
+    }
+
+
+@pytest.mark.parametrize("subcommand,forbidden", IMPORTS)
+def test_imports(subcommand: list[str], forbidden: set[str], tmp_path: Path) -> None:
+    # an empty directory makes every subcommand fail early, after its imports
+    modules = imported_modules([*subcommand, str(tmp_path)])
+
+    assert "poetry2rye.main" in modules
+    assert matching(modules, forbidden) == set()
+
+
+def test_imports_parser() -> None:
+    # without a subcommand only the arguments are parsed
+    modules = imported_modules([])
+
+    assert "poetry2rye.main" in modules
+    assert matching(modules, HEAVY_MODULES | BACKUP_MODULES) == set()
+
+
+def test_imports_mig(tmp_path: Path, dirs: Path) -> None:
+    tmp_project = tmp_path / "p1"
+    shutil.copytree(dirs / "p1", tmp_project)
+
+    modules = imported_modules(["mig", str(tmp_project)])
+
+    assert matching(modules, HEAVY_MODULES)
+    assert matching(modules, MIG_LAZY_MODULES) == set()
+
+    # and imported once used
+    shutil.rmtree(tmp_project)
+    shutil.copytree(dirs / "p1", tmp_project)
+    modules = imported_modules(["mig", str(tmp_project), "--backup-mode", "archive"])
+
+    assert "tarfile" in modules
+
+
+@pytest.mark.parametrize("subcommand,budget_ms", IMPORT_BUDGETS)
+def test_import_time(subcommand: list[str], budget_ms: int, tmp_path: Path) -> None:
+    # (the fastest of a few runs, so that a busy machine does not fail it)
+    total_ms = min(import_time_ms([*subcommand, str(tmp_path)]) for _ in range(3))
+
+    assert total_ms < budget_ms * BUDGET_MARGIN
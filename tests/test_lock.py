@@ -0,0 +1,204 @@
+import re
+import shutil
+from pathlib import Path
+
+import pytest
+
+from poetry2rye.api import plan_project
+from poetry2rye.main import main as app_main
+
+
+def read_requirements_str(content: str) -> str:
+    # hashes are not generated by rye in the test projects
+    content = re.sub(r" \\\n    --hash=\S+", "", content)
+    return "".join(
+        line for line in content.splitlines(True) if line.strip() and line[0] != "#"
+    )
+
+
+def read_requirements(path: Path) -> str:
+    return read_requirements_str(path.read_text())
+
+
+@pytest.mark.parametrize("project_name", ["p1", "p2"])
+def test_lock_translation(project_name: str, tmp_path: Path, dirs: Path) -> None:
+    tmp_project = tmp_path / project_name
+    mig_project = dirs / f"mig-{project_name}"
+
+    shutil.copytree(dirs / project_name, tmp_project)
+
+    app_main(["mig", str(tmp_project)])
+
+    assert not (tmp_project / "poetry.lock").exists()
+    assert read_requirements(tmp_project / "requirements.lock") == read_requirements(
+        mig_project / "requirements.lock"
+    )
+
+
+def test_lock_translation_hashes(tmp_path: Path, dirs: Path) -> None:
+    tmp_project = tmp_path / "p1"
+
+    shutil.copytree(dirs / "p1", tmp_project)
+
+    app_main(["mig", str(tmp_project)])
+
+    content = (tmp_project / "requirements-dev.lock").read_text()
+    assert "#   generate-hashes: true\n" in content
+    assert (
+        "typing-extensions==4.12.2 \\\n"
+        "    --hash=sha256:04e5ca0351e0f3f85c6853954072df659d0d13fac324d0072316b67d7794700d \\\n"
+        "    --hash=sha256:1a7ead55c7e559dd4dee8856e3a88b41225abfe1ce8df57b7c13915fe121ffb8\n"
+    ) in content
+
+
+def test_drop_lock(tmp_path: Path, dirs: Path) -> None:
+    tmp_project = tmp_path / "p1"
+
+    shutil.copytree(dirs / "p1", tmp_project)
+
+    app_main(["mig", str(tmp_project), "--drop-lock"])
+
+    assert not (tmp_project / "poetry.lock").exists()
+    assert not (tmp_project / "requirements.lock").exists()
+
+
+PYPROJECT = """[tool.poetry]
+name = "app"
+version = "0.1.0"
+description = ""
+authors = []
+
+[tool.poetry.dependencies]
+python = "^3.10"
+foo = { version = "^1.0", python = "<3.12", extras = ["all"] }
+"""
+
+LOCK = """[[package]]
+name = "foo"
+version = "1.0"
+optional = false
+python-versions = "*"
+files = []
+
+[package.dependencies]
+bar = { version = ">=1", optional = true, extras = ["x"] }
+
+[package.extras]
+all = ["foo[more]"]
+more = ["Bar[x] (>=1)"]
+
+[[package]]
+name = "bar"
+version = "1.1"
+optional = true
+python-versions = "*"
+files = []
+
+[package.dependencies]
+baz = { version = "*", markers = "sys_platform == \\"win32\\"" }
+qux = { version = "*", optional = true }
+
+[package.extras]
+x = ["qux"]
+
+[[package]]
+name = "baz"
+version = "2.0"
+optional = true
+python-versions = "*"
+files = []
+
+[[package]]
+name = "qux"
+version = "3.0"
+optional = true
+python-versions = "*"
+files = []
+
+[metadata]
+lock-version = "2.0"
+python-versions = "^3.10"
+content-hash = ""
+"""
+
+
+def test_lock_translation_markers_and_extras() -> None:
+    plan = plan_project(PYPROJECT, name="app", ensure_src=False, lock=LOCK)
+    (content,) = [
+        op.content for op in plan.operations if op.path == "requirements.lock"
+    ]
+
+    # the extras of foo pull in bar (with its own extra x), and the python
+    # constraint of foo is carried down to everything it requires
+    assert read_requirements_str(content) == (
+        "-e file:.\n"
+        "bar==1.1 ; python_version <'3.12'\n"
+        "    # via foo\n"
+        "baz==2.0 ; (python_version <'3.12') and (sys_platform == \"win32\")\n"
+        "    # via bar\n"
+        "foo==1.0 ; python_version <'3.12'\n"
+        "    # via app\n"
+        "qux==3.0 ; python_version <'3.12'\n"
+        "    # via bar\n"
+    )
+
+
+GIT_PYPROJECT = """[tool.poetry]
+name = "app"
+version = "0.1.0"
+description = ""
+authors = []
+
+[tool.poetry.dependencies]
+python = "^3.10"
+gitpkg = { git = "https://example.com/gitpkg.git", extras = ["fast"] }
+"""
+
+GIT_LOCK = """[[package]]
+name = "gitpkg"
+version = "0.3.0"
+optional = false
+python-versions = "*"
+files = []
+develop = false
+
+[package.dependencies]
+speedup = { version = ">=1", optional = true }
+
+[package.extras]
+fast = ["speedup (>=1)"]
+
+[package.source]
+type = "git"
+url = "https://example.com/gitpkg.git"
+reference = "HEAD"
+resolved_reference = "0123abcd"
+
+[[package]]
+name = "speedup"
+version = "1.2"
+optional = true
+python-versions = "*"
+files = []
+
+[metadata]
+lock-version = "2.0"
+python-versions = "^3.10"
+content-hash = ""
+"""
+
+
+def test_lock_translation_git_extras() -> None:
+    plan = plan_project(GIT_PYPROJECT, name="app", ensure_src=False, lock=GIT_LOCK)
+    (content,) = [
+        op.content for op in plan.operations if op.path == "requirements.lock"
+    ]
+
+    # the extras of git dependencies pull in their optional dependencies too
+    assert read_requirements_str(content) == (
+        "-e file:.\n"
+        "gitpkg @ git+https://example.com/gitpkg.git@0123abcd\n"
+        "    # via app\n"
+        "speedup==1.2\n"
+        "    # via gitpkg\n"
+    )
@@ -0,0 +1,103 @@
+import tomllib
+from pathlib import Path
+
+from poetry2rye.convert import plan_migration
+from poetry2rye.pathindex import PathIndex
+
+PYPROJECT = """\
+[tool.poetry]
+name = "proj"
+version = "0.1.0"
+description = ""
+authors = ["A <a@b.c>"]
+packages = [
+    { include = "pkg_*", from = "lib" },
+    { include = "other", from = "lib", format = "sdist" },
+    { include = "extra", to = "vendor" },
+    { include = "gen_*", from = "lib" },
+]
+include = [
+    { path = "data/**/*.json", format = ["sdist", "wheel"] },
+    "CHANGELOG.md",
+    "build/*.so",
+]
+exclude = ["lib/pkg_a/secret.py"]
+
+[tool.poetry.dependencies]
+python = "^3.11"
+"""
+
+
+def test_packages(tmp_path: Path) -> None:
+    project = tmp_path / "proj"
+    for path in [
+        "lib/pkg_a/__init__.py",
+        "lib/pkg_b/__init__.py",
+        "lib/other/__init__.py",
+        "extra/__init__.py",
+        "data/a.json",
+        "data/nested/b.json",
+        "data/c.txt",
+        "CHANGELOG.md",
+    ]:
+        (project / path).parent.mkdir(parents=True, exist_ok=True)
+        (project / path).touch()
+    (project / "pyproject.toml").write_text(PYPROJECT)
+
+    plan = plan_migration(project, ensure_src=False)
+    build = tomllib.loads(plan.rendered)["tool"]["hatch"]["build"]
+
+    assert build["exclude"] == ["lib/pkg_a/secret.py"]
+    assert build["targets"]["wheel"] == {
+        "packages": ["lib/pkg_a", "lib/pkg_b"],
+        "force-include": {
+            "extra": "vendor/extra",
+            "data/a.json": "data/a.json",
+            "data/nested/b.json": "data/nested/b.json",
+        },
+    }
+    # (generated files, which may be ignored by git, are still in the sdist)
+    assert build["targets"]["sdist"] == {
+        "force-include": {
+            "data/a.json": "data/a.json",
+            "data/nested/b.json": "data/nested/b.json",
+            "CHANGELOG.md": "CHANGELOG.md",
+        },
+    }
+
+    # hatch takes no globs, nor missing paths
+    assert "'lib/gen_*' matches no path, so it is left out" in plan.warnings
+    assert "'build/*.so' matches no path, so it is left out" in plan.warnings
+
+
+def test_packages_not_cached(tmp_path: Path, plan_cache_dir: Path) -> None:
+    project = tmp_path / "proj"
+    (project / "mods" / "a").mkdir(parents=True)
+    (project / "pyproject.toml").write_text(
+        PYPROJECT.replace(
+            '{ include = "pkg_*", from = "lib" }', '{ include = "mods/*" }'
+        )
+    )
+
+    def packages() -> list[str]:
+        plan = plan_migration(project, ensure_src=False, use_cache=True)
+        build = tomllib.loads(plan.rendered)["tool"]["hatch"]["build"]
+        return build["targets"]["wheel"]["packages"]
+
+    assert packages() == ["mods/a"]
+    (project / "mods" / "b").mkdir()
+    # the paths found by the globs are not taken from the cache
+    assert packages() == ["mods/a", "mods/b"]
+    assert not list(plan_cache_dir.glob("*/*.json"))
+
+
+def test_path_index_glob() -> None:
+    index = PathIndex(
+        ["a", "a/b.py", "a/c", "a/c/d.py", "b", "b/e.py"], {"a", "a/c", "b"}
+    )
+
+    assert index.glob("a/*.py") == ["a/b.py"]
+    assert index.glob("a/**/*.py") == ["a/b.py", "a/c/d.py"]
+    assert index.glob("*/e.py") == ["b/e.py"]
+    assert index.glob("a/c") == ["a/c"]
+    assert index.glob("x/*") == []
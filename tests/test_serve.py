@@ -0,0 +1,86 @@
+import io
+import json
+import shutil
+import socket
+import threading
+from pathlib import Path
+
+import pytest
+
+from poetry2rye.main import main as app_main
+
+
+def test_serve_stdio(
+    tmp_path: Path,
+    dirs: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture,
+) -> None:
+    tmp_project = tmp_path / "p1"
+    shutil.copytree(dirs / "p1", tmp_project)
+
+    requests = [
+        {
+            "jsonrpc": "2.0",
+            "id": 1,
+            "method": "check",
+            "params": {"path": str(tmp_project)},
+        },
+        {"jsonrpc": "2.0", "id": 2, "method": "unknown", "params": {}},
+        {
+            "jsonrpc": "2.0",
+            "id": 3,
+            "method": "mig",
+            "params": {"path": str(tmp_project), "colour": 1},
+        },
+    ]
+    lines = "".join(json.dumps(request) + "\n" for request in requests) + "{\n"
+    monkeypatch.setattr("sys.stdin", io.StringIO(lines))
+
+    app_main(["serve", "-j", "1"])
+
+    responses = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    by_id = {response["id"]: response for response in responses}
+
+    assert by_id[1]["result"]["status"] == "ok"
+    assert by_id[1]["result"]["changed"]
+    assert by_id[2]["error"]["code"] == -32601
+    assert by_id[3]["error"]["code"] == -32602
+    assert by_id[None]["error"]["code"] == -32700
+
+
+def test_serve_socket(tmp_path: Path, dirs: Path) -> None:
+    tmp_project = tmp_path / "p1"
+    shutil.copytree(dirs / "p1", tmp_project)
+    socket_path = tmp_path / "p2r.sock"
+
+    thread = threading.Thread(
+        target=app_main, args=(["serve", "--socket", str(socket_path), "-j", "2"],)
+    )
+    thread.start()
+
+    try:
+        for _ in range(100):
+            if socket_path.exists():
+                break
+            threading.Event().wait(0.05)
+
+        with socket.socket(socket.AF_UNIX) as client:
+            client.connect(str(socket_path))
+            f = client.makefile("rw")
+            for request in [
+                {"id": 1, "method": "mig", "params": {"path": str(tmp_project)}},
+                {"id": 2, "method": "shutdown"},
+            ]:
+                f.write(json.dumps({"jsonrpc": "2.0", **request}) + "\n")
+            f.flush()
+            responses = {
+                response["id"]: response
+                for response in (json.loads(line) for line in f)
+            }
+    finally:
+        thread.join(timeout=30)
+
+    assert responses[1]["result"]["status"] == "ok"
+    assert (tmp_path / ".__p2r_backup_p1_0").exists()
+    assert not socket_path.exists()
@@ -0,0 +1,140 @@
+import shutil
+import tomllib
+from pathlib import Path
+
+import pytest
+
+from poetry2rye.main import main as app_main
+
+
+def test_sync(tmp_path: Path, dirs: Path) -> None:
+    tmp_project = tmp_path / "p1"
+    shutil.copytree(dirs / "p1", tmp_project)
+    pyproject = tmp_project / "pyproject.toml"
+
+    app_main(["sync", str(tmp_project)])
+    first = pyproject.read_text()
+    assert '    "numpy>=2.0.0,<3.0.0",\n' in first
+    assert "[tool.poetry]" in first
+
+    # edits of [project] not coming from tool.poetry are kept
+    pyproject.write_text(
+        first.replace(
+            '    "sortedcontainers==2.4.0",\n',
+            '    "sortedcontainers==2.4.0",  # pinned\n    "rich",\n',
+        )
+        .replace('numpy = "^2.0.0"', 'numpy = "^2.1.0"')
+        .replace('version = "0.1.0"', 'version = "0.2.0"', 1)
+    )
+
+    app_main(["sync", str(tmp_project)])
+    second = pyproject.read_text()
+    assert '    "numpy>=2.1.0,<3.0.0",\n' in second
+    assert '    "sortedcontainers==2.4.0",  # pinned\n    "rich",\n' in second
+    assert second.count('version = "0.2.0"') == 2
+
+    # tool.poetry did not change, so nothing is done
+    app_main(["sync", str(tmp_project), "--check"])
+    assert pyproject.read_text() == second
+
+
+def test_sync_removed_dependency(tmp_path: Path, dirs: Path) -> None:
+    tmp_project = tmp_path / "p1"
+    shutil.copytree(dirs / "p1", tmp_project)
+    pyproject = tmp_project / "pyproject.toml"
+
+    app_main(["sync", str(tmp_project)])
+    pyproject.write_text(
+        pyproject.read_text().replace('sortedcontainers = "2.4.0"\n', "")
+    )
+
+    with pytest.raises(SystemExit) as e:
+        app_main(["sync", str(tmp_project), "--check"])
+    assert e.value.code == 1
+
+    app_main(["sync", str(tmp_project)])
+    assert "sortedcontainers" not in pyproject.read_text()
+
+
+def test_sync_multiple_constraints(tmp_path: Path, dirs: Path) -> None:
+    tmp_project = tmp_path / "p1"
+    shutil.copytree(dirs / "p1", tmp_project)
+    pyproject = tmp_project / "pyproject.toml"
+    pyproject.write_text(
+        pyproject.read_text().replace(
+            'numpy = "^2.0.0"',
+            'numpy = [\n    { version = "^1.26", python = "<3.13" },\n'
+            '    { version = "^2.0.0", python = ">=3.13" },\n]',
+        )
+    )
+
+    app_main(["sync", str(tmp_project)])
+
+    dependencies = tomllib.loads(pyproject.read_text())["project"]["dependencies"]
+    assert [dep for dep in dependencies if dep.startswith("numpy")] == [
+        "numpy>=1.26,<2.0; python_version <'3.13'",
+        "numpy>=2.0.0,<3.0.0; python_version >='3.13'",
+    ]
+    # the state is kept next to the project, not in it
+    assert not list(tmp_project.glob(".__p2r*"))
+    assert (tmp_path / ".__p2r_sync_p1.json").exists()
+
+
+def test_sync_then_mig(tmp_path: Path, dirs: Path) -> None:
+    tmp_project = tmp_path / "p1"
+    shutil.copytree(dirs / "p1", tmp_project)
+    pyproject = tmp_project / "pyproject.toml"
+
+    app_main(["sync", str(tmp_project)])
+    pyproject.write_text(
+        pyproject.read_text().replace(
+            '    "sortedcontainers==2.4.0",\n',
+            '    "sortedcontainers==2.4.0",\n    "rich",\n',
+        )
+    )
+
+    app_main(["mig", str(tmp_project)])
+
+    migrated = tomllib.loads(pyproject.read_text())
+    assert "poetry" not in migrated["tool"]
+    assert migrated["tool"]["rye"]["managed"] is True
+    # the requirement added by hand to the synced [project] is kept
+    assert "rich" in migrated["project"]["dependencies"]
+    assert "numpy>=2.0.0,<3.0.0" in migrated["project"]["dependencies"]
+
+
+def test_sync_document_changed(tmp_path: Path, dirs: Path) -> None:
+    tmp_project = tmp_path / "p1"
+    shutil.copytree(dirs / "p1", tmp_project)
+    pyproject = tmp_project / "pyproject.toml"
+    original = pyproject.read_text()
+
+    app_main(["sync", str(tmp_project)])
+    synced = pyproject.read_text()
+
+    # a checkout of the unsynced file, with the same tool.poetry
+    pyproject.write_text(original)
+    with pytest.raises(SystemExit) as e:
+        app_main(["sync", str(tmp_project), "--check"])
+    assert e.value.code == 1
+
+    app_main(["sync", str(tmp_project)])
+    assert pyproject.read_text() == synced
+
+    # a synced entry removed by hand, next to a requirement added by hand
+    pyproject.write_text(
+        synced.replace('    "sortedcontainers==2.4.0",\n', '    "rich",\n').replace(
+            'readme = "README.md"\nrequires-python', "requires-python"
+        )
+    )
+    with pytest.raises(SystemExit) as e:
+        app_main(["sync", str(tmp_project), "--check"])
+    assert e.value.code == 1
+
+    app_main(["sync", str(tmp_project)])
+    project = tomllib.loads(pyproject.read_text())["project"]
+    assert project["readme"] == "README.md"
+    assert "sortedcontainers==2.4.0" in project["dependencies"]
+    assert "rich" in project["dependencies"]
+
+    app_main(["sync", str(tmp_project), "--check"])
@@ -0,0 +1,51 @@
+import json
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+
+from poetry2rye.main import main as app_main
+
+
+def test_timings(tmp_path: Path, dirs: Path) -> None:
+    tmp_project = tmp_path / "p1"
+    timings_file = tmp_path / "timings.jsonl"
+    profile_file = tmp_path / "profile.out"
+
+    shutil.copytree(dirs / "p1", tmp_project)
+
+    app_main(
+        [
+            "--timings",
+            str(timings_file),
+            "--profile",
+            str(profile_file),
+            "mig",
+            str(tmp_project),
+            "--copy-engine",
+            "threaded",
+        ]
+    )
+
+    (record,) = map(json.loads, timings_file.read_text().splitlines())
+    assert record["command"] == "mig"
+    assert {"plan", "backup", "apply.write", "apply.move"} <= record["phases"].keys()
+    assert record["counters"]["files_copied"] == 4
+    assert record["counters"]["bytes_copied"] == sum(
+        p.stat().st_size for p in (dirs / "p1").rglob("*") if p.is_file()
+    )
+    assert profile_file.exists()
+
+
+def test_timings_batch(
+    tmp_path: Path, dirs: Path, capsys: pytest.CaptureFixture
+) -> None:
+    root = tmp_path / "root"
+    shutil.copytree(dirs / "p1", root / "p1")
+
+    app_main(["--timings", str(tmp_path / "timings.jsonl"), "mig-all", str(root)])
+
+    (record,) = map(json.loads, capsys.readouterr().out.splitlines())
+    assert "backup" in record["timings"]["phases"]
+    assert "P2R_TIMINGS" not in os.environ
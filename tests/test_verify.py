@@ -0,0 +1,78 @@
+import shutil
+from pathlib import Path
+
+import pytest
+
+from poetry2rye.main import main as app_main
+
+
+@pytest.mark.parametrize("backup_mode", ["full", "journal", "archive", "store"])
+def test_verify_migrated(backup_mode: str, tmp_path: Path, dirs: Path) -> None:
+    tmp_project = tmp_path / "p1"
+    shutil.copytree(dirs / "p1", tmp_project)
+
+    app_main(["mig", str(tmp_project), "--backup-mode", backup_mode])
+
+    # poetry.lock is now only in the backup
+    app_main(["verify", str(tmp_project)])
+
+
+def test_verify_problems(
+    tmp_path: Path, dirs: Path, capsys: pytest.CaptureFixture
+) -> None:
+    tmp_project = tmp_path / "p1"
+    shutil.copytree(dirs / "p1", tmp_project)
+
+    pyproject = tmp_project / "pyproject.toml"
+    pyproject.write_text(
+        pyproject.read_text()
+        .replace('sortedcontainers = "2.4.0"', 'sortedcontainers = "^3.0"')
+        .replace('numpy = "^2.0.0"', 'numpy = {version = "^2.0.0", extras = ["x"]}')
+    )
+
+    with pytest.raises(SystemExit) as e:
+        app_main(["verify", str(tmp_project)])
+    assert e.value.code == 1
+
+    out = capsys.readouterr().out
+    assert "sortedcontainers is locked at 2.4.0" in out
+    assert "has no extras ['x']" in out
+
+
+def test_verify_python_markers(tmp_path: Path) -> None:
+    tmp_project = tmp_path / "proj"
+    (tmp_project / "bar").mkdir(parents=True)
+    (tmp_project / "pyproject.toml").write_text(
+        """[tool.poetry]
+name = "proj"
+version = "0.1.0"
+description = ""
+authors = []
+packages = [{ include = "bar" }]
+
+[tool.poetry.dependencies]
+python = "^3.12"
+foo = [
+    { version = "^1.0", python = "<3.12" },
+    { version = "^2.0", python = ">=3.12" },
+]
+"""
+    )
+    (tmp_project / "poetry.lock").write_text(
+        """[[package]]
+name = "foo"
+version = "2.1.0"
+optional = false
+python-versions = "*"
+files = []
+
+[metadata]
+lock-version = "2.0"
+python-versions = "^3.12"
+content-hash = ""
+"""
+    )
+
+    # foo ^1.0 is only for Pythons the lock is not for, and the project has
+    # no module named after it
+    app_main(["verify", str(tmp_project)])